@@ -4,14 +4,313 @@ Capture tous les événements, erreurs et performances
 """
 
 import logging
+import logging.handlers
 import json
+import os
+import gzip
+import shutil
+import queue
+import atexit
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import traceback
 import sys
 
 
+class AsyncJsonlSink:
+    """Sink JSONL bufferisé : les producteurs empilent sans bloquer, un thread unique écrit par lots"""
+    
+    def __init__(self, path: Path, max_bytes: int = 10 * 1024 * 1024, rotate_interval: float = 86400,
+                 backup_count: int = 7, batch_size: int = 256, flush_interval: float = 1.0,
+                 max_queue: int = 10000):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._file = None
+        self._opened_at = 0.0
+        
+        # Compteurs exposés via get_stats() ; dropped est incrémenté par les appelants et le thread d'écriture
+        self._stats_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self.last_error: Optional[str] = None
+        
+        self._thread = threading.Thread(target=self._run, name=f"jsonl-sink:{self.path.name}", daemon=True)
+        self._thread.start()
+    
+    def emit(self, data: Dict[str, Any]) -> None:
+        """Empiler un événement (ne bloque jamais, l'événement est perdu si la file est pleine)"""
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """Vider la file puis arrêter le thread d'écriture"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du sink"""
+        with self._stats_lock:
+            return {
+                'path': str(self.path),
+                'pending': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'rotations': self.rotations,
+                'write_errors': self.write_errors,
+                'last_error': self.last_error,
+            }
+    
+    def _run(self) -> None:
+        """Boucle du thread d'écriture"""
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._drain()
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # Ne jamais tuer le thread d'écriture pour un lot invalide ; le lot perdu est compté
+                # (pas de log ici : il pourrait revenir dans ce même sink)
+                with self._stats_lock:
+                    self.write_errors += 1
+                    self.dropped += len(batch)
+                    self.last_error = f"{type(e).__name__}: {e}"
+        self._close_file()
+    
+    def _drain(self) -> List[Dict[str, Any]]:
+        """Récupérer un lot d'événements (attend au plus flush_interval)"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Sérialiser et écrire un lot en une seule écriture"""
+        if self._file is None:
+            self._open_file()
+        elif self._should_rollover():
+            self._rollover()
+        
+        lines = ''.join(json.dumps(item, ensure_ascii=False, default=str) + '\n' for item in batch)
+        self._file.write(lines)
+        self._file.flush()
+        self.written += len(batch)
+    
+    def _open_file(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+    
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+    
+    def _should_rollover(self) -> bool:
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self._opened_at >= self.rotate_interval
+    
+    def _rollover(self) -> None:
+        """Renommer le segment courant, le compresser en .gz et purger les plus anciens"""
+        self._close_file()
+        if self.path.exists() and self.path.stat().st_size > 0:
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            # Numéro de séquence : deux rotations dans la même seconde n'écrasent pas un segment
+            sequence = 0
+            while True:
+                segment = self.path.with_name(f"{self.path.stem}-{stamp}-{sequence:03d}{self.path.suffix}")
+                if not segment.exists() and not Path(f"{segment}.gz").exists():
+                    break
+                sequence += 1
+            os.replace(self.path, segment)
+            with open(segment, 'rb') as src, gzip.open(f"{segment}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            segment.unlink()
+            self.rotations += 1
+            self._prune_segments()
+        self._open_file()
+    
+    def _prune_segments(self) -> None:
+        if self.backup_count <= 0:
+            return
+        segments = sorted(self.path.parent.glob(f"{self.path.stem}-*{self.path.suffix}.gz"))
+        for old in segments[:-self.backup_count]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+# Un seul sink (et un seul thread d'écriture) par fichier d'événements
+_sinks: Dict[Path, AsyncJsonlSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_event_sink(log_dir: str = "logs") -> AsyncJsonlSink:
+    """Obtenir le sink JSONL partagé d'un répertoire de logs"""
+    path = (Path(log_dir) / 'events.jsonl').resolve()
+    with _sinks_lock:
+        sink = _sinks.get(path)
+        if sink is None:
+            sink = AsyncJsonlSink(path)
+            _sinks[path] = sink
+        return sink
+
+
+@atexit.register
+def close_event_sinks() -> None:
+    """Vider tous les sinks (appelé automatiquement à la sortie du process)"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler qui tourne aussi par âge et compresse les anciens fichiers en .gz"""
+    
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 5,
+                 rotate_interval: float = 0, encoding: str = 'utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.rotate_interval = rotate_interval
+        self._opened_at = time.time()
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._gzip_rotator
+    
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval:
+            return True
+        return bool(super().shouldRollover(record))
+    
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._opened_at = time.time()
+    
+    @staticmethod
+    def _gzip_rotator(source: str, dest: str) -> None:
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class SamplingFilter(logging.Filter):
+    """Limite les messages INFO/DEBUG répétitifs : au plus max_per_window par logger et par ligne d'appel"""
+    
+    def __init__(self, window: float = 60.0, max_per_window: int = 20):
+        super().__init__()
+        self.window = window
+        self.max_per_window = max_per_window
+        self._lock = threading.Lock()
+        # (logger, fichier, ligne) -> [début de fenêtre, émis, ignorés]
+        self._counters: Dict[tuple, list] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.max_per_window <= 0:
+            return True
+        
+        key = (record.name, record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or now - counter[0] >= self.window:
+                suppressed = counter[2] if counter else 0
+                self._counters[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.getMessage()} [+{suppressed} messages similaires ignorés]"
+                    record.args = None
+                return True
+            
+            if counter[1] < self.max_per_window:
+                counter[1] += 1
+                return True
+            
+            counter[2] += 1
+            return False
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui laisse le formatage au thread du QueueListener"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # La file reste dans le process : inutile de pré-formater le record sur le thread appelant
+        return record
+
+
+_bot_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_bot_logging(log_file: str = 'bot.log', level: int = logging.INFO, max_bytes: int = 5 * 1024 * 1024,
+                      rotate_interval: float = 86400, backup_count: int = 5, sample_window: float = 60.0,
+                      sample_max_per_window: int = 20) -> logging.handlers.QueueListener:
+    """Configurer le logging racine : file -> QueueListener -> fichier rotatif compressé + console"""
+    global _bot_log_listener
+    if _bot_log_listener is not None:
+        return _bot_log_listener
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    file_handler = CompressedRotatingFileHandler(
+        log_file, max_bytes=max_bytes, backup_count=backup_count, rotate_interval=rotate_interval
+    )
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(window=sample_window, max_per_window=sample_max_per_window))
+    
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    
+    _bot_log_listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _bot_log_listener.start()
+    return _bot_log_listener
+
+
+@atexit.register
+def stop_bot_logging() -> None:
+    """Vider la file de logs et fermer les handlers du QueueListener"""
+    global _bot_log_listener
+    if _bot_log_listener is None:
+        return
+    _bot_log_listener.stop()
+    for handler in _bot_log_listener.handlers:
+        handler.close()
+    _bot_log_listener = None
+
+
 class StructuredLogger:
     """Logger structuré avec JSON et fichiers séparés"""
     
@@ -19,10 +318,13 @@ class StructuredLogger:
         self.name = name
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
+        self.event_sink = get_event_sink(log_dir)
         
         # Logger principal
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
+        # Handlers propres (fichiers + console) : ne pas dupliquer via le logger racine
+        self.logger.propagate = False
         
         # Nettoyer les handlers existants
         self.logger.handlers.clear()
@@ -129,19 +431,27 @@ class StructuredLogger:
             self.warning(f"API call: {service}/{endpoint} - {status_code} ({duration_ms:.2f}ms) - {error}")
     
     def log_json(self, data: Dict[str, Any]) -> None:
-        """Sauvegarder un événement en JSON"""
-        json_log = self.log_dir / 'events.jsonl'
-        with open(json_log, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(data, ensure_ascii=False) + '\n')
+        """Sauvegarder un événement en JSON (mis en file, écrit par le thread du sink)"""
+        self.event_sink.emit(data)
 
 
-# Instances globales pour différents modules
-bot_logger = StructuredLogger('DiscordBot')
-database_logger = StructuredLogger('Database')
-api_logger = StructuredLogger('API')
-commands_logger = StructuredLogger('Commands')
+# Cache des loggers : les handlers ne sont construits qu'une fois par nom
+_loggers: Dict[str, StructuredLogger] = {}
+_loggers_lock = threading.Lock()
 
 
 def get_logger(name: str) -> StructuredLogger:
     """Obtenir un logger pour un module"""
-    return StructuredLogger(name)
+    with _loggers_lock:
+        instance = _loggers.get(name)
+        if instance is None:
+            instance = StructuredLogger(name)
+            _loggers[name] = instance
+        return instance
+
+
+# Instances globales pour différents modules
+bot_logger = get_logger('DiscordBot')
+database_logger = get_logger('Database')
+api_logger = get_logger('API')
+commands_logger = get_logger('Commands')
@@ -11,7 +11,6 @@ import logging
 import os
 from datetime import datetime
 import asyncio
-import time
 import warnings
 
 # Suppress tweepy SyntaxWarnings about invalid escape sequences in docstrings (non-critical)
@@ -22,16 +21,19 @@ from database_supabase import SupabaseDatabase
 from point_system import PointSystem
 from twitter_handler import TwitterHandler
 from gang_events import setup_gang_events, shutdown_gang_events
+from twitter_engagement import setup_twitter_engagement
+from job_scheduler import JobScheduler, LocalTask
+from leader_election import LeaderLease
+from advanced_logging import setup_bot_logging, stop_bot_logging
+from notification_service import NotificationService
+from voice_tracker import VoiceTracker
+from message_activity import MessageActivityTracker
+from retention import RetentionManager
+from config import (LOGGING_CONFIG, LEADER_ELECTION_CONFIG, NOTIFICATION_CONFIG, VOICE_TRACKING_CONFIG,
+                    MESSAGE_ACTIVITY_CONFIG, RETENTION_CONFIG)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (rotation compressée, échantillonnage INFO, écriture hors event loop)
+setup_bot_logging(**LOGGING_CONFIG)
 logger = logging.getLogger('EngagementBot')
 
 class EngagementBot(commands.Bot):
@@ -52,7 +54,31 @@ class EngagementBot(commands.Bot):
         # Initialize systems
         self.db = SupabaseDatabase()
         self.point_system = PointSystem(self.db, self)
-        self.twitter_handler = TwitterHandler()
+        self.twitter_handler = TwitterHandler(self.db)
+        # Diffusion des notifications (DM de gang, annonces) à concurrence bornée
+        self.notifications = NotificationService(self, **NOTIFICATION_CONFIG)
+        # Planificateur unique des tâches périodiques (événements de gang, ingestion Twitter...)
+        self.scheduler = JobScheduler(self.db)
+        # Sessions vocales suivies en mémoire, points crédités par minute en lot
+        self.voice_tracker = VoiceTracker(self.db, **VOICE_TRACKING_CONFIG)
+        # Points de messages comptés en mémoire (aucun accès DB par message)
+        self.message_activity = MessageActivityTracker(self.db, command_prefix=self.command_prefix, **MESSAGE_ACTIVITY_CONFIG)
+        self.add_listener(self.message_activity.on_message_event, 'on_message')
+        # Compteurs tenus en mémoire par chaque instance : vidés par une boucle locale, leader ou non
+        self.local_tasks = [
+            LocalTask('voice.accrual', self.voice_tracker.tick, self.voice_tracker.tick_interval),
+            LocalTask('voice.checkpoint', self.voice_tracker.checkpoint, self.voice_tracker.checkpoint_interval),
+            LocalTask('message_activity.flush', self.message_activity.flush, self.message_activity.flush_interval),
+        ]
+        # Purge par lots des tables qui grossissent sans limite
+        self.retention = RetentionManager(self.db, **RETENTION_CONFIG)
+        # Seul le détenteur du bail fait tourner le planificateur (plusieurs réplicas possibles)
+        self.leader_lease = LeaderLease(
+            self.db,
+            on_elected=self._on_elected,
+            on_demoted=self._on_leadership_lost,
+            **LEADER_ELECTION_CONFIG
+        )
         
         # Check database connection
         if not self.db.is_connected():
@@ -65,6 +91,7 @@ class EngagementBot(commands.Bot):
         try:
             # Start Twitter handler
             await self.twitter_handler.start()
+            await self.notifications.start()
             
             logger.info("Loading Commands cog...")
             from commands import Commands
@@ -78,17 +105,28 @@ class EngagementBot(commands.Bot):
             self.add_cog(gang_commands_cog)
             
             logger.info("Commands cogs loaded successfully")
+
+            self.scheduler.register('retention', self.retention.run_once, self.retention.interval)
             all_commands = sorted([c.name for c in self.commands])
             logger.info(f"Available commands: {all_commands}")
             logger.info(f"Total number of commands: {len(all_commands)}")
 
+            for task in self.local_tasks:
+                task.start()
+            # Le planificateur démarre si cette instance obtient le bail de leader
+            await self.leader_lease.start()
+            
             # Setup gang events
-            if self.db.is_connected():
+            if self.db.is_connected() and not hasattr(self, 'gang_events'):
                 await setup_gang_events(self, self.db)
                 logger.info("Gang events system started")
             else:
                 logger.warning("Skipping gang events setup due to database connection issues")
             
+            # Ingestion de l'engagement Twitter des comptes liés
+            if self.db.is_connected() and self.twitter_handler.is_available() and not hasattr(self, 'twitter_engagement'):
+                await setup_twitter_engagement(self, self.db, self.twitter_handler)
+            
             # Migrate data if needed
             await self._check_migration()
 
@@ -96,21 +134,36 @@ class EngagementBot(commands.Bot):
             logger.error(f"Failed to load cogs: {e}", exc_info=True)
             raise
     
+    async def _on_elected(self):
+        """Bail obtenu : démarrer le planificateur et reprendre les échéances ponctuelles (phases de guerre)"""
+        await self.scheduler.start()
+        if hasattr(self, 'gang_events'):
+            await self.gang_events.war_system.restore_war_timers()
+    
+    async def _on_leadership_lost(self):
+        """Une autre instance détient le bail : arrêter les tâches sans écraser ses échéances"""
+        await self.scheduler.stop(persist=False)
+    
     async def _check_migration(self):
         """Check if migration from JSON is needed"""
         try:
             if not self.db.is_connected():
                 return
             
-            # Check if we have users in database
+            if not os.path.exists('data.json'):
+                return
+            
+            # Check if we have users in database, or an interrupted migration to resume
             users = self.db.get_leaderboard(1)
+            progress = self.db.load_bot_state('json_migration')
             
-            # If no users and data.json exists, migrate
-            if not users and os.path.exists('data.json'):
-                logger.info("No users found in database, checking for data.json migration...")
+            if not users or (progress and not progress.get('completed')):
+                logger.info("Migrating data.json (new database or interrupted migration)...")
                 
-                # Ask user or migrate automatically
-                self.db.migrate_from_json('data.json')
+                report = await asyncio.to_thread(self.db.migrate_from_json, 'data.json')
+                if not report.get('completed'):
+                    logger.warning("data.json migration stopped early, it will resume on next start")
+                    return
                 
                 # Backup old file
                 import shutil
@@ -136,6 +189,12 @@ class EngagementBot(commands.Bot):
         # Vérifier l'intégrité des systèmes
         await self._health_check()
         
+        # Sessions vocales reconstruites depuis l'état réel des serveurs
+        try:
+            await self.voice_tracker.reconcile(self.guilds)
+        except Exception as e:
+            logger.error(f"Voice session reconciliation failed: {e}", exc_info=True)
+        
         # Set status
         activity = discord.Game(name="Système de gangs | !help")
         await self.change_presence(activity=activity)
@@ -175,31 +234,9 @@ class EngagementBot(commands.Bot):
             logger.error(f"Health check failed: {e}", exc_info=True)
 
     async def on_voice_state_update(self, member, before, after):
-        """Handle voice state changes"""
+        """Handle voice state changes (in memory, points credited by the voice tracker)"""
         try:
-            if member.bot:
-                return
-            
-            user_id = str(member.id)
-            
-            # User joined voice channel
-            if before.channel is None and after.channel is not None:
-                self.db.start_voice_session(user_id)
-                logger.info(f"User {member.display_name} joined voice channel")
-            
-            # User left voice channel
-            elif before.channel is not None and after.channel is None:
-                session = self.db.end_voice_session(user_id)
-                
-                if session:
-                    # Calculate time spent
-                    time_spent = time.time() - session['start_time']
-                    
-                    if time_spent >= 300:  # 5 minutes minimum
-                        points = min(int(time_spent / 60) * 2, 120)  # 2 points per minute, max 120
-                        self.point_system.add_points(user_id, points, f"Voice chat ({int(time_spent/60)} min)")
-                        logger.info(f"Awarded {points} points to {member.display_name} for voice activity")
-        
+            self.voice_tracker.on_voice_state_update(member, before, after)
         except Exception as e:
             logger.error(f"Error in voice state update: {e}", exc_info=True)
 
@@ -236,10 +273,22 @@ class EngagementBot(commands.Bot):
         try:
             logger.info("Shutting down bot...")
             
+            # Persister les prochaines échéances avant de retirer les tâches, puis céder le bail
+            if self.scheduler.running:
+                await self.scheduler.stop()
+            await self.leader_lease.stop()
+            
             if hasattr(self, 'gang_events'):
                 await shutdown_gang_events(self)
             
+            # Créditer le temps vocal et les messages restants, sauvegarder les sessions
+            for task in self.local_tasks:
+                await task.stop()
+            await self.voice_tracker.shutdown()
+            await self.message_activity.flush()
+            
             await self.twitter_handler.stop()
+            await self.notifications.stop()
             await super().close()
             
         except Exception as e:
@@ -262,6 +311,7 @@ async def main():
         logger.error(f"Failed to start bot: {e}", exc_info=True)
     finally:
         await bot.close()
+        stop_bot_logging()
 
 def run_bot():
     """Function for Railway deployment"""
@@ -4,6 +4,7 @@ import logging
 from datetime import datetime
 import random
 import asyncio
+import time
 from config import (
     OWNER_ID, APPROVED_STAFF_IDS, DAILY_LIMITS, COMMAND_COOLDOWNS,
     COMMAND_NARRATIONS, EMOJI_POOL, COMBAT_FIRST_MOVE_TIMEOUT,
@@ -12,6 +13,7 @@ from config import (
     STAFF_EDITPOINTS_MAX_ADD, STAFF_EDITPOINTS_MAX_REMOVE,
 )
 from tweepy.errors import TooManyRequests, NotFound, Unauthorized
+from trade_sessions import TradeBook, AWAITING_OFFER
 
 logger = logging.getLogger('EngagementBot')
 
@@ -120,6 +122,10 @@ class Commands(commands.Cog):
         self.bot = bot
         self.points = point_system
         self.twitter = twitter_handler
+        # Échanges d'objets en attente de réponse
+        self.trades = TradeBook()
+        # Tâches d'expiration en cours, référencées jusqu'à leur fin
+        self._trade_tasks = set()
         logger.info("Commands cog initialized")
         # Log all commands that will be registered
         logger.info(f"Commands being registered: {[method for method in dir(self) if method.endswith('_command')]}")
@@ -1138,11 +1144,11 @@ class Commands(commands.Cog):
     @commands.command(name='inventory', aliases=['inventaire', 'inv', 'objets'])
     async def inventory(self, ctx):
         """Show your inventory / Affiche l'inventaire de l'utilisateur."""
-        inv = self.points.db.get_inventory(str(ctx.author.id))
+        inv = self.points.db.get_inventory_counts(str(ctx.author.id))
         if not inv:
             await ctx.send("Votre inventaire est vide.")
         else:
-            items = "\n".join(f"- {item_id}" for item_id in inv)
+            items = "\n".join(f"- {item_id} x{quantity}" for item_id, quantity in sorted(inv.items()))
             await ctx.send(f"**Votre inventaire :**\n{items}")
 
     @commands.command(name='trade', aliases=['echanger', 'troquer', 'echange'])
@@ -1152,68 +1158,109 @@ class Commands(commands.Cog):
         target_id = str(member.id)
         db = self.points.db
 
+        if author_id == target_id:
+            await ctx.send("Vous ne pouvez pas échanger avec vous-même.")
+            return
         # Vérifie que l'auteur possède bien l'objet proposé
-        if my_item_id not in db.get_inventory(author_id):
+        if not db.has_item(author_id, my_item_id):
             await ctx.send("Vous ne possédez pas cet objet.")
             return
-        if author_id == target_id:
-            await ctx.send("Vous ne pouvez pas échanger avec vous-même.")
+
+        session = self.trades.open(author_id, target_id, ctx.channel.id, my_item_id)
+        if session is None:
+            await ctx.send("Un échange est déjà en cours pour l'un de vous deux.")
             return
 
-        # Demande à B quel objet il souhaite proposer en échange
+        # Demande à B quel objet il souhaite proposer en échange (réponse traitée par on_message)
+        target_items = db.get_inventory_counts(target_id)
         await ctx.send(
             f"{member.mention}, {ctx.author.display_name} souhaite échanger son objet `{my_item_id}` avec vous.\n"
             "Réponds avec l'identifiant de l'objet de ton inventaire que tu proposes en échange, ou 'annuler' pour refuser.\n"
-            f"Ton inventaire : {', '.join(db.get_inventory(target_id)) or 'vide'}"
+            f"Ton inventaire : {', '.join(sorted(target_items)) or 'vide'}"
         )
+        self._expire_trade_later(session, ctx.channel)
 
-        def check_item(m):
-            return m.author.id == member.id and m.channel == ctx.channel
+    def _expire_trade_later(self, session, channel):
+        """Annoncer l'expiration de l'étape en cours si personne n'a répondu à temps"""
+        state = session.state
 
-        try:
-            msg = await ctx.bot.wait_for("message", check=check_item, timeout=60)
-        except asyncio.TimeoutError:
-            await ctx.send("Échange annulé (temps écoulé).")
+        async def expire():
+            if self.trades.is_open(session) and session.state == state:
+                self.trades.close(session)
+                try:
+                    await channel.send("Échange annulé (temps écoulé).")
+                except Exception as e:
+                    logger.warning(f"Could not announce trade expiry: {e}")
+
+        def start():
+            task = asyncio.create_task(expire())
+            self._trade_tasks.add(task)
+            task.add_done_callback(self._trade_tasks.discard)
+
+        # Une seule minuterie par échange : celle de l'étape précédente est remplacée
+        if session.timer is not None:
+            session.timer.cancel()
+        delay = max(0.0, session.expires_at - time.time())
+        session.timer = asyncio.get_running_loop().call_later(delay, start)
+
+    @commands.Cog.listener('on_message')
+    async def on_trade_message(self, message):
+        """Réponses aux échanges en attente : une recherche par message, quel que soit le nombre d'échanges"""
+        if message.author.bot or message.content.startswith(self.bot.command_prefix):
+            return
+        session = self.trades.pending_for(str(message.author.id), message.channel.id)
+        if session is None:
             return
 
+        try:
+            content = message.content.strip()
+            if session.state == AWAITING_OFFER:
+                await self._handle_trade_offer(session, message, content)
+            elif content.lower() in ("oui", "non"):
+                await self._handle_trade_confirmation(session, message, content.lower() == "oui")
+        except Exception as e:
+            self.trades.close(session)
+            logger.error(f"Error handling trade message: {e}", exc_info=True)
+            await message.channel.send("❌ Une erreur s'est produite, échange annulé.")
+
+    async def _handle_trade_offer(self, session, message, content):
         # Si B annule
-        if msg.content.lower() == "annuler":
-            await ctx.send("Échange annulé.")
+        if content.lower() == "annuler":
+            self.trades.close(session)
+            await message.channel.send("Échange annulé.")
             return
 
-        their_item_id = msg.content.strip()
-
         # Vérifie que B possède bien l'objet proposé
-        if their_item_id not in db.get_inventory(target_id):
-            await ctx.send(f"{member.display_name} ne possède pas cet objet. Échange annulé.")
+        if not self.points.db.has_item(session.target_id, content):
+            self.trades.close(session)
+            await message.channel.send(f"{message.author.display_name} ne possède pas cet objet. Échange annulé.")
             return
 
         # Demande à A de confirmer l'échange
-        await ctx.send(
-            f"{ctx.author.mention}, {member.display_name} propose d'échanger son objet `{their_item_id}` contre ton `{my_item_id}`.\n"
+        self.trades.offer(session, content)
+        await message.channel.send(
+            f"<@{session.author_id}>, {message.author.display_name} propose d'échanger son objet `{content}` contre ton `{session.author_item}`.\n"
             "Réponds 'oui' pour accepter, 'non' pour refuser."
         )
+        self._expire_trade_later(session, message.channel)
 
-        def check_confirm(m):
-            return m.author.id == ctx.author.id and m.channel == ctx.channel and m.content.lower() in ["oui", "non"]
-
-        try:
-            confirm_msg = await ctx.bot.wait_for("message", check=check_confirm, timeout=30)
-        except asyncio.TimeoutError:
-            await ctx.send("Échange annulé (temps écoulé).")
+    async def _handle_trade_confirmation(self, session, message, accepted):
+        self.trades.close(session)
+        if not accepted:
+            await message.channel.send("Échange refusé.")
             return
 
-        if confirm_msg.content.lower() == "oui":
-            # Retire les objets des inventaires respectifs et les ajoute à l'autre
-            db.remove_item_from_inventory(author_id, my_item_id)
-            db.add_item_to_inventory(target_id, my_item_id)
-            db.remove_item_from_inventory(target_id, their_item_id)
-            db.add_item_to_inventory(author_id, their_item_id)
-            await ctx.send(
-                f"Échange réussi ! `{my_item_id}` a été échangé contre `{their_item_id}` entre {ctx.author.display_name} et {member.display_name}."
+        # Vérification des deux objets et échange en une seule transaction
+        swapped = await asyncio.to_thread(
+            self.points.db.swap_items, session.author_id, session.author_item, session.target_id, session.target_item
+        )
+        if swapped:
+            await message.channel.send(
+                f"Échange réussi ! `{session.author_item}` a été échangé contre `{session.target_item}` "
+                f"entre <@{session.author_id}> et <@{session.target_id}>."
             )
         else:
-            await ctx.send("Échange refusé.")
+            await message.channel.send("Échange impossible : l'un des objets n'est plus disponible.")
 
     @commands.command(name='addpoints', aliases=['ajouterpoints', 'donnerpoints'])
     @is_bot_owner()
@@ -1391,8 +1438,7 @@ class Commands(commands.Cog):
                 return
 
             # Vérifier l'inventaire actuel
-            current_inventory = self.point_system.database.get_inventory(str(member.id))
-            current_count = current_inventory.count(item_id)
+            current_count = self.point_system.database.get_inventory_counts(str(member.id)).get(item_id, 0)
             
             if current_count == 0:
                 await ctx.send(f"❌ {member.display_name} ne possède pas d'item '{item_id}'!")
@@ -1605,6 +1651,7 @@ class Commands(commands.Cog):
                 # Sauvegarder le lien
                 user_data['twitter'] = data
                 self.point_system.database.save_data()
+                self.point_system.database.link_twitter(str(ctx.author.id), data['username'])
                 
                 # Donner des points bonus pour la liaison
                 bonus_points = 500
@@ -1739,15 +1786,20 @@ class Commands(commands.Cog):
     async def unlink_twitter(self, ctx):
         """Unlink Twitter account / Délier le compte Twitter"""
         try:
-            user_data = self.point_system.database.get_user_data(str(ctx.author.id))
+            user_id = str(ctx.author.id)
+            database = self.point_system.database
+            user_data = database.get_user_data(user_id)
             
-            if not user_data.get('twitter'):
+            if not user_data.get('twitter') and not database.get_twitter_link(user_id):
                 await ctx.send("❌ Aucun compte Twitter lié.")
                 return
             
-            # Supprimer le lien
-            del user_data['twitter']
-            self.point_system.database.save_data()
+            # Supprimer le lien lu par l'ingestion de l'engagement, puis la copie locale
+            if not database.unlink_twitter(user_id):
+                await ctx.send("❌ Une erreur s'est produite lors du délien du compte Twitter.")
+                return
+            user_data.pop('twitter', None)
+            database.save_data()
             
             embed = discord.Embed(
                 title="✅ Compte Twitter délié",
@@ -21,6 +21,29 @@ POINTS_TWITTER_LIKE = 5
 POINTS_TWITTER_RT = 10
 POINTS_TWITTER_COMMENT = 15
 
+# Twitter API client (appels tweepy exécutés hors de l'event loop)
+TWITTER_API_CONFIG = {
+    "max_workers": 4,         # Appels API simultanés maximum
+    "request_timeout": 30.0,  # Timeout d'un appel API (secondes)
+    "cache_max_entries": 2000,            # Réponses gardées en cache (LRU)
+    "cache_ttl": {                        # Durée de vie en cache par endpoint (secondes)
+        "get_users": 6 * 3600,
+        "get_user_tweets": 15 * 60,
+        "get_me": 15 * 60,
+        "search_tweets": 15 * 60
+    },
+    "cache_file": "twitter_cache.json",   # Persistance locale si la base est indisponible
+    "cache_persist_interval": 60.0        # Sauvegarde du cache modifié (secondes)
+}
+
+# Ingestion de l'engagement Twitter des comptes liés
+TWITTER_ENGAGEMENT_CONFIG = {
+    "interval": 900,          # Un cycle par fenêtre de rate limit (secondes)
+    "lookback_hours": 48,     # Tweets récents dont on suit les métriques
+    "max_query_length": 512,  # Longueur max d'une requête de recherche
+    "max_pages": 1            # Pages de 100 tweets par requête
+}
+
 # === DATABASE RESILIENCE CONFIGURATION (Phase 4C) ===
 DATABASE_RESILIENCE_CONFIG = {
     "max_retries": 3,              # Nombre maximum de tentatives de reconnexion
@@ -39,6 +62,52 @@ DATABASE_RESILIENCE_CONFIG = {
     }
 }
 
+# === LOGGING CONFIGURATION ===
+LOGGING_CONFIG = {
+    "log_file": "bot.log",
+    "max_bytes": 5 * 1024 * 1024,   # Rotation dès 5 Mo
+    "rotate_interval": 86400,       # ... ou toutes les 24h
+    "backup_count": 5,              # Nombre d'archives .gz conservées
+    "sample_window": 60,            # Fenêtre d'échantillonnage des messages INFO (secondes)
+    "sample_max_per_window": 20     # Messages INFO max par ligne d'appel et par fenêtre
+}
+
+# Élection de leader : une seule instance exécute les tâches planifiées
+LEADER_ELECTION_CONFIG = {
+    "key": "scheduler_leader",      # Ligne bot_state du bail
+    "ttl": 15.0,                    # Durée du bail (secondes) : délai max de reprise
+    "heartbeat_interval": 5.0       # Renouvellement du bail (secondes)
+}
+
+# Diffusion des notifications (DM des membres de gang, annonces dans chaque serveur)
+NOTIFICATION_CONFIG = {
+    "max_concurrency": 10,                          # Envois simultanés max
+    "global_rate": 40.0,                            # Requêtes/s (limite globale Discord : 50/s)
+    "channel_names": ["gang-events", "general"],    # Salons d'annonce, par ordre de préférence
+    "channel_cache_ttl": 3600,                      # Durée du cache des salons résolus (secondes)
+    "dedup_window": 300,                            # Notification identique ignorée pendant (secondes)
+    "max_queue": 10000                              # Envois en attente max (au-delà : ignorés)
+}
+
+# Points vocaux : sessions suivies en mémoire, créditées par minute en une écriture groupée
+VOICE_TRACKING_CONFIG = {
+    "points_per_minute": 2,         # Points par minute active
+    "min_session_minutes": 5,       # Minutes actives avant le premier crédit (sessions plus courtes : rien)
+    "tick_interval": 60,            # Crédit des minutes actives de tous les membres (secondes)
+    "checkpoint_interval": 300,     # Sauvegarde des sessions en cours (secondes)
+    "max_points_per_session": 120,  # Points vocaux max par session
+    "count_muted": False,           # Compter le temps micro coupé
+    "count_deafened": False         # Compter le temps casque coupé
+}
+
+# Points de messages : comptés en mémoire, crédités en lot
+MESSAGE_ACTIVITY_CONFIG = {
+    "flush_interval": 30,           # Écriture groupée des points accumulés (secondes)
+    "min_interval": 10,             # Délai min entre deux messages comptés d'un utilisateur (secondes)
+    "max_messages_per_minute": 3,   # Messages comptés max par utilisateur et par minute
+    "min_length": 3                 # Longueur min d'un message compté
+}
+
 # Daily Command Limits Configuration (selon TECH Brief specs)
 DAILY_LIMITS = {
     "rob": 5,        # 5 vols par jour (steal selon brief)
@@ -466,6 +535,26 @@ ENABLE_AUDIT_LOGGING = True  # Activer les logs d'audit complets
 AUDIT_LOG_CRITICAL_ONLY = False  # False = log tout, True = log seulement actions critiques
 AUDIT_LOG_RETENTION_DAYS = 90  # Garder les logs d'audit pendant 90 jours
 
+# === Rétention des tables ===
+# Purge par petits lots (les plus anciennes lignes d'abord) pour ne jamais verrouiller une table
+RETENTION_CONFIG = {
+    "interval": 3600,           # Passage de la tâche de rétention (secondes)
+    "batch_size": 1000,         # Lignes supprimées par lot
+    "max_batches": 50,          # Lots max par table et par passage (la suite au passage suivant)
+    "pause": 0.1,               # Pause entre deux lots (secondes)
+    # table -> colonne de date, jours conservés, cumul quotidien avant suppression
+    "policies": {
+        "command_usage": {"column": "date", "days": 30, "date_only": True},
+        "daily_commands": {"column": "command_date", "days": 30, "date_only": True},
+        "gang_daily_contributions": {"column": "contribution_date", "days": 30, "date_only": True},
+        "point_transactions": {"column": "timestamp", "days": AUDIT_LOG_RETENTION_DAYS, "rollup": True},
+        "gang_vault_ledger": {"column": "created_at", "days": AUDIT_LOG_RETENTION_DAYS, "rollup": True},
+        "admin_actions": {"column": "performed_at", "days": AUDIT_LOG_RETENTION_DAYS},
+        "prison_work": {"column": "worked_at", "days": AUDIT_LOG_RETENTION_DAYS},
+        "prison_visits": {"column": "visited_at", "days": AUDIT_LOG_RETENTION_DAYS},
+    }
+}
+
 # === Whitelist de Commandes par Serveur ===
 # Si activé, seules ces commandes sont disponibles sur serveurs non approuvés
 RESTRICTED_COMMANDS_ON_UNTRUSTED_SERVERS = {
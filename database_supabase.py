@@ -5,11 +5,17 @@ import time
 import asyncio
 from typing import Optional, Dict, List, Any, Tuple
 from supabase import create_client, Client
+from territory_store import TerritoryStore
 from datetime import datetime, date, timedelta
 import random
 
 logger = logging.getLogger('EngagementBot')
 
+# Statuts d'une guerre non terminée
+ACTIVE_WAR_STATUSES = ('declared', 'preparation', 'active')
+# Durée de validité de l'index gang -> guerre en cours (guerres déclarées par une autre instance)
+ACTIVE_WAR_INDEX_TTL = 300
+
 class SupabaseDatabase:
     """Database manager using Supabase PostgreSQL with connection resilience"""
     
@@ -42,6 +48,12 @@ class SupabaseDatabase:
         # In-memory TTL cache to reduce repeated Supabase round-trips
         self._cache: Dict[str, Any] = {}
         self._cache_expiry: Dict[str, float] = {}
+        # Index des guerres en cours : gang_id -> war_id (et war_id -> gangs pour le retrait)
+        self._active_war_by_gang: Dict[str, str] = {}
+        self._active_war_gangs: Dict[str, Tuple[str, str]] = {}
+        self._active_war_index_expiry = 0.0
+        # Territoires en mémoire : index gang -> territoires et revenus par gang
+        self.territory_store = TerritoryStore()
         self._initialize_client()
         
         logger.info(f"[CONFIG] Database resilience configured: retries={self.max_retries}, timeout={self.connection_timeout}s")
@@ -556,56 +568,54 @@ class SupabaseDatabase:
     
     # === VOICE SESSIONS ===
     
-    def start_voice_session(self, user_id: str, event_name: str = None):
-        """Start voice session"""
+    def get_voice_sessions(self) -> List[Dict]:
+        """Get all checkpointed voice sessions"""
         try:
             if not self.is_connected():
-                return
+                return []
             
-            self.supabase.table('voice_sessions').upsert({
-                'user_id': user_id,
-                'start_time': time.time(),
-                'event_name': event_name
-            }).execute()
+            result = self.supabase.table('voice_sessions').select('*').execute()
+            return result.data or []
             
         except Exception as e:
-            logger.error(f"Error starting voice session: {e}", exc_info=True)
+            logger.error(f"Error getting voice sessions: {e}", exc_info=True)
+            return []
     
-    def end_voice_session(self, user_id: str) -> Optional[Dict]:
-        """End voice session and return session info"""
+    def checkpoint_voice_sessions(self, sessions: List[Dict], guild_ids: List[str]) -> bool:
+        """
+        Replace the checkpointed voice sessions of the given guilds with the in-memory table
+        in one round trip. Rows of guilds tracked by other instances are left untouched.
+        """
         try:
             if not self.is_connected():
-                return None
-            
-            # Get session
-            result = self.supabase.table('voice_sessions').select('*').eq('user_id', user_id).execute()
-            
-            if result.data:
-                session = result.data[0]
-                
-                # Remove session
-                self.supabase.table('voice_sessions').delete().eq('user_id', user_id).execute()
-                
-                return session
+                return False
             
-            return None
+            self.supabase.rpc('checkpoint_voice_sessions', {'p_sessions': sessions, 'p_guild_ids': guild_ids}).execute()
+            return True
             
         except Exception as e:
-            logger.error(f"Error ending voice session: {e}", exc_info=True)
-            return None
+            logger.error(f"Error checkpointing voice sessions: {e}", exc_info=True)
+            return False
     
-    def get_voice_session(self, user_id: str) -> Optional[Dict]:
-        """Get current voice session"""
+    def award_points_bulk(self, awards: List[Dict]) -> bool:
+        """
+        Credit several users in one round trip.
+        
+        awards: [{'user_id', 'amount', 'reason'}] - one ledger row per award
+        """
         try:
             if not self.is_connected():
-                return None
+                return False
+            if not awards:
+                return True
             
-            result = self.supabase.table('voice_sessions').select('*').eq('user_id', user_id).execute()
-            return result.data[0] if result.data else None
+            self.supabase.rpc('award_points_bulk', {'p_awards': awards}).execute()
+            self._cache_invalidate(*(f"points:{award['user_id']}" for award in awards))
+            return True
             
         except Exception as e:
-            logger.error(f"Error getting voice session: {e}", exc_info=True)
-            return None
+            logger.error(f"Error awarding points in bulk: {e}", exc_info=True)
+            return False
     
     # === TWITTER ===
     
@@ -617,12 +627,26 @@ class SupabaseDatabase:
             
             self.supabase.table('twitter_links').upsert({
                 'user_id': user_id,
-                'twitter_handle': twitter_handle
+                'twitter_handle': twitter_handle,
+                'linked_at': datetime.now().isoformat()
             }).execute()
             
         except Exception as e:
             logger.error(f"Error linking Twitter: {e}", exc_info=True)
     
+    def unlink_twitter(self, user_id: str) -> bool:
+        """Unlink Twitter account (the engagement ingestion stops crediting this user)"""
+        try:
+            if not self.is_connected():
+                return False
+            
+            self.supabase.table('twitter_links').delete().eq('user_id', user_id).execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error unlinking Twitter: {e}", exc_info=True)
+            return False
+    
     def get_twitter_link(self, user_id: str) -> Optional[str]:
         """Get Twitter link"""
         try:
@@ -636,6 +660,62 @@ class SupabaseDatabase:
             logger.error(f"Error getting Twitter link: {e}", exc_info=True)
             return None
     
+    def get_twitter_links(self) -> List[Dict]:
+        """Get all linked Twitter accounts"""
+        try:
+            if not self.is_connected():
+                return []
+            
+            result = self.supabase.table('twitter_links').select('user_id, twitter_handle, linked_at').execute()
+            return result.data or []
+            
+        except Exception as e:
+            logger.error(f"Error getting Twitter links: {e}", exc_info=True)
+            return []
+    
+    def get_tweet_watermarks(self, tweet_ids: List[str]) -> Dict[str, Dict]:
+        """Get stored engagement watermarks for the given tweets"""
+        try:
+            if not self.is_connected() or not tweet_ids:
+                return {}
+            
+            watermarks = {}
+            for i in range(0, len(tweet_ids), 200):
+                result = self.supabase.table('twitter_tweet_watermarks').select(
+                    'tweet_id, like_count, retweet_count, reply_count'
+                ).in_('tweet_id', tweet_ids[i:i + 200]).execute()
+                for row in result.data or []:
+                    watermarks[row['tweet_id']] = row
+            return watermarks
+            
+        except Exception as e:
+            logger.error(f"Error getting tweet watermarks: {e}", exc_info=True)
+            return {}
+    
+    def apply_twitter_engagement(self, awards: List[Dict], watermarks: List[Dict]) -> bool:
+        """
+        Apply Twitter engagement points and advance watermarks in one round trip.
+        
+        awards: [{'user_id', 'amount', 'reason'}] - one ledger row per user
+        watermarks: [{'tweet_id', 'user_id', 'like_count', 'retweet_count', 'reply_count'}]
+        """
+        try:
+            if not self.is_connected():
+                return False
+            if not awards and not watermarks:
+                return True
+            
+            self.supabase.rpc('apply_twitter_engagement', {
+                'p_awards': awards,
+                'p_watermarks': watermarks
+            }).execute()
+            self._cache_invalidate(*(f"points:{award['user_id']}" for award in awards))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error applying Twitter engagement: {e}", exc_info=True)
+            return False
+    
     # === PRISON ===
     
     def set_prison_time(self, user_id: str, release_time: float):
@@ -747,6 +827,22 @@ class SupabaseDatabase:
             logger.error(f"Error getting user gang: {e}", exc_info=True)
             return None
     
+    def _fetch_gangs_with_members(self, gang_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Fetch gangs with their members, member_count and territory_count in one request.
+
+        gang_ids=None returns every gang; each result also refreshes the "gang:{id}" cache.
+        """
+        params = {'p_gang_ids': [str(gang_id) for gang_id in gang_ids] if gang_ids is not None else None}
+        result = self.supabase.rpc('get_gangs_with_members', params).execute()
+        gangs = {}
+        for row in result.data or []:
+            gang = row['gang']
+            gang['members'] = gang.get('members') or {}
+            gangs[gang['id']] = gang
+            self._cache_set(f"gang:{gang['id']}", gang, ttl=30)
+        return gangs
+
     def get_gang_info(self, gang_id: str) -> Optional[Dict]:
         """Get gang info with members"""
         cache_key = f"gang:{gang_id}"
@@ -756,29 +852,8 @@ class SupabaseDatabase:
         try:
             if not self.is_connected():
                 return None
-            
-            # Get gang info
-            gang_result = self.supabase.table('gangs').select('*').eq('id', gang_id).execute()
-            
-            if not gang_result.data:
-                return None
-            
-            gang = gang_result.data[0]
-            
-            # Get members
-            members_result = self.supabase.table('gang_members').select('*').eq('gang_id', gang_id).execute()
-            
-            # Format members
-            members = {}
-            for member in members_result.data or []:
-                members[member['user_id']] = {
-                    'rank': member['rank'],
-                    'joined_at': member['joined_at']
-                }
-            
-            gang['members'] = members
-            self._cache_set(cache_key, gang, ttl=30)
-            return gang
+            gangs = self._fetch_gangs_with_members([gang_id])
+            return next(iter(gangs.values()), None)
             
         except Exception as e:
             logger.error(f"Error getting gang info: {e}", exc_info=True)
@@ -879,24 +954,100 @@ class SupabaseDatabase:
         try:
             if not self.is_connected():
                 return False
-            self._cache_invalidate(f"gang:{gang_id}", "territories")
+            self._cache_invalidate(f"gang:{gang_id}")
             self.supabase.table('gang_members').delete().eq('gang_id', gang_id).execute()
             self.supabase.table('territories').update({'controlled_by': None, 'defense_points': 0}).eq('controlled_by', gang_id).execute()
+            self.territory_store.release_gang(gang_id, defense_points=0)
             self.supabase.table('gangs').delete().eq('id', gang_id).execute()
             return True
         except Exception as e:
             logger.error(f"Error disbanding gang: {e}", exc_info=True)
             return False
 
-    def update_gang_vault(self, gang_id: str, new_amount: int):
-        """Update gang vault_points"""
+    def apply_gang_vault_delta(self, gang_id: str, delta: int, reason: str = "", actor_id: str = None,
+                               floor: int = 0, allow_partial: bool = False) -> Optional[Dict]:
+        """
+        Atomically add delta to a gang vault and append a gang_vault_ledger row.
+
+        Returns {'applied': int, 'balance': int}, or None if the gang does not exist or the
+        balance would drop below floor (allow_partial clamps the withdrawal instead).
+        """
         try:
             if not self.is_connected():
-                return
+                return None
             self._cache_invalidate(f"gang:{gang_id}")
-            self.supabase.table('gangs').update({'vault_points': new_amount}).eq('id', gang_id).execute()
+            result = self.supabase.rpc('apply_gang_vault_delta', {
+                'p_gang_id': str(gang_id),
+                'p_delta': int(delta),
+                'p_reason': reason,
+                'p_actor_id': actor_id,
+                'p_floor': floor,
+                'p_allow_partial': allow_partial
+            }).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error applying gang vault delta: {e}", exc_info=True)
+            return None
+
+    def apply_gang_event(self, reason: str, vault_deltas: Dict[str, int], territory_updates: Dict[str, Dict] = None,
+                         point_awards: List[Dict] = None, member_removals: List[Dict] = None) -> Optional[Dict[str, int]]:
+        """
+        Commit all effects of a gang event in one transaction (RPC apply_gang_event).
+
+        Vault withdrawals are clamped to the balance; an award carrying `source_gang` is capped
+        to what was actually taken from that vault. Returns {gang_id: applied delta} or None.
+        """
+        try:
+            if not self.is_connected():
+                return None
+            territory_updates = territory_updates or {}
+            point_awards = point_awards or []
+            member_removals = member_removals or []
+            # Anciens et nouveaux propriétaires : leur territory_count change avec la même écriture
+            owners = set()
+            for territory_id, fields in territory_updates.items():
+                if 'controlled_by' in fields:
+                    owners.add(self.territory_store.territories.get(territory_id, {}).get('controlled_by'))
+                    owners.add(fields['controlled_by'])
+            owners.discard(None)
+            result = self.supabase.rpc('apply_gang_event', {
+                'p_reason': reason,
+                'p_vault_deltas': {str(gang_id): int(delta) for gang_id, delta in vault_deltas.items() if delta},
+                'p_territories': territory_updates,
+                'p_awards': point_awards,
+                'p_member_removals': member_removals
+            }).execute()
+            self._cache_invalidate(
+                *(f"gang:{gang_id}" for gang_id in set(vault_deltas) | {m['gang_id'] for m in member_removals} | owners),
+                *(f"user_gang:{m['user_id']}" for m in member_removals),
+                *(f"points:{award['user_id']}" for award in point_awards)
+            )
+            for territory_id, fields in territory_updates.items():
+                self.territory_store.update(territory_id, **fields)
+            applied = result.data or {}
+            return {gang_id: int(delta) for gang_id, delta in applied.items()}
+        except Exception as e:
+            self.territory_store.invalidate()
+            logger.error(f"Error applying gang event: {e}", exc_info=True)
+            return None
+
+    def add_gang_vaults_bulk(self, deltas: Dict[str, int], reason: str = "") -> bool:
+        """Increment several gang vaults server-side in a single round trip"""
+        try:
+            if not self.is_connected():
+                return False
+            deltas = {gang_id: amount for gang_id, amount in deltas.items() if amount}
+            if not deltas:
+                return True
+            self.supabase.rpc('increment_gang_vaults', {
+                'p_deltas': deltas,
+                'p_reason': reason
+            }).execute()
+            self._cache_invalidate(*(f"gang:{gang_id}" for gang_id in deltas))
+            return True
         except Exception as e:
-            logger.error(f"Error updating gang vault: {e}", exc_info=True)
+            logger.error(f"Error incrementing gang vaults: {e}", exc_info=True)
+            return False
 
     def record_daily_contribution(self, user_id: str, amount: int):
         """Record (upsert) today's contribution for vault limit tracking"""
@@ -932,12 +1083,11 @@ class SupabaseDatabase:
             return 0
 
     def get_all_gangs(self) -> Dict[str, Dict]:
-        """Get all gangs as dict keyed by id"""
+        """Get all gangs (with members and counts) as dict keyed by id, in one request"""
         try:
             if not self.is_connected():
                 return {}
-            result = self.supabase.table('gangs').select('*').execute()
-            return {g['id']: g for g in (result.data or [])}
+            return self._fetch_gangs_with_members()
         except Exception as e:
             logger.error(f"Error getting all gangs: {e}", exc_info=True)
             return {}
@@ -954,16 +1104,23 @@ class SupabaseDatabase:
 
     # === GANG WARS ===
 
-    def create_war(self, war_data: Dict) -> bool:
-        """Create a new war record"""
+    def create_war(self, war_data: Dict) -> Optional[bool]:
+        """
+        Create a new war record unless one of the two gangs is already at war.
+        The check and the insert run in one transaction (create_war_exclusive), so two
+        instances cannot start overlapping wars. Returns False if a gang is busy, None on error.
+        """
         try:
             if not self.is_connected():
+                return None
+            result = self.supabase.rpc('create_war_exclusive', {'p_war': war_data}).execute()
+            if not result.data:
                 return False
-            self.supabase.table('gang_wars').insert(war_data).execute()
+            self._index_active_war(war_data)
             return True
         except Exception as e:
             logger.error(f"Error creating war: {e}", exc_info=True)
-            return False
+            return None
 
     def get_war(self, war_id: str) -> Optional[Dict]:
         """Get a war by id"""
@@ -982,6 +1139,8 @@ class SupabaseDatabase:
             if not self.is_connected() or not kwargs:
                 return False
             self.supabase.table('gang_wars').update(kwargs).eq('war_id', war_id).execute()
+            if kwargs.get('status') and kwargs['status'] not in ACTIVE_WAR_STATUSES:
+                self._unindex_active_war(war_id)
             return True
         except Exception as e:
             logger.error(f"Error updating war: {e}", exc_info=True)
@@ -992,75 +1151,181 @@ class SupabaseDatabase:
         try:
             if not self.is_connected():
                 return []
-            result = self.supabase.table('gang_wars').select('*').in_('status', ['declared', 'preparation', 'active']).execute()
-            return result.data or []
+            result = self.supabase.table('gang_wars').select('*').in_('status', list(ACTIVE_WAR_STATUSES)).execute()
+            wars = result.data or []
+            # Chaque lecture complète reconstruit l'index gang -> guerre en cours
+            self._active_war_by_gang.clear()
+            self._active_war_gangs.clear()
+            for war in wars:
+                self._index_active_war(war)
+            self._active_war_index_expiry = time.time() + ACTIVE_WAR_INDEX_TTL
+            return wars
         except Exception as e:
             logger.error(f"Error getting active wars: {e}", exc_info=True)
             return []
 
-    def get_gang_war_history(self, gang_id: str) -> List[Dict]:
-        """Get war history involving a gang (attacker or defender)"""
+    def _index_active_war(self, war: Dict):
+        if war.get('status') not in ACTIVE_WAR_STATUSES:
+            return
+        gangs = (war['attacker_gang_id'], war['defender_gang_id'])
+        self._active_war_gangs[war['war_id']] = gangs
+        for gang_id in gangs:
+            self._active_war_by_gang[gang_id] = war['war_id']
+
+    def _unindex_active_war(self, war_id: str):
+        for gang_id in self._active_war_gangs.pop(war_id, ()):
+            if self._active_war_by_gang.get(gang_id) == war_id:
+                del self._active_war_by_gang[gang_id]
+
+    def get_gang_war_history(self, gang_id: str, limit: int = 20,
+                             before: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """
+        Get war history involving a gang (attacker or defender), newest first.
+
+        One OR query ordered server-side on (declared_at, war_id); pass the
+        (declared_at, war_id) of the last row as `before` to fetch the next page.
+        """
         try:
             if not self.is_connected():
                 return []
-            attacker = self.supabase.table('gang_wars').select('*').eq('attacker_gang_id', gang_id).execute()
-            defender = self.supabase.table('gang_wars').select('*').eq('defender_gang_id', gang_id).execute()
-            all_wars = (attacker.data or []) + (defender.data or [])
-            return sorted(all_wars, key=lambda x: x.get('declared_at', ''), reverse=True)
+            sides = (f"attacker_gang_id.eq.{gang_id}", f"defender_gang_id.eq.{gang_id}")
+            if before:
+                declared_at, war_id = before
+                keyset = f'or(declared_at.lt."{declared_at}",and(declared_at.eq."{declared_at}",war_id.lt."{war_id}"))'
+                condition = ",".join(f"and({side},{keyset})" for side in sides)
+            else:
+                condition = ",".join(sides)
+            result = (self.supabase.table('gang_wars').select('*')
+                      .or_(condition)
+                      .order('declared_at', desc=True)
+                      .order('war_id', desc=True)
+                      .limit(limit)
+                      .execute())
+            return result.data or []
         except Exception as e:
             logger.error(f"Error getting gang war history: {e}", exc_info=True)
             return []
 
+    def gangs_in_active_war(self, gang_ids: List[str]) -> bool:
+        """Return True if any of the gangs is in an ongoing war, read from the database (no cache)"""
+        try:
+            if not self.is_connected() or not gang_ids:
+                return False
+            ids = ','.join(gang_ids)
+            result = (self.supabase.table('gang_wars').select('war_id')
+                      .in_('status', list(ACTIVE_WAR_STATUSES))
+                      .or_(f"attacker_gang_id.in.({ids}),defender_gang_id.in.({ids})")
+                      .limit(1).execute())
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error checking gangs in active war: {e}", exc_info=True)
+            return False
+
     def gang_in_active_war(self, gang_id: str) -> bool:
-        """Return True if gang is involved in an ongoing war"""
+        """Return True if gang is involved in an ongoing war (in-memory index, up to ACTIVE_WAR_INDEX_TTL old)"""
         try:
             if not self.is_connected():
                 return False
-            active = self.get_active_wars()
-            for war in active:
-                if gang_id in (war.get('attacker_gang_id'), war.get('defender_gang_id')):
-                    return True
-            return False
+            if time.time() >= self._active_war_index_expiry:
+                # Index expiré : une seule requête le reconstruit (guerres créées par d'autres instances)
+                self.get_active_wars()
+            return gang_id in self._active_war_by_gang
         except Exception as e:
             logger.error(f"Error checking gang in active war: {e}", exc_info=True)
             return False
 
+    def get_war_power_inputs(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Load points, gang and rank for several users in one round trip"""
+        try:
+            if not self.is_connected() or not user_ids:
+                return {}
+            result = self.supabase.rpc('get_war_power_inputs', {'p_user_ids': list(user_ids)}).execute()
+            return {row['user_id']: row for row in result.data or []}
+        except Exception as e:
+            logger.error(f"Error getting war power inputs: {e}", exc_info=True)
+            return {}
+
+    def add_war_participants(self, war_id: str, side: str, powers: Dict[str, int]) -> Optional[Dict]:
+        """
+        Append participants to one side of a war and add their power to its running total.
+
+        Returns {'added': [user_id, ...], 'total_power': int}; users already enlisted are skipped.
+        """
+        try:
+            if not self.is_connected():
+                return None
+            result = self.supabase.rpc('add_war_participants', {
+                'p_war_id': war_id,
+                'p_side': side,
+                'p_powers': {user_id: int(power) for user_id, power in powers.items()}
+            }).execute()
+            if not result.data:
+                return None
+            row = result.data[0]
+            return {'added': row.get('added') or [], 'total_power': row.get('total_power') or 0}
+        except Exception as e:
+            logger.error(f"Error adding war participants: {e}", exc_info=True)
+            return None
+
     # === TERRITORIES ===
     
+    def _load_territory_store(self) -> bool:
+        """Recharger entièrement le stockage des territoires s'il a expiré"""
+        if self.territory_store.is_fresh():
+            return True
+        if not self.is_connected():
+            return False
+        result = self.supabase.table('territories').select('*').execute()
+        self.territory_store.load(result.data or [])
+        return True
+
     def get_all_territories(self) -> Dict:
         """Get all territories"""
-        cache_key = "territories"
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
         try:
-            if not self.is_connected():
+            if not self._load_territory_store():
                 return {}
-            
-            result = self.supabase.table('territories').select('*').execute()
-            
-            territories = {}
-            for territory in result.data or []:
-                territories[territory['id']] = territory
-            
-            self._cache_set(cache_key, territories, ttl=60)
-            return territories
-            
+            return self.territory_store.snapshot()
         except Exception as e:
             logger.error(f"Error getting territories: {e}", exc_info=True)
             return {}
-    
+
+    def get_territories_of_gang(self, gang_id: str) -> List[Dict]:
+        """Territories controlled by a gang, served from the reverse index"""
+        try:
+            if not self._load_territory_store():
+                return []
+            return self.territory_store.get_gang_territories(gang_id)
+        except Exception as e:
+            logger.error(f"Error getting territories of gang: {e}", exc_info=True)
+            return []
+
+    def get_territory_income_by_gang(self) -> Dict[str, int]:
+        """Precomputed territory income per controlling gang"""
+        try:
+            if not self._load_territory_store():
+                return {}
+            return self.territory_store.get_income_by_gang()
+        except Exception as e:
+            logger.error(f"Error getting territory income: {e}", exc_info=True)
+            return {}
+
+    @property
+    def territories_version(self) -> int:
+        """Monotonic counter bumped whenever any territory changes"""
+        return self.territory_store.version
+
     def capture_territory(self, territory_id: str, new_gang_id: Optional[str], defense_points: int = 100):
         """Set a territory's controlling gang and reset defense"""
         try:
             if not self.is_connected():
                 return
-            self._cache_invalidate("territories")
             self.supabase.table('territories').update({
                 'controlled_by': new_gang_id,
                 'defense_points': defense_points
             }).eq('id', territory_id).execute()
+            self.territory_store.update(territory_id, controlled_by=new_gang_id, defense_points=defense_points)
         except Exception as e:
+            self.territory_store.invalidate()
             logger.error(f"Error capturing territory: {e}", exc_info=True)
 
     def update_territory_defense(self, territory_id: str, defense_points: int):
@@ -1069,7 +1334,9 @@ class SupabaseDatabase:
             if not self.is_connected():
                 return
             self.supabase.table('territories').update({'defense_points': defense_points}).eq('id', territory_id).execute()
+            self.territory_store.update(territory_id, defense_points=defense_points)
         except Exception as e:
+            self.territory_store.invalidate()
             logger.error(f"Error updating territory defense: {e}", exc_info=True)
 
     def get_territory(self, territory_id: str) -> Optional[Dict]:
@@ -1130,164 +1397,146 @@ class SupabaseDatabase:
     
     # === INVENTORIES ===
     
-    def get_inventory(self, user_id: str) -> List[str]:
-        """Get user inventory"""
+    def get_inventory_counts(self, user_id: str) -> Dict[str, int]:
+        """Get user inventory as {item_id: quantity}"""
+        cache_key = f"inventory:{user_id}"
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         try:
             if not self.is_connected():
-                return []
-            
-            result = self.supabase.table('inventories').select('items').eq('user_id', user_id).execute()
-            
-            if result.data:
-                return result.data[0]['items'] or []
+                return {}
             
-            return []
+            result = self.supabase.table('inventory_items').select('item_id, quantity').eq('user_id', user_id).execute()
+            counts = {row['item_id']: row['quantity'] for row in result.data or [] if row['quantity'] > 0}
+            self._cache_set(cache_key, counts, ttl=15)
+            return counts
             
         except Exception as e:
             logger.error(f"Error getting inventory: {e}", exc_info=True)
-            return []
+            return {}
     
-    def add_item(self, user_id: str, item: str):
-        """Add item to inventory"""
+    def get_inventory(self, user_id: str) -> List[str]:
+        """Get user inventory as a flat list (one entry per unit)"""
+        return [item_id for item_id, quantity in sorted(self.get_inventory_counts(user_id).items())
+                for _ in range(quantity)]
+    
+    def has_item(self, user_id: str, item: str, quantity: int = 1) -> bool:
+        """Check that the user owns at least `quantity` units of an item"""
+        return self.get_inventory_counts(user_id).get(item, 0) >= quantity
+    
+    def grant_items(self, grants: List[Dict]) -> bool:
+        """
+        Add items to one or more inventories in one round trip.
+        
+        grants: [{'user_id', 'item_id', 'quantity'}]
+        """
         try:
             if not self.is_connected():
-                return
+                return False
+            grants = [grant for grant in grants if grant.get('quantity', 1) > 0]
+            if not grants:
+                return True
             
-            current_items = self.get_inventory(user_id)
-            current_items.append(item)
+            self.supabase.rpc('add_inventory_items', {
+                'p_grants': [{'quantity': 1, **grant} for grant in grants]
+            }).execute()
+            self._cache_invalidate(*{f"inventory:{grant['user_id']}" for grant in grants})
+            return True
             
-            self.supabase.table('inventories').upsert({
-                'user_id': user_id,
-                'items': current_items
+        except Exception as e:
+            logger.error(f"Error granting items: {e}", exc_info=True)
+            return False
+    
+    def add_item(self, user_id: str, item: str, quantity: int = 1) -> bool:
+        """Add item(s) to inventory"""
+        return self.grant_items([{'user_id': user_id, 'item_id': item, 'quantity': quantity}])
+    
+    def remove_items(self, user_id: str, item: str, quantity: int = 1, partial: bool = False) -> int:
+        """
+        Remove item(s) atomically and return the quantity removed.
+        
+        Without `partial`, nothing is removed unless the user owns `quantity` units.
+        """
+        try:
+            if not self.is_connected() or quantity <= 0:
+                return 0
+            
+            result = self.supabase.rpc('remove_inventory_item', {
+                'p_user_id': user_id,
+                'p_item_id': item,
+                'p_quantity': quantity,
+                'p_partial': partial
             }).execute()
+            self._cache_invalidate(f"inventory:{user_id}")
+            return int(result.data or 0)
             
         except Exception as e:
-            logger.error(f"Error adding item: {e}", exc_info=True)
+            logger.error(f"Error removing item: {e}", exc_info=True)
+            return 0
     
-    def remove_item(self, user_id: str, item: str) -> bool:
-        """Remove item from inventory"""
+    def remove_item(self, user_id: str, item: str, quantity: int = 1) -> bool:
+        """Remove item(s) from inventory, all or nothing"""
+        return self.remove_items(user_id, item, quantity) == quantity
+    
+    def swap_items(self, user_a: str, item_a: str, user_b: str, item_b: str) -> bool:
+        """Exchange one item_a of user_a against one item_b of user_b atomically (False if either is missing)"""
         try:
             if not self.is_connected():
                 return False
             
-            current_items = self.get_inventory(user_id)
-            
-            if item in current_items:
-                current_items.remove(item)
-                
-                self.supabase.table('inventories').update({
-                    'items': current_items
-                }).eq('user_id', user_id).execute()
-                
-                return True
-            
-            return False
+            result = self.supabase.rpc('swap_inventory_items', {
+                'p_user_a': user_a,
+                'p_item_a': item_a,
+                'p_user_b': user_b,
+                'p_item_b': item_b
+            }).execute()
+            self._cache_invalidate(f"inventory:{user_a}", f"inventory:{user_b}")
+            return bool(result.data)
             
         except Exception as e:
-            logger.error(f"Error removing item: {e}", exc_info=True)
+            logger.error(f"Error swapping items: {e}", exc_info=True)
             return False
     
     # === MIGRATION ===
     
-    def migrate_from_json(self, json_file_path: str):
-        """Migrate data from JSON file to Supabase"""
+    def upsert_rows(self, table: str, rows: List[Dict]) -> bool:
+        """Upsert a batch of rows into a table"""
         try:
             if not self.is_connected():
+                return False
+            if rows:
+                self.supabase.table(table).upsert(rows).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error upserting into {table}: {e}", exc_info=True)
+            return False
+    
+    def migrate_from_json(self, json_file_path: str, batch_size: int = 500, parallelism: int = 4,
+                          dry_run: bool = False) -> Dict:
+        """
+        Migrate data from JSON file to Supabase.
+        
+        The file is streamed entry by entry and upserted in bounded batches; progress is
+        checkpointed per section in bot_state so an interrupted run resumes where it stopped.
+        dry_run parses and maps everything without writing and reports throughput.
+        """
+        try:
+            if not self.is_connected() and not dry_run:
                 logger.error("Cannot migrate: Supabase not connected")
-                return
-            
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+                return {'completed': False, 'sections': {}}
             
             logger.info("Starting migration from JSON to Supabase...")
-            
-            # Migrate users
-            if 'users' in data and data['users']:
-                users_to_insert = []
-                for user_id, user_data in data['users'].items():
-                    users_to_insert.append({
-                        'user_id': user_id,
-                        'points': user_data.get('points', 0)
-                    })
-                
-                if users_to_insert:
-                    self.supabase.table('users').upsert(users_to_insert).execute()
-                    logger.info(f"Migrated {len(users_to_insert)} users")
-            
-            # Migrate cooldowns
-            cooldown_tables = ['rob_cooldowns', 'last_work', 'drug_deal_cooldowns', 'roulette_cooldowns']
-            for table_name in cooldown_tables:
-                if table_name in data and data[table_name]:
-                    cooldowns_to_insert = []
-                    for user_id, cooldown_time in data[table_name].items():
-                        cooldowns_to_insert.append({
-                            'user_id': user_id,
-                            'cooldown_type': table_name,
-                            'cooldown_until': cooldown_time
-                        })
-                    
-                    if cooldowns_to_insert:
-                        self.supabase.table('user_cooldowns').upsert(cooldowns_to_insert).execute()
-                        logger.info(f"Migrated {len(cooldowns_to_insert)} {table_name}")
-            
-            # Migrate Twitter links
-            if 'twitter_links' in data and data['twitter_links']:
-                twitter_links = []
-                for user_id, handle in data['twitter_links'].items():
-                    twitter_links.append({
-                        'user_id': user_id,
-                        'twitter_handle': handle
-                    })
-                
-                if twitter_links:
-                    self.supabase.table('twitter_links').upsert(twitter_links).execute()
-                    logger.info(f"Migrated {len(twitter_links)} Twitter links")
-            
-            # Migrate prison times
-            if 'prison_times' in data and data['prison_times']:
-                prison_times = []
-                for user_id, release_time in data['prison_times'].items():
-                    prison_times.append({
-                        'user_id': user_id,
-                        'release_time': release_time
-                    })
-                
-                if prison_times:
-                    self.supabase.table('prison_times').upsert(prison_times).execute()
-                    logger.info(f"Migrated {len(prison_times)} prison times")
-            
-            # Migrate inventories
-            if 'inventories' in data and data['inventories']:
-                inventories = []
-                for user_id, items in data['inventories'].items():
-                    inventories.append({
-                        'user_id': user_id,
-                        'items': items
-                    })
-                
-                if inventories:
-                    self.supabase.table('inventories').upsert(inventories).execute()
-                    logger.info(f"Migrated {len(inventories)} inventories")
-            
-            # Migrate daily commands
-            if 'daily_commands' in data and data['daily_commands']:
-                daily_commands = []
-                for user_id, dates_data in data['daily_commands'].items():
-                    for date_str, commands in dates_data.items():
-                        daily_commands.append({
-                            'user_id': user_id,
-                            'command_date': date_str,
-                            'commands': commands
-                        })
-                
-                if daily_commands:
-                    self.supabase.table('daily_commands').upsert(daily_commands).execute()
-                    logger.info(f"Migrated {len(daily_commands)} daily command records")
-            
-            logger.info("Migration completed successfully!")
+            from json_migrator import JsonMigrator
+            report = JsonMigrator(self, json_file_path, batch_size=batch_size, parallelism=parallelism,
+                                  dry_run=dry_run).run()
+            if report['completed']:
+                logger.info("Migration completed successfully!")
+            return report
             
         except Exception as e:
             logger.error(f"Error during migration: {e}", exc_info=True)
+            return {'completed': False, 'sections': {}, 'error': str(e)}
     
     # === UTILITY ===
     
@@ -1304,6 +1553,41 @@ class SupabaseDatabase:
         except Exception as e:
             logger.error(f"Error during cleanup: {e}", exc_info=True)
 
+    def purge_old_rows(self, table: str, column: str, cutoff: str, batch_size: int) -> Optional[int]:
+        """Delete one batch of rows older than cutoff; returns rows deleted (None on error)"""
+        try:
+            if not self.is_connected():
+                return None
+            
+            result = self.supabase.rpc('purge_old_rows', {
+                'p_table': table,
+                'p_column': column,
+                'p_cutoff': cutoff,
+                'p_batch': batch_size
+            }).execute()
+            return int(result.data or 0)
+            
+        except Exception as e:
+            logger.error(f"Error purging {table}: {e}", exc_info=True)
+            return None
+    
+    def rollup_ledger_rows(self, table: str, cutoff: str, batch_size: int) -> Optional[int]:
+        """Fold one batch of ledger rows older than cutoff into daily aggregates; returns rows removed"""
+        try:
+            if not self.is_connected():
+                return None
+            
+            result = self.supabase.rpc('rollup_ledger_rows', {
+                'p_table': table,
+                'p_cutoff': cutoff,
+                'p_batch': batch_size
+            }).execute()
+            return int(result.data or 0)
+            
+        except Exception as e:
+            logger.error(f"Error rolling up {table}: {e}", exc_info=True)
+            return None
+
     # === JUSTICE SYSTEM METHODS ===
     
     def arrest_user(self, arrester_id: str, target_id: str, reason: str, prison_time: int) -> bool:
@@ -1525,8 +1809,8 @@ class SupabaseDatabase:
                 return False
             
             # Add items to inventory
-            for _ in range(quantity):
-                self.add_item_to_inventory(target_id, item_id)
+            if not self.add_item(target_id, item_id, quantity):
+                return False
             
             # Log admin action
             log_data = {
@@ -1553,13 +1837,8 @@ class SupabaseDatabase:
             if not self.is_connected():
                 return False, 0
             
-            # Get current inventory
-            inventory = self.get_inventory(target_id)
-            items_to_remove = min(quantity, inventory.count(item_id))
-            
-            # Remove items
-            for _ in range(items_to_remove):
-                self.remove_item_from_inventory(target_id, item_id)
+            # Remove up to `quantity` items
+            items_to_remove = self.remove_items(target_id, item_id, quantity, partial=True)
             
             # Log admin action
             log_data = {
@@ -1897,18 +2176,48 @@ class SupabaseDatabase:
 
     # === BOT STATE (key-value persistence) ===
 
-    def save_bot_state(self, key: str, data: dict):
+    def save_bot_state(self, key: str, data: dict) -> bool:
         """Upsert arbitrary JSON state in the bot_state table (key TEXT, value JSONB)."""
         try:
             if not self.is_connected():
-                return
+                return False
             self.supabase.table('bot_state').upsert({
                 'key': key,
                 'value': data,
                 'updated_at': datetime.now().isoformat()
             }).execute()
+            return True
         except Exception as e:
             logger.error(f"Error saving bot state '{key}': {e}", exc_info=True)
+            return False
+
+    def try_acquire_lease(self, key: str, holder: str, ttl_seconds: float) -> Optional[bool]:
+        """
+        Acquire or renew a lease stored in bot_state. Expiry is checked with the database clock.
+        Returns None when the database could not answer: the holder keeps its lease until it
+        expires locally instead of stepping down on a transient error.
+        """
+        try:
+            if not self.is_connected():
+                return None
+            result = self.supabase.rpc('try_acquire_lease', {
+                'p_key': key,
+                'p_holder': holder,
+                'p_ttl_seconds': ttl_seconds
+            }).execute()
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error acquiring lease '{key}': {e}", exc_info=True)
+            return None
+
+    def release_lease(self, key: str, holder: str):
+        """Release a lease if still held by holder."""
+        try:
+            if not self.is_connected():
+                return
+            self.supabase.rpc('release_lease', {'p_key': key, 'p_holder': holder}).execute()
+        except Exception as e:
+            logger.error(f"Error releasing lease '{key}': {e}", exc_info=True)
 
     def load_bot_state(self, key: str) -> Optional[dict]:
         """Load JSON state from the bot_state table. Returns None if key absent."""
@@ -1919,4 +2228,15 @@ class SupabaseDatabase:
             return result.data[0]['value'] if result.data else None
         except Exception as e:
             logger.error(f"Error loading bot state '{key}': {e}", exc_info=True)
-            return None
\ No newline at end of file
+            return None
+
+    def load_bot_states(self, keys: List[str]) -> Dict[str, dict]:
+        """Load several bot_state keys in one request. Absent keys are omitted."""
+        try:
+            if not self.is_connected() or not keys:
+                return {}
+            result = self.supabase.table('bot_state').select('key, value').in_('key', list(keys)).execute()
+            return {row['key']: row['value'] for row in result.data or []}
+        except Exception as e:
+            logger.error(f"Error loading bot states: {e}", exc_info=True)
+            return {}
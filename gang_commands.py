@@ -15,7 +15,7 @@ class GangCommands(commands.Cog):
         self.bot = bot
         self.db = database
         self.gang_system = GangSystem(database)
-        self.war_system = GangWarSystem(database, self.gang_system)
+        self.war_system = GangWarSystem(database, self.gang_system, scheduler=getattr(bot, 'scheduler', None))
         self.territory_system = TerritorySystem(database, self.gang_system)
 
     # === COMMANDES DE BASE ===
@@ -1,38 +1,76 @@
 import asyncio
 import random
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from gang_system import GangSystem
-from gang_wars import GangWarSystem
+from gang_wars import GangWarSystem, WarStatus, WAR_TIMER_SWEEP_INTERVAL
 from territory_system import TerritorySystem
+from job_scheduler import JobScheduler
+from notification_service import NotificationService
+from config import NOTIFICATION_CONFIG
 import nextcord as discord
 
 logger = logging.getLogger('EngagementBot')
 
+# Préfixe des clés bot_state de l'état volatile (une clé par catégorie)
+VOLATILE_STATE_KEY = 'gang_event_volatile'
+# Fenêtre de regroupement des écritures de l'état volatile (secondes)
+VOLATILE_FLUSH_DELAY = 2.0
+
 class GangEventType:
     """Types d'événements de gang"""
     TERRITORY_INCOME = "territory_income"
     RANDOM_EVENT = "random_event"
-    WAR_UPDATE = "war_update"
     TERRITORY_ATTACK = "territory_attack"
     GANG_BONUS = "gang_bonus"
     RIVAL_ENCOUNTER = "rival_encounter"
     POLICE_RAID = "police_raid"
     TREASURE_HUNT = "treasure_hunt"
 
+@dataclass
+class GangEventBatch:
+    """Effets d'un événement calculés en mémoire, appliqués en une seule écriture"""
+    reason: str
+    vault_deltas: Dict[str, int] = field(default_factory=dict)
+    territory_updates: Dict[str, Dict] = field(default_factory=dict)
+    point_awards: List[Dict] = field(default_factory=list)
+    member_removals: List[Dict] = field(default_factory=list)
+
+    def add_vault(self, gang_id: str, delta: int):
+        if delta:
+            self.vault_deltas[gang_id] = self.vault_deltas.get(gang_id, 0) + delta
+
+    def update_territory(self, territory_id: str, **fields):
+        self.territory_updates.setdefault(territory_id, {}).update(fields)
+
+    def is_empty(self) -> bool:
+        return not (self.vault_deltas or self.territory_updates or self.point_awards or self.member_removals)
+
 class GangEvents:
     """Gestionnaire d'événements automatiques pour les gangs"""
     
-    def __init__(self, database, bot, gang_system: GangSystem, war_system: GangWarSystem, territory_system: TerritorySystem):
+    def __init__(self, database, bot, gang_system: GangSystem, war_system: GangWarSystem, territory_system: TerritorySystem,
+                 scheduler: Optional[JobScheduler] = None):
         self.db = database
         self.bot = bot
         self.gang_system = gang_system
         self.war_system = war_system
         self.territory_system = territory_system
         self.running = False
-        self.event_tasks = []
-        # Volatile in-memory state for temporary game events (reset on restart by design)
+        # Planificateur partagé du bot ; à défaut, un planificateur propre aux événements
+        self._owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(database)
+        self.event_jobs: List[str] = []
+        # Service de diffusion partagé du bot ; à défaut, un service propre aux événements
+        self._owns_notifications = getattr(bot, 'notifications', None) is None
+        self.notifications = getattr(bot, 'notifications', None) or NotificationService(bot, **NOTIFICATION_CONFIG)
+        # Les transitions de guerre sont des échéances ponctuelles sur le même planificateur
+        if self.war_system.scheduler is None:
+            self.war_system.scheduler = self.scheduler
+        self.war_system.add_phase_listener(self._on_war_phase)
+        # Volatile in-memory state for temporary game events, persisted per category in bot_state
         self._volatile: dict = {
             "active_treasures": {},
             "territory_effects": {},
@@ -51,10 +89,6 @@ class GangEvents:
                 "enabled": True,
                 "chance": 0.3  # 30% de chance
             },
-            GangEventType.WAR_UPDATE: {
-                "interval": 600,  # 10 minutes
-                "enabled": True
-            },
             GangEventType.TERRITORY_ATTACK: {
                 "interval": 10800,  # 3 heures
                 "enabled": True,
@@ -111,35 +145,83 @@ class GangEvents:
                 "weight": 15
             }
         ]
+        # Persistance de l'état volatile : seules les catégories modifiées sont écrites, après une courte fenêtre
+        self.volatile_flush_delay = VOLATILE_FLUSH_DELAY
+        self._dirty: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
         # Restaurer l'état volatile depuis la session précédente
         self._load_volatile()
 
     def _load_volatile(self):
-        """Restaure l'état volatile depuis la DB, en ignorant les entrées expirées"""
-        saved = self.db.load_bot_state('gang_event_volatile')
+        """Restaure l'état volatile depuis la DB (une clé par catégorie), en ignorant les entrées expirées"""
+        keys = {f"{VOLATILE_STATE_KEY}.{category}": category for category in self._volatile}
+        saved = {keys[key]: entries for key, entries in self.db.load_bot_states(list(keys)).items()}
+        if not saved:
+            # Ancien format : toutes les catégories sous une seule clé, réécrites séparément au prochain flush
+            saved = self.db.load_bot_state(VOLATILE_STATE_KEY) or {}
+            self._dirty.update(category for category in saved if category in self._volatile)
         if not saved:
             return
         now = datetime.now()
         for category, entries in saved.items():
             if category not in self._volatile:
                 continue
-            for eid, edata in entries.items():
-                expires_key = next((k for k in ('expires_at', 'restore_at') if k in edata), None)
-                if expires_key:
-                    try:
-                        if datetime.fromisoformat(edata[expires_key]) < now:
-                            continue
-                    except (ValueError, KeyError):
-                        pass
+            for eid, edata in (entries or {}).items():
+                if category == "territory_effects":
+                    # Un effet échu doit encore être annulé : il est conservé et restauré au démarrage
+                    self._volatile[category][eid] = edata
+                    continue
+                expires_at = self._expires_at(edata)
+                if expires_at and expires_at < now:
+                    self._dirty.add(category)
+                    continue
                 self._volatile[category][eid] = edata
         logger.info("[GangEvents] État volatile restauré depuis la DB")
 
-    def _persist_volatile(self):
-        """Sauvegarde l'état volatile courant en DB"""
+    @staticmethod
+    def _expires_at(entry: Dict) -> Optional[datetime]:
+        expires_key = next((k for k in ('expires_at', 'restore_at') if k in entry), None)
         try:
-            self.db.save_bot_state('gang_event_volatile', self._volatile)
-        except Exception as e:
-            logger.warning(f"[GangEvents] Échec de la persistance volatile : {e}")
+            return datetime.fromisoformat(entry[expires_key]) if expires_key else None
+        except (TypeError, ValueError):
+            return None
+
+    def _set_volatile(self, category: str, entry_id: str, entry: Dict):
+        """Ajouter une entrée volatile ; elle sera retirée de la mémoire à son expiration"""
+        self._volatile[category][entry_id] = entry
+        self._mark_dirty(category)
+        self._schedule_expiry(category, entry_id, entry)
+
+    def _schedule_expiry(self, category: str, entry_id: str, entry: Dict):
+        expires_at = self._expires_at(entry)
+        if expires_at:
+            self.scheduler.schedule_at(f"gang_events.expire.{category}.{entry_id}", expires_at,
+                                       self._expire_volatile, category, entry_id)
+
+    async def _expire_volatile(self, category: str, entry_id: str):
+        if self._volatile[category].pop(entry_id, None) is not None:
+            self._mark_dirty(category)
+
+    def _mark_dirty(self, category: str):
+        """Noter une catégorie modifiée ; les écritures sont regroupées sur une courte fenêtre"""
+        self._dirty.add(category)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_volatile_later())
+
+    async def _flush_volatile_later(self):
+        await asyncio.sleep(self.volatile_flush_delay)
+        await self._flush_volatile()
+
+    async def _flush_volatile(self):
+        """Écrire uniquement les catégories modifiées depuis la dernière écriture"""
+        dirty, self._dirty = self._dirty, set()
+        for category in dirty:
+            saved = await asyncio.to_thread(self.db.save_bot_state, f"{VOLATILE_STATE_KEY}.{category}",
+                                            dict(self._volatile[category]))
+            if saved is False:
+                # Réessayée avec la prochaine modification ou à l'arrêt
+                self._dirty.add(category)
+                logger.warning(f"[GangEvents] Échec de la persistance volatile ({category})")
 
     async def start_events(self):
         """Démarrer tous les événements automatiques"""
@@ -150,53 +232,51 @@ class GangEvents:
         self.running = True
         logger.info("Starting gang events system...")
         
-        # Créer les tâches pour chaque type d'événement
+        # Une tâche planifiée par type d'événement : les échéances survivent aux redémarrages
         for event_type, config in self.event_config.items():
             if config["enabled"]:
-                task = asyncio.create_task(self._event_loop(event_type, config))
-                self.event_tasks.append(task)
-                logger.info(f"Started event loop for {event_type}")
-        
-        logger.info(f"Gang events system started with {len(self.event_tasks)} active loops")
+                job_name = f"gang_events.{event_type}"
+                self.scheduler.register(job_name, self._handle_event, config["interval"], event_type,
+                                        chance=config.get("chance"))
+                self.event_jobs.append(job_name)
+                logger.info(f"Scheduled {event_type} every {config['interval']}s")
+        
+        await self.war_system.restore_war_timers()
+        self.scheduler.register("gang_wars.sweep", self.war_system.sweep_war_timers, WAR_TIMER_SWEEP_INTERVAL)
+        self.event_jobs.append("gang_wars.sweep")
+        for territory_id, effect in self._volatile["territory_effects"].items():
+            self._schedule_effect_restore(territory_id, effect)
+        for category in ("active_treasures", "black_markets", "temporary_alliances"):
+            for entry_id, entry in self._volatile[category].items():
+                self._schedule_expiry(category, entry_id, entry)
+        if self._dirty:
+            self._mark_dirty(next(iter(self._dirty)))
+        
+        if self._owns_notifications:
+            await self.notifications.start()
+        if self._owns_scheduler:
+            await self.scheduler.start()
+        
+        logger.info(f"Gang events system started with {len(self.event_jobs)} scheduled jobs")
     
     async def stop_events(self):
         """Arrêter tous les événements automatiques"""
         self.running = False
         logger.info("Stopping gang events system...")
         
-        for task in self.event_tasks:
-            task.cancel()
-        
-        await asyncio.gather(*self.event_tasks, return_exceptions=True)
-        self.event_tasks.clear()
+        if self._owns_scheduler:
+            await self.scheduler.stop()
+        if self._owns_notifications:
+            await self.notifications.stop()
+        for job_name in self.event_jobs:
+            self.scheduler.cancel(job_name)
+        self.event_jobs.clear()
+        # Écrire immédiatement les modifications encore en attente
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._flush_volatile()
         logger.info("Gang events system stopped")
     
-    async def _event_loop(self, event_type: str, config: Dict):
-        """Boucle principale pour un type d'événement"""
-        try:
-            while self.running:
-                await asyncio.sleep(config["interval"])
-                
-                if not self.running:
-                    break
-                
-                try:
-                    # Vérifier si l'événement doit se déclencher
-                    should_trigger = True
-                    if "chance" in config:
-                        should_trigger = random.random() < config["chance"]
-                    
-                    if should_trigger:
-                        await self._handle_event(event_type)
-                
-                except Exception as e:
-                    logger.error(f"Error in event loop {event_type}: {e}", exc_info=True)
-        
-        except asyncio.CancelledError:
-            logger.info(f"Event loop {event_type} cancelled")
-        except Exception as e:
-            logger.error(f"Fatal error in event loop {event_type}: {e}", exc_info=True)
-    
     async def _handle_event(self, event_type: str):
         """Gérer un événement spécifique"""
         try:
@@ -204,8 +284,6 @@ class GangEvents:
                 await self._process_territory_income()
             elif event_type == GangEventType.RANDOM_EVENT:
                 await self._trigger_random_event()
-            elif event_type == GangEventType.WAR_UPDATE:
-                await self._update_wars()
             elif event_type == GangEventType.TERRITORY_ATTACK:
                 await self._random_territory_attack()
             elif event_type == GangEventType.GANG_BONUS:
@@ -218,23 +296,11 @@ class GangEvents:
     
     async def _process_territory_income(self):
         """Traiter les revenus des territoires toutes les heures"""
-        territories = self.territory_system.get_all_territories()
-        total_income = 0
-        gangs_updated = 0
-        
-        for territory_id, territory_data in territories.items():
-            if territory_data['controlled_by']:
-                gang_id = territory_data['controlled_by']
-                income = territory_data['income_per_hour']
-                
-                # Ajouter les revenus au coffre du gang
-                success = self.gang_system.add_vault_points(gang_id, income)
-                if success:
-                    total_income += income
-                    gangs_updated += 1
-        
-        if gangs_updated > 0:
-            logger.info(f"Processed territory income: {total_income} points distributed to {gangs_updated} gangs")
+        # Revenus regroupés par gang puis appliqués en un seul incrément groupé
+        income_by_gang = self.territory_system.distribute_territory_income()
+        
+        if income_by_gang:
+            logger.info(f"Processed territory income: {sum(income_by_gang.values())} points distributed to {len(income_by_gang)} gangs")
     
     async def _trigger_random_event(self):
         """Déclencher un événement aléatoire"""
@@ -258,25 +324,30 @@ class GangEvents:
             logger.info(f"Triggering random event: {selected_event['name']}")
             await selected_event["effect"](selected_event)
     
-    async def _update_wars(self):
-        """Mettre à jour l'état des guerres"""
-        active_wars = self.war_system.get_active_wars()
-        
-        for war_id, war_data in active_wars.items():
-            # Vérifier si la guerre doit se terminer
-            if self.war_system.is_war_expired(war_id):
-                await self._end_war(war_id, war_data)
-            
-            # Vérifier si la guerre doit passer en phase active
-            elif war_data['status'] == 'preparation' and self.war_system.should_start_war(war_id):
-                await self._start_war_phase(war_id, war_data)
+    async def _load_snapshot(self) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """Un seul instantané des gangs (avec membres) et des territoires par événement"""
+        return await asyncio.to_thread(
+            lambda: (self.gang_system.get_all_gangs(), self.territory_system.get_all_territories())
+        )
+    
+    async def _commit(self, batch: GangEventBatch) -> Optional[Dict[str, int]]:
+        """Appliquer tous les effets d'un événement en un aller-retour ; retourne les deltas de coffre appliqués"""
+        if batch.is_empty():
+            return {}
+        applied = await asyncio.to_thread(
+            self.db.apply_gang_event, batch.reason, batch.vault_deltas, batch.territory_updates,
+            batch.point_awards, batch.member_removals
+        )
+        if applied is None:
+            logger.warning(f"Gang event {batch.reason} not applied")
+        return applied
     
     async def _random_territory_attack(self):
         """Attaque aléatoire sur un territoire"""
-        territories = self.territory_system.get_all_territories()
+        gangs, territories = await self._load_snapshot()
         controlled_territories = [
             (tid, tdata) for tid, tdata in territories.items() 
-            if tdata['controlled_by']
+            if tdata.get('controlled_by')
         ]
         
         if not controlled_territories:
@@ -288,26 +359,34 @@ class GangEvents:
         
         # Créer une attaque simulée
         attack_strength = random.randint(50, 150)
-        defense_strength = self.territory_system.calculate_defense_strength(territory_id)
+        defense_points = territory_data.get('defense_points') or 0
+        defense_strength = 50 + defense_points // 10
         
+        batch = GangEventBatch(reason="territory_attack")
         if attack_strength > defense_strength:
-            # L'attaque réussit - libérer le territoire
-            self.territory_system.release_territory(territory_id)
-            
-            # Notifier le gang
-            await self._notify_gang_territory_lost(controlling_gang, territory_data['name'])
-            logger.info(f"Territory {territory_data['name']} was lost due to random attack")
+            # L'attaque réussit - libérer le territoire (territory_count du gang ajusté dans la même écriture)
+            batch.update_territory(territory_id, controlled_by=None, defense_points=0)
         else:
             # L'attaque échoue - augmenter légèrement la défense
-            self.territory_system.boost_defense(territory_id, 5)
+            batch.update_territory(territory_id, defense_points=min(1000, defense_points + 5))
+        
+        if await self._commit(batch) is None:
+            return
+        
+        if attack_strength > defense_strength:
+            if controlling_gang in gangs:
+                await self._notify_gang_territory_lost(gangs[controlling_gang], territory_data['name'])
+            logger.info(f"Territory {territory_data['name']} was lost due to random attack")
+        else:
             logger.info(f"Territory {territory_data['name']} successfully defended against random attack")
     
     async def _daily_gang_bonuses(self):
         """Distribuer les bonus quotidiens aux gangs"""
-        gangs = self.gang_system.get_all_gangs()
+        gangs, _ = await self._load_snapshot()
         
+        batch = GangEventBatch(reason="daily_bonus")
         for gang_id, gang_data in gangs.items():
-            member_count = len(gang_data['members'])
+            member_count = gang_data.get('member_count', len(gang_data['members']))
             territory_count = gang_data['territory_count']
             
             # Bonus basé sur l'activité du gang
@@ -315,30 +394,36 @@ class GangEvents:
             member_bonus = member_count * 50
             territory_bonus = territory_count * 200
             
-            total_bonus = base_bonus + member_bonus + territory_bonus
-            
-            # Ajouter le bonus au coffre
-            self.gang_system.add_vault_points(gang_id, total_bonus)
-            
-            # Notifier le gang
-            await self._notify_gang_daily_bonus(gang_id, total_bonus)
+            batch.add_vault(gang_id, base_bonus + member_bonus + territory_bonus)
+        
+        # Tous les coffres crédités en une écriture, puis notifications en file
+        applied = await self._commit(batch)
+        if not applied:
+            return
+        for gang_id, gang_data in gangs.items():
+            if applied.get(str(gang_id)):
+                await self._notify_gang_daily_bonus(gang_data, applied[str(gang_id)])
     
     # Événements spécifiques
     async def _handle_police_raid(self, event_data):
         """Gérer un raid de police"""
-        gangs = self.gang_system.get_all_gangs()
+        gangs, _ = await self._load_snapshot()
         affected_gangs = random.sample(list(gangs.keys()), min(3, len(gangs)))
         
+        batch = GangEventBatch(reason="police_raid")
         for gang_id in affected_gangs:
             # Perte de points du coffre (10-30%)
             vault_points = gangs[gang_id]['vault_points']
             loss_percentage = random.uniform(0.1, 0.3)
-            points_lost = int(vault_points * loss_percentage)
-            
-            self.gang_system.remove_vault_points(gang_id, points_lost)
-            
-            # Notifier le gang
-            await self._notify_gang_police_raid(gang_id, points_lost)
+            batch.add_vault(gang_id, -int(vault_points * loss_percentage))
+        
+        applied = await self._commit(batch)
+        if applied is None:
+            return
+        
+        for gang_id in affected_gangs:
+            # Retrait borné au solde réel au moment de l'écriture
+            await self._notify_gang_police_raid(gangs[gang_id], -applied.get(str(gang_id), 0))
         
         # Notification globale
         await self._send_global_notification(
@@ -358,13 +443,12 @@ class GangEvents:
         
         # Le premier gang à réagir obtient le trésor
         treasure_id = f"treasure_{datetime.now().timestamp()}"
-        self._volatile["active_treasures"][treasure_id] = {
+        self._set_volatile("active_treasures", treasure_id, {
             "value": treasure_value,
             "location": treasure_location,
             "created_at": datetime.now().isoformat(),
             "claimed": False
-        }
-        self._persist_volatile()
+        })
         
         await self._send_global_notification(
             "💰 Trésor Découvert",
@@ -375,7 +459,7 @@ class GangEvents:
     
     async def _handle_betrayal(self, event_data):
         """Gérer une trahison dans un gang"""
-        gangs = self.gang_system.get_all_gangs()
+        gangs, _ = await self._load_snapshot()
         eligible_gangs = [
             (gid, gdata) for gid, gdata in gangs.items() 
             if len(gdata['members']) > 2  # Au moins 3 membres
@@ -387,30 +471,32 @@ class GangEvents:
         gang_id, gang_data = random.choice(eligible_gangs)
         
         # Sélectionner un membre traître (pas le chef)
-        members = [mid for mid in gang_data['members'].keys() if mid != gang_data['boss_id']]
+        members = [mid for mid in gang_data['members'].keys() if mid != gang_data.get('boss_id')]
         if not members:
             return
         
         traitor_id = random.choice(members)
         
-        # Le traître vole une partie du coffre et quitte
-        vault_points = gang_data['vault_points']
-        stolen_amount = int(vault_points * random.uniform(0.15, 0.35))
-        
-        self.gang_system.remove_vault_points(gang_id, stolen_amount)
-        self.gang_system.remove_member(gang_id, traitor_id)
+        # Le traître vole une partie du coffre et quitte le gang : tout est appliqué ensemble,
+        # et il ne reçoit que ce qui a réellement été retiré du coffre
+        amount = int(gang_data['vault_points'] * random.uniform(0.15, 0.35))
+        batch = GangEventBatch(reason="betrayal")
+        batch.add_vault(gang_id, -amount)
+        batch.member_removals.append({"gang_id": gang_id, "user_id": traitor_id})
+        batch.point_awards.append({"user_id": traitor_id, "amount": amount, "reason": "betrayal", "source_gang": gang_id})
         
-        # Donner les points volés au traître
-        self.db.add_points(traitor_id, stolen_amount)
+        applied = await self._commit(batch)
+        if applied is None:
+            return
         
-        await self._notify_gang_betrayal(gang_id, traitor_id, stolen_amount)
+        await self._notify_gang_betrayal(gang_data, traitor_id, -applied.get(str(gang_id), 0))
     
     async def _handle_territory_revolt(self, event_data):
         """Gérer une révolte de territoire"""
-        territories = self.territory_system.get_all_territories()
+        gangs, territories = await self._load_snapshot()
         controlled_territories = [
             (tid, tdata) for tid, tdata in territories.items() 
-            if tdata['controlled_by']
+            if tdata.get('controlled_by') and tid not in self._volatile["territory_effects"]
         ]
         
         if not controlled_territories:
@@ -420,21 +506,52 @@ class GangEvents:
         controlling_gang = territory_data['controlled_by']
         
         # Réduire les revenus du territoire temporairement
-        original_income = territory_data['income_per_hour']
+        original_income = territory_data.get('income_bonus') or 0
         reduced_income = int(original_income * 0.5)
         
-        self.territory_system.set_territory_income(territory_id, reduced_income)
+        batch = GangEventBatch(reason="territory_revolt")
+        batch.update_territory(territory_id, income_bonus=reduced_income)
+        if await self._commit(batch) is None:
+            return
         
         # Programmer la restauration dans 6 heures
         restore_time = datetime.now() + timedelta(hours=6)
-        self._volatile["territory_effects"][territory_id] = {
+        effect = {
             "type": "revolt",
             "original_income": original_income,
             "restore_at": restore_time.isoformat()
         }
-        self._persist_volatile()
+        self._volatile["territory_effects"][territory_id] = effect
+        self._mark_dirty("territory_effects")
+        self._schedule_effect_restore(territory_id, effect)
         
-        await self._notify_gang_territory_revolt(controlling_gang, territory_data['name'])
+        if controlling_gang in gangs:
+            await self._notify_gang_territory_revolt(gangs[controlling_gang], territory_data['name'])
+    
+    def _schedule_effect_restore(self, territory_id: str, effect: Dict):
+        """Programmer l'annulation d'un effet de territoire (immédiate s'il est échu)"""
+        try:
+            restore_at = datetime.fromisoformat(effect["restore_at"])
+        except (KeyError, ValueError):
+            restore_at = datetime.now()
+        self.scheduler.schedule_at(f"gang_events.restore.{territory_id}", restore_at,
+                                   self._restore_territory_effect, territory_id)
+    
+    async def _restore_territory_effect(self, territory_id: str):
+        """Rétablir les revenus d'un territoire après une révolte"""
+        effect = self._volatile["territory_effects"].get(territory_id)
+        if not effect:
+            return
+        batch = GangEventBatch(reason="territory_revolt_end")
+        batch.update_territory(territory_id, income_bonus=effect["original_income"])
+        if await self._commit(batch) is None:
+            # Nouvelle tentative plus tard, l'effet reste enregistré
+            self.scheduler.schedule_at(f"gang_events.restore.{territory_id}", datetime.now() + timedelta(minutes=5),
+                                       self._restore_territory_effect, territory_id)
+            return
+        del self._volatile["territory_effects"][territory_id]
+        self._mark_dirty("territory_effects")
+        logger.info(f"Territory {territory_id} income restored after revolt")
     
     async def _handle_black_market(self, event_data):
         """Gérer l'apparition d'un marché noir"""
@@ -447,13 +564,12 @@ class GangEvents:
         ]
         
         market_id = f"market_{datetime.now().timestamp()}"
-        self._volatile["black_markets"][market_id] = {
+        self._set_volatile("black_markets", market_id, {
             "items": market_items,
             "created_at": datetime.now().isoformat(),
             "expires_at": (datetime.now() + timedelta(hours=2)).isoformat(),
             "purchases": {}
-        }
-        self._persist_volatile()
+        })
         
         items_text = "\n".join([f"{item['name']} - {item['price']:,} points" for item in market_items])
         
@@ -466,11 +582,11 @@ class GangEvents:
     
     async def _handle_temporary_alliance(self, event_data):
         """Gérer une alliance temporaire"""
-        gangs = list(self.gang_system.get_all_gangs().keys())
+        gangs, _ = await self._load_snapshot()
         if len(gangs) < 2:
             return
         
-        gang1, gang2 = random.sample(gangs, 2)
+        gang1, gang2 = random.sample(list(gangs), 2)
         
         # Créer l'alliance temporaire
         alliance_id = f"alliance_{datetime.now().timestamp()}"
@@ -486,11 +602,10 @@ class GangEvents:
             }
         }
         
-        self._volatile["temporary_alliances"][alliance_id] = alliance_data
-        self._persist_volatile()
+        self._set_volatile("temporary_alliances", alliance_id, alliance_data)
         
-        gang1_info = self.gang_system.get_gang_info(gang1)
-        gang2_info = self.gang_system.get_gang_info(gang2)
+        gang1_info = gangs[gang1]
+        gang2_info = gangs[gang2]
         
         await self._send_global_notification(
             "🤝 Alliance Temporaire",
@@ -500,19 +615,17 @@ class GangEvents:
         )
     
     # Méthodes de notification
-    async def _notify_gang_territory_lost(self, gang_id: str, territory_name: str):
+    async def _notify_gang_territory_lost(self, gang: Dict, territory_name: str):
         """Notifier qu'un gang a perdu un territoire"""
-        gang_info = self.gang_system.get_gang_info(gang_id)
-        
         embed = discord.Embed(
             title="💀 Territoire Perdu",
             description=f"Votre gang a perdu le contrôle de **{territory_name}** suite à une attaque !",
             color=0xFF0000
         )
         
-        await self._send_gang_notification(gang_id, embed)
+        await self._send_gang_notification(gang, embed)
     
-    async def _notify_gang_daily_bonus(self, gang_id: str, bonus_amount: int):
+    async def _notify_gang_daily_bonus(self, gang: Dict, bonus_amount: int):
         """Notifier le bonus quotidien"""
         embed = discord.Embed(
             title="💰 Bonus Quotidien",
@@ -520,9 +633,9 @@ class GangEvents:
             color=0x00FF00
         )
         
-        await self._send_gang_notification(gang_id, embed)
+        await self._send_gang_notification(gang, embed)
     
-    async def _notify_gang_police_raid(self, gang_id: str, points_lost: int):
+    async def _notify_gang_police_raid(self, gang: Dict, points_lost: int):
         """Notifier d'un raid de police"""
         embed = discord.Embed(
             title="🚨 Raid de Police",
@@ -530,9 +643,9 @@ class GangEvents:
             color=0xFF0000
         )
         
-        await self._send_gang_notification(gang_id, embed)
+        await self._send_gang_notification(gang, embed)
     
-    async def _notify_gang_betrayal(self, gang_id: str, traitor_id: str, stolen_amount: int):
+    async def _notify_gang_betrayal(self, gang: Dict, traitor_id: str, stolen_amount: int):
         """Notifier d'une trahison"""
         embed = discord.Embed(
             title="🗡️ Trahison",
@@ -540,9 +653,9 @@ class GangEvents:
             color=0x8B0000
         )
         
-        await self._send_gang_notification(gang_id, embed)
+        await self._send_gang_notification(gang, embed)
     
-    async def _notify_gang_territory_revolt(self, gang_id: str, territory_name: str):
+    async def _notify_gang_territory_revolt(self, gang: Dict, territory_name: str):
         """Notifier d'une révolte de territoire"""
         embed = discord.Embed(
             title="⚡ Révolte de Territoire",
@@ -551,24 +664,15 @@ class GangEvents:
             color=0xFFA500
         )
         
-        await self._send_gang_notification(gang_id, embed)
+        await self._send_gang_notification(gang, embed)
     
-    async def _send_gang_notification(self, gang_id: str, embed: discord.Embed):
-        """Envoyer une notification à tous les membres d'un gang"""
+    async def _send_gang_notification(self, gang_info: Dict, embed: discord.Embed):
+        """Envoyer une notification à tous les membres d'un gang (données de l'instantané de l'événement)"""
         try:
-            gang_info = self.gang_system.get_gang_info(gang_id)
-            if not gang_info:
-                return
-            
-            # Envoyer le message au chef du gang
-            boss_id = int(gang_info['boss_id'])
-            boss_user = self.bot.get_user(boss_id)
-            
-            if boss_user:
-                try:
-                    await boss_user.send(embed=embed)
-                except discord.Forbidden:
-                    logger.warning(f"Cannot send DM to gang boss {boss_id}")
+            members = set(gang_info.get('members') or ())
+            if gang_info.get('boss_id'):
+                members.add(gang_info['boss_id'])
+            self.notifications.notify_users(members, embed)
         
         except Exception as e:
             logger.error(f"Error sending gang notification: {e}", exc_info=True)
@@ -583,52 +687,24 @@ class GangEvents:
                 timestamp=datetime.now()
             )
             
-            # Envoyer dans un canal spécifique si configuré
-            for guild in self.bot.guilds:
-                # Chercher un canal nommé "gang-events" ou similaire
-                channel = discord.utils.get(guild.channels, name="gang-events")
-                if not channel:
-                    channel = discord.utils.get(guild.channels, name="general")
-                
-                if channel and channel.permissions_for(guild.me).send_messages:
-                    try:
-                        await channel.send(embed=embed)
-                    except discord.Forbidden:
-                        logger.warning(f"Cannot send message to channel {channel.id} in guild {guild.id}")
+            # Salons d'annonce résolus une fois par serveur, envois répartis sur les workers
+            self.notifications.broadcast(embed)
         
         except Exception as e:
             logger.error(f"Error sending global notification: {e}", exc_info=True)
     
-    async def _end_war(self, war_id: str, war_data: Dict):
-        """Terminer une guerre"""
-        try:
-            winner_gang = self.war_system.calculate_war_winner(war_id)
-            rewards = self.war_system.calculate_war_rewards(war_id, winner_gang)
-            
-            # Distribuer les récompenses
-            if winner_gang:
-                self.gang_system.add_vault_points(winner_gang, rewards['points'])
-                self.gang_system.add_reputation(winner_gang, rewards['reputation'])
-            
-            # Marquer la guerre comme terminée
-            self.war_system.end_war(war_id, winner_gang, rewards)
-            
-            # Notifier les gangs participants
-            await self._notify_war_ended(war_data, winner_gang, rewards)
-            
-            logger.info(f"War {war_id} ended, winner: {winner_gang}")
-        
-        except Exception as e:
-            logger.error(f"Error ending war {war_id}: {e}", exc_info=True)
+    async def _on_war_phase(self, war_data: Dict, status: str):
+        """Notifier les changements de phase des guerres"""
+        if status == WarStatus.ACTIVE.value:
+            await self._start_war_phase(war_data)
+        elif status == WarStatus.FINISHED.value:
+            await self._notify_war_ended(war_data)
     
-    async def _start_war_phase(self, war_id: str, war_data: Dict):
-        """Démarrer la phase active d'une guerre"""
+    async def _start_war_phase(self, war_data: Dict):
+        """Annoncer le début de la phase active d'une guerre"""
         try:
-            self.war_system.start_war_active_phase(war_id)
-            
-            # Notifier le début de la guerre
-            attacker_gang = self.gang_system.get_gang_info(war_data['attacker_gang'])
-            defender_gang = self.gang_system.get_gang_info(war_data['defender_gang'])
+            attacker_gang = self.gang_system.get_gang_info(war_data['attacker_gang_id'])
+            defender_gang = self.gang_system.get_gang_info(war_data['defender_gang_id'])
             
             await self._send_global_notification(
                 "⚔️ Guerre Commencée",
@@ -636,47 +712,35 @@ class GangEvents:
                 0xFF4500
             )
             
-            logger.info(f"War {war_id} active phase started")
+            logger.info(f"War {war_data['war_id']} active phase started")
         
         except Exception as e:
-            logger.error(f"Error starting war phase {war_id}: {e}", exc_info=True)
+            logger.error(f"Error starting war phase {war_data.get('war_id')}: {e}", exc_info=True)
     
-    async def _notify_war_ended(self, war_data: Dict, winner_gang: str, rewards: Dict):
-        """Notifier la fin d'une guerre"""
+    async def _notify_war_ended(self, war_data: Dict):
+        """Notifier la fin d'une guerre (résultats déjà appliqués par process_war_results)"""
         try:
-            attacker_gang = self.gang_system.get_gang_info(war_data['attacker_gang'])
-            defender_gang = self.gang_system.get_gang_info(war_data['defender_gang'])
-            winner_info = self.gang_system.get_gang_info(winner_gang) if winner_gang else None
+            attacker_gang = self.gang_system.get_gang_info(war_data['attacker_gang_id'])
+            defender_gang = self.gang_system.get_gang_info(war_data['defender_gang_id'])
+            winner = war_data.get('winner')
+            winner_info = attacker_gang if winner == 'attacker' else defender_gang if winner == 'defender' else None
+            rewards = war_data.get('rewards') or {}
             
             if winner_info:
                 title = "🏆 Victoire de Guerre"
-                description = f"**{winner_info['name']}** remporte la guerre !"
+                description = f"**{winner_info['name']}** remporte la guerre contre "
+                description += f"**{defender_gang['name'] if winner == 'attacker' else attacker_gang['name']}** !"
+                if rewards.get('individual_reward'):
+                    description += f"\n💰 {rewards['individual_reward']:,} points par participant"
+                if rewards.get('vault_stolen'):
+                    description += f"\n🏦 {rewards['vault_stolen']:,} points pillés dans le coffre"
                 color = 0x00FF00
             else:
                 title = "⚔️ Guerre Terminée"
-                description = "La guerre se termine par un match nul."
+                description = f"La guerre entre **{attacker_gang['name']}** et **{defender_gang['name']}** se termine par un match nul."
                 color = 0xFFA500
             
-            embed = discord.Embed(
-                title=title,
-                description=description,
-                color=color
-            )
-            
-            embed.add_field(
-                name="Participants",
-                value=f"{attacker_gang['name']} vs {defender_gang['name']}",
-                inline=False
-            )
-            
-            if winner_gang and rewards:
-                embed.add_field(
-                    name="Récompenses",
-                    value=f"💰 {rewards['points']:,} points\n⭐ {rewards['reputation']} réputation",
-                    inline=True
-                )
-            
-            await self._send_global_notification(title, embed.description, color)
+            await self._send_global_notification(title, description, color)
         
         except Exception as e:
             logger.error(f"Error notifying war end: {e}", exc_info=True)
@@ -686,10 +750,13 @@ async def setup_gang_events(bot, database):
     """Configurer et démarrer le système d'événements de gang"""
     try:
         gang_system = GangSystem(database)
-        war_system = GangWarSystem(database, gang_system)
+        # Réutiliser le système de guerres des commandes : les déclarations y programment leurs échéances
+        gang_cog = bot.get_cog('GangCommands') if hasattr(bot, 'get_cog') else None
+        war_system = getattr(gang_cog, 'war_system', None) or GangWarSystem(database, gang_system, scheduler=getattr(bot, 'scheduler', None))
         territory_system = TerritorySystem(database, gang_system)
         
-        gang_events = GangEvents(database, bot, gang_system, war_system, territory_system)
+        gang_events = GangEvents(database, bot, gang_system, war_system, territory_system,
+                                 scheduler=getattr(bot, 'scheduler', None))
         await gang_events.start_events()
         
         # Stocker la référence pour pouvoir l'arrêter plus tard
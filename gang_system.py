@@ -318,22 +318,46 @@ class GangSystem:
                 remaining = self.daily_vault_limit - daily_contributions
                 return False, f"Limite quotidienne atteinte. Vous pouvez encore contribuer {remaining} points aujourd'hui."
             
-            gang_data = self.get_gang_info(gang_id)
-            if not gang_data:
-                return False, "Erreur lors de la récupération du gang."
-            
             # Transfer points via Supabase
-            self.db.remove_points(user_id, amount)
-            self.db.update_gang_vault(gang_id, gang_data["vault_points"] + amount)
+            if not self.db.remove_points(user_id, amount):
+                return False, "Vous n'avez pas assez de points."
+            result = self.db.apply_gang_vault_delta(gang_id, amount, reason="contribution", actor_id=user_id)
+            if result is None:
+                # Rendre les points si le coffre n'a pas pu être crédité
+                self.db.add_points(user_id, amount, reason="Vault contribution refund")
+                return False, "Erreur lors de la récupération du gang."
             self.db.record_daily_contribution(user_id, amount)
             
-            new_vault = gang_data["vault_points"] + amount
-            return True, f"Vous avez contribué {amount} points au coffre du gang ! Total du coffre: {new_vault}"
+            return True, f"Vous avez contribué {amount} points au coffre du gang ! Total du coffre: {result['balance']}"
             
         except Exception as e:
             logger.error(f"Error contributing to vault: {e}", exc_info=True)
             return False, "Erreur lors de la contribution."
     
+    def add_vault_points(self, gang_id: str, amount: int, reason: str = "", actor_id: str = None) -> bool:
+        """Credit a gang vault (server-side increment, logged in the vault ledger)"""
+        try:
+            return self.db.apply_gang_vault_delta(gang_id, amount, reason=reason, actor_id=actor_id) is not None
+        except Exception as e:
+            logger.warning(f"Error adding vault points: {e}")
+            return False
+    
+    def remove_vault_points(self, gang_id: str, amount: int, reason: str = "", actor_id: str = None,
+                            allow_partial: bool = False) -> Optional[int]:
+        """
+        Debit a gang vault without going below zero, return the amount actually removed
+        (0 is a valid result, e.g. a free capture) or None if the debit was refused or failed
+        """
+        if amount == 0:
+            return 0
+        try:
+            result = self.db.apply_gang_vault_delta(gang_id, -amount, reason=reason, actor_id=actor_id,
+                                                    allow_partial=allow_partial)
+            return -result['applied'] if result else None
+        except Exception as e:
+            logger.warning(f"Error removing vault points: {e}")
+            return None
+    
     def get_daily_contributions(self, user_id: str) -> int:
         """Get user's daily contributions"""
         try:
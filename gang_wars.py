@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import random
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from enum import Enum
 
 logger = logging.getLogger('EngagementBot')
@@ -17,12 +19,30 @@ class WarType(Enum):
     REPUTATION = "reputation"
     VAULT_RAID = "vault_raid"
 
+# Multiplicateur de puissance par rang (clés en minuscules)
+RANK_POWER_MULTIPLIERS = {
+    "recrue": 1.0,
+    "membre": 1.2,
+    "lieutenant": 1.5,
+    "boss": 2.0,
+    "chef": 2.0
+}
+MIN_WAR_POWER = 50
+# Délai avant de retenter une transition de phase dont l'écriture a échoué
+WAR_TIMER_RETRY_DELAY = 60
+# Balayage du leader : guerres déclarées sur une autre instance ou transitions échues
+WAR_TIMER_SWEEP_INTERVAL = 60
+
 class GangWarSystem:
-    def __init__(self, database, gang_system):
+    def __init__(self, database, gang_system, scheduler=None):
         self.db = database
         self.gang_system = gang_system
+        # Planificateur partagé : une échéance précise par transition de phase, sans polling
+        self.scheduler = scheduler
+        self._phase_listeners: List[Callable[[Dict, str], Awaitable[None]]] = []
         self.war_declaration_cost = 5000
         self.preparation_time = 1800  # 30 minutes
+        self.preparation_phase = 300  # 5 minutes entre PREPARATION et ACTIVE
         self.war_duration = 3600  # 1 hour
 
     def declare_war(self, attacker_gang_id: str, defender_gang_id: str, war_type: WarType, stake: str = None) -> Tuple[bool, str]:
@@ -40,7 +60,8 @@ class GangWarSystem:
             if attacker_data["vault_points"] < self.war_declaration_cost:
                 return False, f"Votre gang a besoin de {self.war_declaration_cost} points dans le coffre pour déclarer la guerre."
 
-            if self.db.gang_in_active_war(attacker_gang_id) or self.db.gang_in_active_war(defender_gang_id):
+            # Lecture directe en base : l'index mémoire peut ignorer une guerre créée par une autre instance
+            if self.db.gangs_in_active_war([attacker_gang_id, defender_gang_id]):
                 return False, "L'un des gangs est déjà en guerre."
 
             now = datetime.now()
@@ -63,12 +84,19 @@ class GangWarSystem:
                 "rewards": {}
             }
 
-            if not self.db.create_war(war_data):
-                return False, "Erreur lors de la création de la guerre."
+            # Deduct declaration cost (atomic, floor-checked)
+            if self.gang_system.remove_vault_points(attacker_gang_id, self.war_declaration_cost, reason=f"war_declaration:{war_id}") is None:
+                return False, f"Votre gang a besoin de {self.war_declaration_cost} points dans le coffre pour déclarer la guerre."
 
-            # Deduct declaration cost
-            self.db.update_gang_vault(attacker_gang_id, attacker_data["vault_points"] - self.war_declaration_cost)
+            created = self.db.create_war(war_data)
+            if not created:
+                self.gang_system.add_vault_points(attacker_gang_id, self.war_declaration_cost, reason=f"war_declaration_refund:{war_id}")
+                if created is False:
+                    # Guerre déclarée entre-temps (autre instance) : refusée de façon atomique en base
+                    return False, "L'un des gangs est déjà en guerre."
+                return False, "Erreur lors de la création de la guerre."
 
+            self.schedule_war_timer(war_data)
             return True, f"Guerre déclarée contre '{defender_data['name']}' ! La guerre commencera dans {self.preparation_time//60} minutes."
 
         except Exception as e:
@@ -78,7 +106,9 @@ class GangWarSystem:
     def join_war(self, user_id: str, side: str) -> Tuple[bool, str]:
         """Join an active war"""
         try:
-            gang_id = self.gang_system.get_user_gang(user_id)
+            # Gang, points et rang du membre en une seule requête
+            inputs = self.db.get_war_power_inputs([user_id]).get(user_id, {})
+            gang_id = inputs.get("gang_id")
             if not gang_id:
                 return False, "Vous devez être membre d'un gang pour participer à une guerre."
 
@@ -93,26 +123,16 @@ class GangWarSystem:
             if not war_data:
                 return False, "Votre gang n'est pas en guerre actuellement."
 
-            if gang_id == war_data["attacker_gang_id"]:
-                participant_side = "attackers"
-                side_name = "attaquants"
-            else:
-                participant_side = "defenders"
-                side_name = "défenseurs"
-
-            participants = war_data["participants"]
-            if user_id in participants[participant_side]:
+            side_name = "attaquants" if gang_id == war_data["attacker_gang_id"] else "défenseurs"
+            if user_id in war_data["participants"][self._participant_side(war_data, gang_id)]:
                 return False, f"Vous participez déjà comme {side_name}."
 
-            user_power = self._calculate_user_war_power(user_id)
-            participants[participant_side].append(user_id)
-
-            power_field = "attacker_power" if participant_side == "attackers" else "defender_power"
-            new_power = war_data[power_field] + user_power
-
-            self.db.update_war(war_data["war_id"],
-                               participants=participants,
-                               **{power_field: new_power})
+            user_power = self._war_power(inputs)
+            added = self._enlist(war_data, gang_id, {user_id: user_power})
+            if added is None:
+                return False, "Erreur lors de la participation à la guerre."
+            if not added:
+                return False, f"Vous participez déjà comme {side_name}."
 
             return True, f"Vous rejoignez la guerre comme {side_name} ! Puissance ajoutée: {user_power}"
 
@@ -120,37 +140,75 @@ class GangWarSystem:
             logger.error(f"Error joining war: {e}", exc_info=True)
             return False, "Erreur lors de la participation à la guerre."
 
-    def _calculate_user_war_power(self, user_id: str) -> int:
-        """Calculate user's power contribution to war"""
-        try:
-            user_points = self.db.get_user_points(user_id)
-            gang_id = self.gang_system.get_user_gang(user_id)
-
-            if not gang_id:
-                return 50
-
-            gang_data = self.gang_system.get_gang_info(gang_id)
-            member_data = gang_data["members"].get(user_id, {})
-
-            base_power = min(user_points // 100, 1000)
-
-            rank_bonus = {
-                "recrue": 1.0,
-                "Recrue": 1.0,
-                "membre": 1.2,
-                "Membre": 1.2,
-                "lieutenant": 1.5,
-                "Lieutenant": 1.5,
-                "boss": 2.0,
-                "Chef": 2.0
-            }
+    def enlist_members(self, war_data: Dict, gang_id: str, user_ids: List[str]) -> Tuple[int, List[str]]:
+        """
+        Enrôler plusieurs membres d'un gang en une fois
 
-            power = int(base_power * rank_bonus.get(member_data.get("rank", "recrue"), 1.0))
-            return max(power, 50)
+        Les puissances sont calculées sur une seule lecture puis ajoutées au total du camp
+        par un incrément côté serveur : process_war_results n'a rien à recalculer.
 
+        Returns:
+            (puissance ajoutée, membres effectivement enrôlés)
+        """
+        try:
+            powers = self.calculate_war_powers(user_ids, gang_id=gang_id)
+            if not powers:
+                return 0, []
+            added = self._enlist(war_data, gang_id, powers) or []
+            return sum(powers[user_id] for user_id in added), added
+        except Exception as e:
+            logger.error(f"Error enlisting war members: {e}", exc_info=True)
+            return 0, []
+
+    @staticmethod
+    def _participant_side(war_data: Dict, gang_id: str) -> str:
+        return "attackers" if gang_id == war_data["attacker_gang_id"] else "defenders"
+
+    def _enlist(self, war_data: Dict, gang_id: str, powers: Dict[str, int]) -> Optional[List[str]]:
+        """Ajouter des participants et incrémenter le total de leur camp ; None en cas d'échec"""
+        side = self._participant_side(war_data, gang_id)
+        result = self.db.add_war_participants(war_data["war_id"], side, powers)
+        if result is None:
+            return None
+        # Garder la copie locale alignée sur le total tenu par la base
+        power_field = "attacker_power" if side == "attackers" else "defender_power"
+        war_data[power_field] = result["total_power"]
+        war_data["participants"][side].extend(result["added"])
+        return result["added"]
+
+    @staticmethod
+    def _war_power(inputs: Dict) -> int:
+        """Puissance d'un membre à partir de ses points et de son rang"""
+        if not inputs.get("gang_id"):
+            return MIN_WAR_POWER
+        base_power = min((inputs.get("points") or 0) // 100, 1000)
+        multiplier = RANK_POWER_MULTIPLIERS.get((inputs.get("rank") or "recrue").lower(), 1.0)
+        return max(int(base_power * multiplier), MIN_WAR_POWER)
+
+    def calculate_war_powers(self, user_ids: List[str], gang_id: str = None) -> Dict[str, int]:
+        """
+        Calculer la puissance de guerre de plusieurs membres en une requête
+
+        Args:
+            user_ids: Membres à évaluer
+            gang_id: Si fourni, les utilisateurs hors de ce gang sont ignorés
+        """
+        try:
+            inputs = self.db.get_war_power_inputs(list(user_ids))
+            powers = {}
+            for user_id in user_ids:
+                row = inputs.get(user_id, {})
+                if gang_id is not None and row.get("gang_id") != gang_id:
+                    continue
+                powers[user_id] = self._war_power(row)
+            return powers
         except Exception as e:
-            logger.error(f"Error calculating user war power: {e}", exc_info=True)
-            return 50
+            logger.error(f"Error calculating war powers: {e}", exc_info=True)
+            return {} if gang_id is not None else dict.fromkeys(user_ids, MIN_WAR_POWER)
+
+    def _calculate_user_war_power(self, user_id: str) -> int:
+        """Calculate user's power contribution to war"""
+        return self.calculate_war_powers([user_id]).get(user_id, MIN_WAR_POWER)
 
     def process_war_results(self, war_id: str) -> Tuple[bool, str]:
         """Process war results and distribute rewards"""
@@ -209,9 +267,13 @@ class GangWarSystem:
             stolen_amount = 0
 
             if war_type == WarType.VAULT_RAID:
-                stolen_amount = int(loser_gang["vault_points"] * 0.2)
-                self.db.update_gang_vault(loser_gang_id, loser_gang["vault_points"] - stolen_amount)
-                self.db.update_gang_vault(winner_gang_id, winner_gang["vault_points"] + stolen_amount)
+                # Le retrait est borné au solde réel : seul le montant effectivement pris est versé
+                stolen_amount = self.gang_system.remove_vault_points(
+                    loser_gang_id, int(loser_gang["vault_points"] * 0.2),
+                    reason=f"war_raid:{war_data['war_id']}", allow_partial=True
+                ) or 0
+                if stolen_amount:
+                    self.gang_system.add_vault_points(winner_gang_id, stolen_amount, reason=f"war_raid:{war_data['war_id']}")
                 rewards["vault_stolen"] = stolen_amount
 
             elif war_type == WarType.TERRITORY:
@@ -238,345 +300,97 @@ class GangWarSystem:
         """Get all active wars"""
         return self.db.get_active_wars()
 
-    def get_gang_war_history(self, gang_id: str) -> List[Dict]:
-        """Get war history for a gang"""
-        return self.db.get_gang_war_history(gang_id)
-
-    async def auto_update_wars(self):
-        """Automatically update war statuses"""
-        try:
-            current_time = datetime.now()
-            active_wars = self.db.get_active_wars()
-
-            for war_data in active_wars:
-                war_id = war_data["war_id"]
-
-                if war_data["status"] == WarStatus.DECLARED.value:
-                    start_time = datetime.fromisoformat(war_data["starts_at"])
-                    if current_time >= start_time:
-                        self.db.update_war(war_id, status=WarStatus.PREPARATION.value)
-                        logger.info(f"War {war_id} moved to PREPARATION phase")
-
-                elif war_data["status"] == WarStatus.PREPARATION.value:
-                    start_time = datetime.fromisoformat(war_data["starts_at"])
-                    if current_time >= start_time + timedelta(seconds=300):
-                        self.db.update_war(war_id, status=WarStatus.ACTIVE.value)
-                        logger.info(f"War {war_id} moved to ACTIVE phase")
-
-                elif war_data["status"] == WarStatus.ACTIVE.value:
-                    end_time = datetime.fromisoformat(war_data["ends_at"])
-                    if current_time >= end_time:
-                        self.process_war_results(war_id)
-                        logger.info(f"War {war_id} finished and processed")
-
-        except Exception as e:
-            logger.error(f"Error in auto_update_wars: {e}", exc_info=True)
-
-            
-            if attacker_gang_id == defender_gang_id:
-                return False, "Vous ne pouvez pas déclarer la guerre à votre propre gang."
-            
-            attacker_data = self.gang_system.get_gang_info(attacker_gang_id)
-            defender_data = self.gang_system.get_gang_info(defender_gang_id)
-            
-            if not attacker_data or not defender_data:
-                return False, "Gang introuvable."
-            
-            # Check if attacker gang has enough vault points
-            if attacker_data["vault_points"] < self.war_declaration_cost:
-                return False, f"Votre gang a besoin de {self.war_declaration_cost} points dans le coffre pour déclarer la guerre."
-            
-            # Check if either gang is already in war
-            if self._gang_in_active_war(attacker_gang_id) or self._gang_in_active_war(defender_gang_id):
-                return False, "L'un des gangs est déjà en guerre."
-            
-            # Generate war ID
-            war_id = f"war_{int(datetime.now().timestamp())}"
-            
-            # Create war
-            war_data = {
-                "war_id": war_id,
-                "attacker_gang_id": attacker_gang_id,
-                "defender_gang_id": defender_gang_id,
-                "war_type": war_type.value,
-                "stake": stake,
-                "status": WarStatus.DECLARED.value,
-                "declared_at": datetime.now().isoformat(),
-                "starts_at": (datetime.now() + timedelta(seconds=self.preparation_time)).isoformat(),
-                "ends_at": (datetime.now() + timedelta(seconds=self.preparation_time + self.war_duration)).isoformat(),
-                "attacker_power": 0,
-                "defender_power": 0,
-                "participants": {
-                    "attackers": [],
-                    "defenders": []
-                },
-                "winner": None,
-                "rewards": {}
-            }
-            
-            self.db.data["gang_wars"][war_id] = war_data
-            
-            # Deduct declaration cost
-            attacker_data["vault_points"] -= self.war_declaration_cost
-            
-            self.db.save_data()
-            
-            return True, f"Guerre déclarée contre '{defender_data['name']}' ! La guerre commencera dans {self.preparation_time//60} minutes."
-            
-        except Exception as e:
-            logger.error(f"Error declaring war: {e}", exc_info=True)
-            return False, "Erreur lors de la déclaration de guerre."
-    
-    def join_war(self, user_id: str, side: str) -> Tuple[bool, str]:
-        """Join an active war"""
-        try:
-            if "gang_wars" not in self.db.data:
-                return False, "Aucune guerre n'est en cours."
-            
-            gang_id = self.gang_system.get_user_gang(user_id)
-            if not gang_id:
-                return False, "Vous devez être membre d'un gang pour participer à une guerre."
-            
-            # Find active war for this gang
-            war_data = None
-            for war in self.db.data["gang_wars"].values():
-                if war["status"] in [WarStatus.PREPARATION.value, WarStatus.ACTIVE.value]:
-                    if gang_id in [war["attacker_gang_id"], war["defender_gang_id"]]:
-                        war_data = war
-                        break
-            
-            if not war_data:
-                return False, "Votre gang n'est pas en guerre actuellement."
-            
-            # Determine correct side
-            if gang_id == war_data["attacker_gang_id"]:
-                participant_side = "attackers"
-                side_name = "attaquants"
-            elif gang_id == war_data["defender_gang_id"]:
-                participant_side = "defenders"
-                side_name = "défenseurs"
-            else:
-                return False, "Votre gang n'est pas impliqué dans cette guerre."
-            
-            # Check if already participating
-            if user_id in war_data["participants"][participant_side]:
-                return False, f"Vous participez déjà comme {side_name}."
-            
-            # Add participant
-            war_data["participants"][participant_side].append(user_id)
-            
-            # Calculate participant power based on user stats
-            user_power = self._calculate_user_war_power(user_id)
-            
-            if participant_side == "attackers":
-                war_data["attacker_power"] += user_power
-            else:
-                war_data["defender_power"] += user_power
-            
-            self.db.save_data()
-            
-            return True, f"Vous rejoignez la guerre comme {side_name} ! Puissance ajoutée: {user_power}"
-            
-        except Exception as e:
-            logger.error(f"Error joining war: {e}", exc_info=True)
-            return False, "Erreur lors de la participation à la guerre."
-    
-    def _calculate_user_war_power(self, user_id: str) -> int:
-        """Calculate user's power contribution to war"""
-        try:
-            user_points = self.db.get_points(user_id)
-            gang_id = self.gang_system.get_user_gang(user_id)
-            
-            if not gang_id:
-                return 0
-            
-            gang_data = self.gang_system.get_gang_info(gang_id)
-            member_data = gang_data["members"][user_id]
-            
-            # Base power from points (scaled down)
-            base_power = min(user_points // 100, 1000)
-            
-            # Rank bonus
-            rank_bonus = {
-                "Recrue": 1.0,
-                "Membre": 1.2,
-                "Lieutenant": 1.5,
-                "Chef": 2.0
-            }
-            
-            power = int(base_power * rank_bonus.get(member_data["rank"], 1.0))
-            
-            # Gang upgrade bonus
-            war_bonus_level = gang_data["upgrades"].get("war_bonus", 1)
-            power = int(power * (1 + (war_bonus_level - 1) * 0.1))
-            
-            return max(power, 50)  # Minimum power
-            
-        except Exception as e:
-            logger.error(f"Error calculating user war power: {e}", exc_info=True)
-            return 50
-    
-    def process_war_results(self, war_id: str) -> Tuple[bool, str]:
-        """Process war results and distribute rewards"""
-        try:
-            if "gang_wars" not in self.db.data or war_id not in self.db.data.get("gang_wars", {}):
-                return False, "Cette guerre n'existe pas."
-            
-            war_data = self.db.data["gang_wars"][war_id]
-            
-            if war_data["status"] != WarStatus.ACTIVE.value:
-                return False, "Cette guerre n'est pas active."
-            
-            # Determine winner
-            attacker_power = war_data["attacker_power"]
-            defender_power = war_data["defender_power"]
-            
-            # Add some randomness (10% variance)
-            attacker_final = int(attacker_power * random.uniform(0.9, 1.1))
-            defender_final = int(defender_power * random.uniform(0.9, 1.1))
-            
-            if attacker_final > defender_final:
-                winner_gang_id = war_data["attacker_gang_id"]
-                loser_gang_id = war_data["defender_gang_id"]
-                winner_side = "attackers"
-                war_data["winner"] = "attacker"
-            elif defender_final > attacker_final:
-                winner_gang_id = war_data["defender_gang_id"]
-                loser_gang_id = war_data["attacker_gang_id"]
-                winner_side = "defenders"
-                war_data["winner"] = "defender"
-            else:
-                # Draw
-                war_data["winner"] = "draw"
-                war_data["status"] = WarStatus.FINISHED.value
-                self.db.save_data()
-                return True, "La guerre s'est terminée par un match nul !"
-            
-            # Update gang stats
-            winner_gang = self.gang_system.get_gang_info(winner_gang_id)
-            loser_gang = self.gang_system.get_gang_info(loser_gang_id)
-            
-            winner_gang["war_stats"]["wars_won"] += 1
-            winner_gang["war_stats"]["total_wars"] += 1
-            winner_gang["reputation"] += 50
-            
-            loser_gang["war_stats"]["wars_lost"] += 1
-            loser_gang["war_stats"]["total_wars"] += 1
-            loser_gang["reputation"] -= 25
-            
-            # Distribute rewards based on war type
-            self._distribute_war_rewards(war_data, winner_gang_id, loser_gang_id, winner_side)
-            
-            war_data["status"] = WarStatus.FINISHED.value
-            self.db.save_data()
-            
-            winner_name = winner_gang["name"]
-            loser_name = loser_gang["name"]
-            
-            return True, f"🏆 Guerre terminée ! '{winner_name}' a vaincu '{loser_name}' !"
-            
-        except Exception as e:
-            logger.error(f"Error processing war results: {e}", exc_info=True)
-            return False, "Erreur lors du traitement des résultats."
-    
-    def _distribute_war_rewards(self, war_data: Dict, winner_gang_id: str, loser_gang_id: str, winner_side: str):
-        """Distribute rewards to war participants"""
-        try:
-            war_type = WarType(war_data["war_type"])
-            
-            winner_gang = self.gang_system.get_gang_info(winner_gang_id)
-            loser_gang = self.gang_system.get_gang_info(loser_gang_id)
-            
-            if war_type == WarType.VAULT_RAID:
-                # Winner steals 20% of loser's vault
-                stolen_amount = int(loser_gang["vault_points"] * 0.2)
-                loser_gang["vault_points"] -= stolen_amount
-                winner_gang["vault_points"] += stolen_amount
-                
-                war_data["rewards"]["vault_stolen"] = stolen_amount
-                
-            elif war_type == WarType.TERRITORY:
-                # Winner can claim a territory from loser
-                if war_data["stake"] and "territories" in self.db.data and war_data["stake"] in self.db.data["territories"]:
-                    territory = self.db.data["territories"][war_data["stake"]]
-                    if territory["controlled_by"] == loser_gang_id:
-                        territory["controlled_by"] = winner_gang_id
-                        territory["defense_points"] = 100
-                        war_data["rewards"]["territory_captured"] = war_data["stake"]
-            
-            # Individual rewards for participants
-            participants = war_data["participants"][winner_side]
-            if participants:
-                individual_reward = max(1000, stolen_amount // len(participants)) if war_type == WarType.VAULT_RAID else 1000
-                
-                for participant_id in participants:
-                    self.db.add_points(participant_id, individual_reward)
-                
-                war_data["rewards"]["individual_reward"] = individual_reward
-                
-        except Exception as e:
-            logger.error(f"Error distributing war rewards: {e}", exc_info=True)
-    
-    def _gang_in_active_war(self, gang_id: str) -> bool:
-        """Check if gang is in an active war"""
-        if "gang_wars" not in self.db.data:
+    def get_gang_war_history(self, gang_id: str, limit: int = 20, before: Tuple[str, str] = None) -> List[Dict]:
+        """Get war history for a gang, newest first (before = (declared_at, war_id) of the previous page's last war)"""
+        return self.db.get_gang_war_history(gang_id, limit=limit, before=before)
+
+    def _next_transition(self, war_data: Dict) -> Optional[Tuple[str, datetime]]:
+        """Prochaine phase d'une guerre et son échéance"""
+        status = war_data["status"]
+        if status == WarStatus.DECLARED.value:
+            return WarStatus.PREPARATION.value, datetime.fromisoformat(war_data["starts_at"])
+        if status == WarStatus.PREPARATION.value:
+            return WarStatus.ACTIVE.value, datetime.fromisoformat(war_data["starts_at"]) + timedelta(seconds=self.preparation_phase)
+        if status == WarStatus.ACTIVE.value:
+            return WarStatus.FINISHED.value, datetime.fromisoformat(war_data["ends_at"])
+        return None
+
+    def schedule_war_timer(self, war_data: Dict) -> bool:
+        """Programmer la prochaine transition d'une guerre sur le planificateur"""
+        if self.scheduler is None:
             return False
-        for war in self.db.data["gang_wars"].values():
-            if war["status"] in [WarStatus.DECLARED.value, WarStatus.PREPARATION.value, WarStatus.ACTIVE.value]:
-                if gang_id in [war["attacker_gang_id"], war["defender_gang_id"]]:
-                    return True
-        return False
-    
-    def get_active_wars(self) -> List[Dict]:
-        """Get all active wars"""
-        active_wars = []
-        if "gang_wars" not in self.db.data:
-            return active_wars
-        for war in self.db.data["gang_wars"].values():
-            if war["status"] in [WarStatus.DECLARED.value, WarStatus.PREPARATION.value, WarStatus.ACTIVE.value]:
-                active_wars.append(war)
-        return active_wars
-    
-    def get_gang_war_history(self, gang_id: str) -> List[Dict]:
-        """Get war history for a gang"""
-        history = []
-        if "gang_wars" not in self.db.data:
-            return history
-        for war in self.db.data["gang_wars"].values():
-            if gang_id in [war["attacker_gang_id"], war["defender_gang_id"]]:
-                history.append(war)
-        return sorted(history, key=lambda x: x["declared_at"], reverse=True)
-    
-    async def auto_update_wars(self):
-        """Automatically update war statuses"""
-        try:
-            if "gang_wars" not in self.db.data:
+        job_name = f"gang_wars.{war_data['war_id']}"
+        transition = self._next_transition(war_data)
+        if transition is None:
+            self.scheduler.cancel(job_name)
+            return False
+        self.scheduler.schedule_at(job_name, transition[1], self._on_war_timer, war_data["war_id"])
+        return True
+
+    async def restore_war_timers(self) -> int:
+        """Reprogrammer les transitions de toutes les guerres en cours (une requête au démarrage)"""
+        active_wars = await asyncio.to_thread(self.db.get_active_wars)
+        scheduled = sum(1 for war_data in active_wars if self.schedule_war_timer(war_data))
+        logger.info(f"Restored {scheduled} war phase timers")
+        return scheduled
+
+    async def sweep_war_timers(self) -> int:
+        """
+        Programmer les guerres sans échéance locale et rattraper les transitions échues
+
+        Une guerre déclarée via une instance non leader a son échéance dans un planificateur
+        qui ne tourne pas : le leader la reprend ici. Les transitions échues passent par le
+        planificateur (exécution immédiate, jamais deux fois en parallèle pour une même guerre).
+        """
+        if self.scheduler is None:
+            return 0
+        active_wars = await asyncio.to_thread(self.db.get_active_wars)
+        now = datetime.now()
+        scheduled = 0
+        for war_data in active_wars:
+            transition = self._next_transition(war_data)
+            if transition is None:
+                continue
+            if transition[1] <= now or not self.scheduler.has_job(f"gang_wars.{war_data['war_id']}"):
+                scheduled += self.schedule_war_timer(war_data)
+        if scheduled:
+            logger.info(f"War timer sweep scheduled {scheduled} wars")
+        return scheduled
+
+    async def _on_war_timer(self, war_id: str):
+        war_data = await asyncio.to_thread(self.db.get_war, war_id)
+        if war_data:
+            await self.advance_war(war_data)
+
+    async def advance_war(self, war_data: Dict):
+        """Appliquer les transitions échues (rattrapage inclus) puis programmer la suivante"""
+        war_id = war_data["war_id"]
+        transition = self._next_transition(war_data)
+        while transition and transition[1] <= datetime.now():
+            status = transition[0]
+            if status == WarStatus.FINISHED.value:
+                applied, _ = await asyncio.to_thread(self.process_war_results, war_id)
+                if applied:
+                    war_data = await asyncio.to_thread(self.db.get_war, war_id) or {**war_data, "status": status}
+            else:
+                applied = await asyncio.to_thread(self.db.update_war, war_id, status=status)
+                if applied:
+                    war_data["status"] = status
+            if not applied:
+                logger.warning(f"War {war_id} transition to {status} failed, retrying in {WAR_TIMER_RETRY_DELAY}s")
+                if self.scheduler is not None:
+                    self.scheduler.schedule_at(f"gang_wars.{war_id}", time.time() + WAR_TIMER_RETRY_DELAY,
+                                               self._on_war_timer, war_id)
                 return
-            
-            current_time = datetime.now()
-            
-            for war_id, war_data in self.db.data["gang_wars"].items():
-                if war_data["status"] == WarStatus.DECLARED.value:
-                    start_time = datetime.fromisoformat(war_data["starts_at"])
-                    if current_time >= start_time:
-                        war_data["status"] = WarStatus.PREPARATION.value
-                        logger.info(f"War {war_id} moved to PREPARATION phase")
-                
-                elif war_data["status"] == WarStatus.PREPARATION.value:
-                    # Check if preparation time is over, start active phase
-                    start_time = datetime.fromisoformat(war_data["starts_at"])
-                    if current_time >= start_time + timedelta(seconds=300):  # 5 min preparation
-                        war_data["status"] = WarStatus.ACTIVE.value
-                        logger.info(f"War {war_id} moved to ACTIVE phase")
-                
-                elif war_data["status"] == WarStatus.ACTIVE.value:
-                    end_time = datetime.fromisoformat(war_data["ends_at"])
-                    if current_time >= end_time:
-                        # Process war results
-                        self.process_war_results(war_id)
-                        logger.info(f"War {war_id} finished and processed")
-            
-            self.db.save_data()
-            
-        except Exception as e:
-            logger.error(f"Error in auto_update_wars: {e}", exc_info=True)
\ No newline at end of file
+            logger.info(f"War {war_id} moved to {status.upper()} phase")
+            for listener in self._phase_listeners:
+                try:
+                    await listener(war_data, status)
+                except Exception as e:
+                    logger.error(f"Error in war phase listener: {e}", exc_info=True)
+            transition = self._next_transition(war_data)
+        self.schedule_war_timer(war_data)
+
+    def add_phase_listener(self, listener: Callable[[Dict, str], Awaitable[None]]):
+        """Être notifié (war_data, nouveau statut) à chaque changement de phase"""
+        self._phase_listeners.append(listener)
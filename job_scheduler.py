@@ -0,0 +1,325 @@
+"""
+Planificateur de tâches unique
+Un tas (min-heap) d'échéances servi par une seule boucle : les prochaines exécutions sont
+persistées dans bot_state pour survivre aux redémarrages, les exécutions manquées sont
+rattrapées et une même tâche ne tourne jamais deux fois en parallèle
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+logger = logging.getLogger('EngagementBot')
+
+@dataclass
+class ScheduledJob:
+    """Tâche enregistrée dans le planificateur"""
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple = ()
+    interval: Optional[float] = None  # None = exécution unique
+    chance: Optional[float] = None    # Probabilité de s'exécuter à chaque échéance
+    next_run: float = 0.0
+    run_count: int = 0
+    failures: int = 0
+    skipped_overlaps: int = 0
+    last_run_at: Optional[float] = None
+    last_duration_ms: float = 0.0
+    total_duration_ms: float = 0.0
+    max_duration_ms: float = 0.0
+
+    @property
+    def persistent(self) -> bool:
+        return self.interval is not None
+
+    @property
+    def avg_duration_ms(self) -> float:
+        return self.total_duration_ms / self.run_count if self.run_count else 0.0
+
+class JobScheduler:
+    """Planificateur unique des tâches périodiques et ponctuelles du bot"""
+
+    STATE_KEY = 'job_scheduler'
+
+    def __init__(self, database=None):
+        self.db = database
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: list = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Nom -> exécution en cours : une tâche ne tourne jamais deux fois en parallèle
+        self._running: Dict[str, asyncio.Task] = {}
+        self.running = False
+        # Échéances restaurées depuis bot_state, appliquées à l'enregistrement de chaque tâche
+        self._saved: Dict[str, Dict] = {}
+        self._state_loaded = False
+
+    def _load_state(self):
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        if self.db is None:
+            return
+        try:
+            self._saved = (self.db.load_bot_state(self.STATE_KEY) or {}).get('jobs', {})
+        except Exception as e:
+            logger.warning(f"[Scheduler] Échec du chargement de l'état : {e}")
+
+    def _persist_state(self):
+        """Sauvegarder les prochaines échéances des tâches périodiques"""
+        if self.db is None:
+            return
+        jobs = dict(self._saved)
+        for job in self.jobs.values():
+            if job.persistent:
+                jobs[job.name] = {
+                    'next_run': job.next_run,
+                    'last_run_at': job.last_run_at,
+                    'last_duration_ms': round(job.last_duration_ms, 1)
+                }
+        try:
+            self.db.save_bot_state(self.STATE_KEY, {'jobs': jobs})
+        except Exception as e:
+            logger.warning(f"[Scheduler] Échec de la persistance de l'état : {e}")
+
+    def _push(self, job: ScheduledJob):
+        heapq.heappush(self._heap, (job.next_run, next(self._sequence), job.name))
+        self._wakeup.set()
+
+    def register(self, name: str, func: Callable[..., Awaitable[Any]], interval: float, *args,
+                 chance: Optional[float] = None, first_run: Optional[float] = None) -> ScheduledJob:
+        """
+        Enregistrer une tâche périodique
+
+        Si une échéance a été persistée lors d'une session précédente, elle est reprise ;
+        si elle est déjà passée, la tâche est exécutée dès le démarrage (rattrapage).
+
+        Args:
+            name: Nom unique de la tâche (clé de persistance)
+            func: Coroutine à exécuter
+            interval: Intervalle entre deux exécutions (secondes)
+            chance: Probabilité d'exécution à chaque échéance (None = toujours)
+            first_run: Première échéance (epoch) si aucune n'est persistée, par défaut now + interval
+        """
+        self._load_state()
+        saved = self._saved.pop(name, None)
+        if saved and saved.get('next_run'):
+            next_run = float(saved['next_run'])
+        else:
+            next_run = first_run if first_run is not None else time.time() + interval
+
+        job = ScheduledJob(name=name, func=func, args=args, interval=interval, chance=chance, next_run=next_run)
+        if saved:
+            job.last_run_at = saved.get('last_run_at')
+            job.last_duration_ms = saved.get('last_duration_ms') or 0.0
+        self._replace(job)
+        if next_run <= time.time():
+            logger.info(f"[Scheduler] {name} a manqué son échéance, rattrapage au démarrage")
+        return job
+
+    def schedule_at(self, name: str, run_at: Union[float, datetime], func: Callable[..., Awaitable[Any]], *args) -> ScheduledJob:
+        """
+        Programmer une exécution unique (libération de prison, phase de guerre, tirage...)
+
+        Les tâches ponctuelles ne sont pas persistées : le propriétaire les reprogramme au
+        démarrage à partir de ses propres données.
+        """
+        if isinstance(run_at, datetime):
+            run_at = run_at.timestamp()
+        job = ScheduledJob(name=name, func=func, args=args, next_run=float(run_at))
+        self._replace(job)
+        return job
+
+    def _replace(self, job: ScheduledJob):
+        self.jobs[job.name] = job
+        self._push(job)
+
+    def cancel(self, name: str) -> bool:
+        """Retirer une tâche (l'entrée du tas devient obsolète et sera ignorée)"""
+        job = self.jobs.pop(name, None)
+        if job is None:
+            return False
+        self._saved.pop(name, None)
+        return True
+
+    def has_job(self, name: str) -> bool:
+        return name in self.jobs
+
+    async def start(self):
+        """Démarrer la boucle du planificateur"""
+        if self.running:
+            return
+        if self._state_loaded:
+            # Redémarrage (ex: reprise du rôle de leader) : reprendre les échéances du précédent détenteur
+            self._state_loaded = False
+            await asyncio.to_thread(self._load_state)
+            self._resync()
+        else:
+            self._load_state()
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"[Scheduler] Démarré avec {len(self.jobs)} tâches")
+
+    def _resync(self):
+        """Appliquer les échéances persistées aux tâches déjà enregistrées"""
+        for name, job in self.jobs.items():
+            saved = self._saved.pop(name, None)
+            if job.persistent and saved and saved.get('next_run'):
+                job.next_run = float(saved['next_run'])
+                job.last_run_at = saved.get('last_run_at')
+                self._push(job)
+
+    async def stop(self, persist: bool = True):
+        """Arrêter la boucle et les exécutions en cours, puis persister les échéances"""
+        self.running = False
+        tasks = list(self._running.values())
+        if self._task:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        if persist:
+            await asyncio.to_thread(self._persist_state)
+        logger.info("[Scheduler] Arrêté")
+
+    async def _run(self):
+        while self.running:
+            try:
+                self._wakeup.clear()
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    run_at, _, name = heapq.heappop(self._heap)
+                    job = self.jobs.get(name)
+                    if job is None or job.next_run != run_at:
+                        continue  # Entrée obsolète (tâche annulée ou reprogrammée)
+                    self._fire(job, now)
+
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0) if timeout is not None else None)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Scheduler] Erreur dans la boucle : {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    def _fire(self, job: ScheduledJob, now: float):
+        if job.persistent:
+            # Garder la cadence d'origine : prochaine échéance strictement future
+            missed = int((now - job.next_run) // job.interval) + 1
+            job.next_run += missed * job.interval
+            self._push(job)
+        else:
+            self.jobs.pop(job.name, None)
+
+        if job.name in self._running:
+            job.skipped_overlaps += 1
+            logger.warning(f"[Scheduler] {job.name} encore en cours, échéance ignorée")
+            return
+        if job.chance is not None and random.random() >= job.chance:
+            if job.persistent:
+                asyncio.create_task(asyncio.to_thread(self._persist_state))
+            return
+
+        task = asyncio.create_task(self._execute(job))
+        self._running[job.name] = task
+        task.add_done_callback(lambda t, name=job.name: self._running.pop(name, None) if self._running.get(name) is t else None)
+
+    async def _execute(self, job: ScheduledJob):
+        start = time.perf_counter()
+        job.last_run_at = time.time()
+        try:
+            await job.func(*job.args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            logger.error(f"[Scheduler] Erreur dans la tâche {job.name} : {e}", exc_info=True)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            job.run_count += 1
+            job.last_duration_ms = duration_ms
+            job.total_duration_ms += duration_ms
+            job.max_duration_ms = max(job.max_duration_ms, duration_ms)
+            logger.debug(f"[Scheduler] {job.name} exécutée en {duration_ms:.0f}ms")
+        if job.persistent and self.running:
+            await asyncio.to_thread(self._persist_state)
+
+    def get_status(self) -> Dict[str, Dict]:
+        """Statistiques par tâche"""
+        now = time.time()
+        return {
+            name: {
+                'next_run_in': max(0, round(job.next_run - now)),
+                'interval': job.interval,
+                'running': name in self._running,
+                'runs': job.run_count,
+                'failures': job.failures,
+                'skipped_overlaps': job.skipped_overlaps,
+                'last_duration_ms': round(job.last_duration_ms, 1),
+                'avg_duration_ms': round(job.avg_duration_ms, 1),
+                'max_duration_ms': round(job.max_duration_ms, 1),
+            }
+            for name, job in self.jobs.items()
+        }
+
+class LocalTask:
+    """
+    Tâche périodique propre à chaque instance, hors bail de leader
+
+    Pour les compteurs tenus en mémoire par processus (sessions vocales, messages) : chaque
+    réplica doit vider les siens, qu'il soit leader ou non.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Awaitable[Any]], interval: float, *args):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.interval = interval
+        self.run_count = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrêter la boucle ; une exécution en cours va à son terme (pas d'écriture interrompue)"""
+        if self._task is None:
+            return
+        self._stop.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.func(*self.args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"[LocalTask] Erreur dans la tâche {self.name} : {e}", exc_info=True)
+            self.run_count += 1
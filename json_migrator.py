@@ -0,0 +1,249 @@
+"""
+Migration en flux de data.json vers Supabase
+Le fichier est lu entrée par entrée (jamais chargé en entier), les lignes sont envoyées par
+lots bornés en parallèle et la progression de chaque section est enregistrée dans bot_state
+pour reprendre là où une migration interrompue s'est arrêtée
+"""
+
+import json
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger('EngagementBot')
+
+# Clé bot_state de la progression
+MIGRATION_STATE_KEY = 'json_migration'
+
+def _user_rows(user_id, user_data):
+    return [{'user_id': user_id, 'points': (user_data or {}).get('points', 0)}]
+
+def _cooldown_rows(cooldown_type):
+    def rows(user_id, cooldown_time):
+        return [{'user_id': user_id, 'cooldown_type': cooldown_type, 'cooldown_until': cooldown_time}]
+    return rows
+
+def _inventory_rows(user_id, items):
+    return [{'user_id': user_id, 'item_id': item_id, 'quantity': quantity}
+            for item_id, quantity in Counter(items or []).items()]
+
+def _daily_command_rows(user_id, dates_data):
+    return [{'user_id': user_id, 'command_date': date_str, 'commands': commands}
+            for date_str, commands in (dates_data or {}).items()]
+
+# Section de data.json -> (table, lignes produites par une entrée {clé: valeur})
+SECTIONS: Dict[str, Tuple[str, Callable[[str, Any], List[Dict]]]] = {
+    'users': ('users', _user_rows),
+    'rob_cooldowns': ('user_cooldowns', _cooldown_rows('rob_cooldowns')),
+    'last_work': ('user_cooldowns', _cooldown_rows('last_work')),
+    'drug_deal_cooldowns': ('user_cooldowns', _cooldown_rows('drug_deal_cooldowns')),
+    'roulette_cooldowns': ('user_cooldowns', _cooldown_rows('roulette_cooldowns')),
+    'twitter_links': ('twitter_links', lambda user_id, handle: [{'user_id': user_id, 'twitter_handle': handle}]),
+    'prison_times': ('prison_times', lambda user_id, release: [{'user_id': user_id, 'release_time': release}]),
+    'inventories': ('inventory_items', _inventory_rows),
+    'daily_commands': ('daily_commands', _daily_command_rows),
+}
+
+class JsonStreamReader:
+    """
+    Lecture incrémentale d'un objet JSON de premier niveau {section: {clé: valeur}}
+
+    Seule l'entrée en cours de décodage est en mémoire (plus un tampon de lecture).
+    """
+
+    def __init__(self, file, chunk_size: int = 1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_ws(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def _expect(self, *chars: str) -> str:
+        self._skip_ws()
+        if self.pos >= len(self.buffer) or self.buffer[self.pos] not in chars:
+            found = self.buffer[self.pos:self.pos + 20] if self.pos < len(self.buffer) else 'EOF'
+            raise ValueError(f"JSON invalide : attendu {' ou '.join(chars)}, trouvé {found!r}")
+        self.pos += 1
+        return self.buffer[self.pos - 1]
+
+    def _peek(self) -> str:
+        self._skip_ws()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else ''
+
+    def _value(self) -> Any:
+        """Décoder une valeur complète, en relisant le fichier tant qu'elle est tronquée"""
+        self._skip_ws()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un nombre en fin de tampon peut se poursuivre dans le bloc suivant ("12" puis ".5")
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in ' \t\r\n,:]}'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _members(self) -> Iterator[Tuple[str, Any]]:
+        """Paires clé/valeur d'un objet dont l'accolade ouvrante vient d'être lue"""
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key, None
+            if self._expect(',', '}') == '}':
+                return
+
+    def sections(self) -> Iterator[Tuple[str, Iterator[Tuple[str, Any]]]]:
+        """
+        Parcourir les sections de premier niveau
+
+        Chaque section est produite avec un itérateur sur ses entrées, à consommer (ou
+        abandonner) avant de passer à la section suivante. Une section qui n'est pas un
+        objet est produite avec un itérateur vide.
+        """
+        self._expect('{')
+        for name, _ in self._members():
+            if self._peek() == '{':
+                self.pos += 1
+                entries = self._entries()
+                yield name, entries
+                for _ in entries:  # Reste de la section non consommé
+                    pass
+            else:
+                self._value()
+                yield name, iter(())
+
+    def _entries(self) -> Iterator[Tuple[str, Any]]:
+        for key, _ in self._members():
+            yield key, self._value()
+
+class JsonMigrator:
+    """Migration par lots bornés, parallèle et reprenable"""
+
+    def __init__(self, database, json_file_path: str, batch_size: int = 500, parallelism: int = 4,
+                 dry_run: bool = False, state_key: str = MIGRATION_STATE_KEY):
+        self.db = database
+        self.path = json_file_path
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.dry_run = dry_run
+        self.state_key = state_key
+
+    def _load_state(self) -> Dict:
+        if self.dry_run:
+            return {'sections': {}}
+        state = self.db.load_bot_state(self.state_key) or {}
+        state.setdefault('sections', {})
+        return state
+
+    def _save_state(self, state: Dict):
+        if not self.dry_run:
+            self.db.save_bot_state(self.state_key, state)
+
+    def run(self) -> Dict:
+        """Migrer toutes les sections ; retourne un rapport de débit par section"""
+        state = self._load_state()
+        if state.get('completed'):
+            logger.info("[Migration] Déjà terminée, rien à faire")
+            return {'completed': True, 'sections': {}, 'resumed': True}
+
+        report = {'completed': False, 'dry_run': self.dry_run, 'sections': {}}
+        started = time.perf_counter()
+        with open(self.path, 'r', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=self.parallelism) as pool:
+            for section, entries in JsonStreamReader(f).sections():
+                if section not in SECTIONS:
+                    continue
+                progress = state['sections'].setdefault(section, {'entries': 0, 'done': False})
+                if progress['done']:
+                    continue
+                section_report = self._migrate_section(pool, section, entries, progress, state)
+                report['sections'][section] = section_report
+                if not section_report['ok']:
+                    report['elapsed'] = round(time.perf_counter() - started, 3)
+                    return report
+
+        state['completed'] = True
+        self._save_state(state)
+        report['completed'] = True
+        report['elapsed'] = round(time.perf_counter() - started, 3)
+        logger.info(f"[Migration] Terminée en {report['elapsed']}s")
+        return report
+
+    def _migrate_section(self, pool, section: str, entries, progress: Dict, state: Dict) -> Dict:
+        table, to_rows = SECTIONS[section]
+        skip = progress['entries']
+        started = time.perf_counter()
+        counts = {'entries': 0, 'rows': 0, 'skipped': skip, 'ok': True}
+
+        wave: List[List[Dict]] = []
+        batch: List[Dict] = []
+        wave_entries = 0
+        for index, (key, value) in enumerate(entries):
+            if index < skip:
+                continue
+            batch.extend(to_rows(key, value))
+            wave_entries += 1
+            if len(batch) >= self.batch_size:
+                wave.append(batch)
+                batch = []
+                if len(wave) >= self.parallelism:
+                    if not self._flush_wave(pool, table, wave, wave_entries, progress, state, counts):
+                        return self._finish(section, counts, started)
+                    wave, wave_entries = [], 0
+        if batch:
+            wave.append(batch)
+        if wave_entries and not self._flush_wave(pool, table, wave, wave_entries, progress, state, counts):
+            return self._finish(section, counts, started)
+
+        progress['done'] = True
+        self._save_state(state)
+        return self._finish(section, counts, started)
+
+    def _flush_wave(self, pool, table: str, wave: List[List[Dict]], wave_entries: int,
+                    progress: Dict, state: Dict, counts: Dict) -> bool:
+        """Envoyer un groupe de lots en parallèle, puis avancer le point de reprise"""
+        if not self.dry_run:
+            results = list(pool.map(lambda rows: self.db.upsert_rows(table, rows), wave))
+            if not all(results):
+                counts['ok'] = False
+                logger.error(f"[Migration] Échec d'écriture dans {table}, reprise possible à l'entrée {progress['entries']}")
+                return False
+        progress['entries'] += wave_entries
+        counts['entries'] += wave_entries
+        counts['rows'] += sum(len(rows) for rows in wave)
+        self._save_state(state)
+        return True
+
+    @staticmethod
+    def _finish(section: str, counts: Dict, started: float) -> Dict:
+        elapsed = time.perf_counter() - started
+        counts['elapsed'] = round(elapsed, 3)
+        counts['rows_per_second'] = round(counts['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(f"[Migration] {section} : {counts['entries']} entrées, {counts['rows']} lignes "
+                    f"({counts['rows_per_second']} lignes/s)")
+        return counts
@@ -0,0 +1,105 @@
+"""
+Élection de leader par bail (lease)
+Une ligne bot_state contient le détenteur du bail et son expiration : le leader la renouvelle
+régulièrement, les autres instances attendent qu'elle expire pour prendre le relais
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger('EngagementBot')
+
+class LeaderLease:
+    """Bail de leader renouvelé par heartbeat ; seul le détenteur exécute les tâches planifiées"""
+
+    def __init__(self, database, key: str = 'scheduler_leader', ttl: float = 15.0, heartbeat_interval: float = 5.0,
+                 holder_id: Optional[str] = None,
+                 on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_demoted: Optional[Callable[[], Awaitable[None]]] = None):
+        self.db = database
+        self.key = key
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.holder_id = holder_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        # Fin de validité du bail vue localement (horloge monotone)
+        self._valid_until = 0.0
+        self.elections = 0
+
+    async def start(self):
+        """Démarrer le heartbeat (tente immédiatement d'acquérir le bail)"""
+        if self.running:
+            return
+        self.running = True
+        await self._tick()
+        self._task = asyncio.create_task(self._heartbeat())
+        logger.info(f"[Leader] Heartbeat démarré ({self.holder_id}, leader={self.is_leader})")
+
+    async def stop(self):
+        """Arrêter le heartbeat et libérer le bail pour une reprise immédiate par une autre instance"""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await self._set_leader(False)
+            try:
+                await asyncio.to_thread(self.db.release_lease, self.key, self.holder_id)
+            except Exception as e:
+                logger.warning(f"[Leader] Échec de la libération du bail : {e}")
+
+    async def _heartbeat(self):
+        while self.running:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Leader] Erreur de heartbeat : {e}", exc_info=True)
+
+    async def _tick(self):
+        sent_at = time.monotonic()
+        try:
+            acquired = await asyncio.to_thread(self.db.try_acquire_lease, self.key, self.holder_id, self.ttl)
+        except Exception as e:
+            logger.warning(f"[Leader] Échec du renouvellement du bail : {e}")
+            acquired = None
+
+        if acquired:
+            # Le bail court depuis l'envoi de la requête, pas depuis sa réponse
+            self._valid_until = sent_at + self.ttl
+            if not self.is_leader:
+                await self._set_leader(True)
+        elif acquired is False or time.monotonic() >= self._valid_until - self.heartbeat_interval:
+            # Bail perdu, ou impossible de le renouveler avant son expiration : céder la place
+            if self.is_leader:
+                await self._set_leader(False)
+
+    async def _set_leader(self, leader: bool):
+        self.is_leader = leader
+        if leader:
+            self.elections += 1
+            logger.info(f"[Leader] {self.holder_id} est leader")
+            callback = self.on_elected
+        else:
+            logger.warning(f"[Leader] {self.holder_id} n'est plus leader")
+            callback = self.on_demoted
+        if callback:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"[Leader] Erreur lors du changement de rôle : {e}", exc_info=True)
@@ -0,0 +1,93 @@
+"""
+Points d'activité des messages
+Chaque message est compté en mémoire (anti-spam et plafond par minute, sans accès DB) ;
+les points accumulés sont crédités en une écriture groupée toutes les N secondes et à l'arrêt
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from config import POINTS_MESSAGE
+
+logger = logging.getLogger('EngagementBot')
+
+class MessageActivityTracker:
+    """Compteurs de messages par utilisateur, vidés périodiquement en base"""
+
+    def __init__(self, database, points_per_message: int = POINTS_MESSAGE, flush_interval: float = 30,
+                 min_interval: float = 10, max_messages_per_minute: int = 3, min_length: int = 3,
+                 command_prefix: str = '!'):
+        self.db = database
+        self.points_per_message = points_per_message
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self.max_messages_per_minute = max_messages_per_minute
+        self.min_length = min_length
+        self.command_prefix = command_prefix
+        # Messages comptés depuis la dernière écriture
+        self._counts: Dict[str, int] = {}
+        # user_id -> (dernier message compté, début de la minute, messages comptés dans la minute, empreinte du contenu)
+        self._windows: Dict[str, Tuple[float, float, int, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self.stats = {'counted': 0, 'ignored': 0, 'flushes': 0, 'points_awarded': 0, 'failed_writes': 0}
+
+    def on_message(self, message, now: Optional[float] = None) -> bool:
+        """Compter un message s'il passe les filtres anti-spam ; retourne True s'il est compté"""
+        author = message.author
+        content = (message.content or '').strip()
+        if author.bot or message.guild is None or content.startswith(self.command_prefix) or len(content) < self.min_length:
+            return False
+
+        now = time.time() if now is None else now
+        user_id = str(author.id)
+        fingerprint = hash(content.lower())
+        last_at, minute_start, in_minute, last_fingerprint = self._windows.get(user_id, (float('-inf'), now, 0, None))
+        if now - minute_start >= 60:
+            minute_start, in_minute = now, 0
+        if (now - last_at < self.min_interval or in_minute >= self.max_messages_per_minute
+                or fingerprint == last_fingerprint):
+            self.stats['ignored'] += 1
+            return False
+
+        self._windows[user_id] = (now, minute_start, in_minute + 1, fingerprint)
+        self._counts[user_id] = self._counts.get(user_id, 0) + 1
+        self.stats['counted'] += 1
+        return True
+
+    async def on_message_event(self, message):
+        """Écouteur on_message du bot"""
+        try:
+            self.on_message(message)
+        except Exception as e:
+            logger.error(f"[Activity] Erreur de comptage : {e}", exc_info=True)
+
+    async def flush(self, now: Optional[float] = None) -> int:
+        """Créditer en une écriture les messages comptés ; retourne le nombre d'utilisateurs crédités"""
+        async with self._flush_lock:
+            counts, self._counts = self._counts, {}
+            now = time.time() if now is None else now
+            # Les fenêtres anti-spam échues n'ont plus d'effet : les oublier borne la mémoire
+            horizon = max(self.min_interval, 60)
+            self._windows = {uid: window for uid, window in self._windows.items() if now - window[0] < horizon}
+            if not counts:
+                return 0
+
+            awards = [{'user_id': user_id, 'amount': count * self.points_per_message, 'reason': f"Messages ({count})"}
+                      for user_id, count in counts.items()]
+            if not await asyncio.to_thread(self.db.award_points_bulk, awards):
+                # Réessayé à la prochaine écriture
+                for user_id, count in counts.items():
+                    self._counts[user_id] = self._counts.get(user_id, 0) + count
+                self.stats['failed_writes'] += 1
+                return 0
+
+            self.stats['flushes'] += 1
+            self.stats['points_awarded'] += sum(award['amount'] for award in awards)
+            logger.debug(f"[Activity] Points de messages crédités à {len(awards)} utilisateurs")
+            return len(awards)
+
+    def pending_points(self, user_id) -> int:
+        """Points gagnés mais pas encore écrits en base"""
+        return self._counts.get(str(user_id), 0) * self.points_per_message
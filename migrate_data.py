@@ -30,16 +30,24 @@ def main():
     
     print("✅ Connexion à Supabase réussie")
     
-    # Migrer les données
+    # Migrer les données (--dry-run : lecture et conversion seules, avec rapport de débit)
+    dry_run = '--dry-run' in sys.argv
     if os.path.exists('data.json'):
-        print("📦 Migration des données depuis data.json...")
-        db.migrate_from_json('data.json')
+        print("📦 Migration des données depuis data.json..." + (" (dry run)" if dry_run else ""))
+        report = db.migrate_from_json('data.json', dry_run=dry_run)
+        for section, stats in report.get('sections', {}).items():
+            print(f"   • {section}: {stats['entries']} entrées, {stats['rows']} lignes, "
+                  f"{stats['rows_per_second']} lignes/s" + (f" ({stats['skipped']} déjà migrées)" if stats['skipped'] else ""))
+        if not report.get('completed'):
+            print("❌ Migration interrompue : relancez le script pour reprendre")
+            sys.exit(1)
         print("✅ Migration terminée!")
         
         # Créer une sauvegarde
-        import shutil
-        shutil.copy('data.json', 'data.json.backup')
-        print("💾 Sauvegarde créée: data.json.backup")
+        if not dry_run:
+            import shutil
+            shutil.copy('data.json', 'data.json.backup')
+            print("💾 Sauvegarde créée: data.json.backup")
     else:
         print("ℹ️ Aucun fichier data.json trouvé")
     
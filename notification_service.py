@@ -0,0 +1,193 @@
+"""
+Service de diffusion des notifications
+File d'envoi servie par un nombre borné de workers : DM aux membres de gang et annonces
+dans chaque serveur, avec cache des salons résolus, respect du débit global Discord,
+suppression des doublons et mesure de la latence de livraison
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import nextcord as discord
+
+logger = logging.getLogger('EngagementBot')
+
+class NotificationService:
+    """Diffusion à concurrence bornée des notifications de gang et globales"""
+
+    def __init__(self, bot, max_concurrency: int = 10, global_rate: float = 40.0,
+                 channel_names: Iterable[str] = ("gang-events", "general"), channel_cache_ttl: float = 3600,
+                 dedup_window: float = 300, max_queue: int = 10000):
+        self.bot = bot
+        self.max_concurrency = max_concurrency
+        self.channel_names = list(channel_names)
+        self.channel_cache_ttl = channel_cache_ttl
+        self.dedup_window = dedup_window
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._workers: List[asyncio.Task] = []
+        # Espacement minimal entre deux requêtes pour rester sous la limite globale
+        self._interval = 1.0 / global_rate if global_rate else 0.0
+        self._next_slot = 0.0
+        # Un seul envoi à la fois par destination : même bucket Discord (salon ou DM)
+        self._destination_locks: "weakref.WeakValueDictionary[Tuple[str, int], asyncio.Lock]" = weakref.WeakValueDictionary()
+        # guild_id -> (channel_id ou None, expiration)
+        self._channels: Dict[int, Tuple[Optional[int], float]] = {}
+        # (destination, clé) -> dernier envoi, pour ignorer les doublons
+        self._recent: Dict[Tuple[Tuple[str, int], str], float] = {}
+        self._latencies = deque(maxlen=1000)
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'duplicates': 0, 'dropped': 0}
+        self.running = False
+
+        if hasattr(bot, 'add_listener'):
+            bot.add_listener(self._forget_channel, 'on_guild_channel_create')
+            bot.add_listener(self._forget_channel, 'on_guild_channel_delete')
+            bot.add_listener(self._forget_channel, 'on_guild_channel_update')
+
+    async def start(self):
+        """Démarrer les workers d'envoi"""
+        if self.running:
+            return
+        self.running = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        logger.info(f"[Notifications] Service démarré ({self.max_concurrency} workers)")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Laisser partir les envois en attente (dans la limite du délai), puis arrêter les workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[Notifications] {self._queue.qsize()} envois abandonnés à l'arrêt")
+        self.running = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def join(self):
+        """Attendre que tous les envois en file soient traités"""
+        await self._queue.join()
+
+    # === API ===
+
+    def notify_users(self, user_ids: Iterable, embed: discord.Embed, key: Optional[str] = None) -> int:
+        """Mettre en file un DM par utilisateur ; retourne le nombre d'envois ajoutés"""
+        key = key or self._embed_key(embed)
+        return sum(self._enqueue(('user', int(user_id)), int(user_id), embed, key) for user_id in user_ids)
+
+    def broadcast(self, embed: discord.Embed, key: Optional[str] = None) -> int:
+        """Mettre en file une annonce dans le salon d'annonce de chaque serveur"""
+        key = key or self._embed_key(embed)
+        queued = 0
+        for guild in self.bot.guilds:
+            channel = self._announcement_channel(guild)
+            if channel is not None:
+                queued += self._enqueue(('channel', channel.id), channel, embed, key)
+        return queued
+
+    # === INTERNES ===
+
+    @staticmethod
+    def _embed_key(embed: discord.Embed) -> str:
+        return f"{embed.title}\n{embed.description}"
+
+    def _enqueue(self, destination: Tuple[str, int], target, embed: discord.Embed, key: str) -> bool:
+        now = time.monotonic()
+        if now - self._recent.get((destination, key), float('-inf')) < self.dedup_window:
+            self.stats['duplicates'] += 1
+            return False
+        try:
+            self._queue.put_nowait((destination, target, embed, now))
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            return False
+        self._recent[(destination, key)] = now
+        if len(self._recent) > 4 * self._queue.maxsize:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+        self.stats['queued'] += 1
+        return True
+
+    def _announcement_channel(self, guild):
+        """Salon d'annonce d'un serveur, résolu en un seul parcours puis mis en cache"""
+        cached = self._channels.get(guild.id)
+        if cached and cached[1] > time.monotonic():
+            return guild.get_channel(cached[0]) if cached[0] else None
+
+        candidates = {}
+        for channel in guild.text_channels:
+            if channel.name in self.channel_names and channel.name not in candidates:
+                candidates[channel.name] = channel
+        channel = next((candidates[name] for name in self.channel_names
+                        if name in candidates and candidates[name].permissions_for(guild.me).send_messages), None)
+        self._channels[guild.id] = (channel.id if channel else None, time.monotonic() + self.channel_cache_ttl)
+        return channel
+
+    async def _forget_channel(self, channel, *_):
+        guild = getattr(channel, 'guild', None)
+        if guild is not None:
+            self._channels.pop(guild.id, None)
+
+    async def _throttle(self):
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(*item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"[Notifications] Erreur d'envoi : {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, destination: Tuple[str, int], target, embed: discord.Embed, enqueued_at: float):
+        lock = self._destination_locks.get(destination)
+        if lock is None:
+            lock = self._destination_locks[destination] = asyncio.Lock()
+        async with lock:
+            for attempt in range(2):
+                await self._throttle()
+                try:
+                    if destination[0] == 'user':
+                        user = self.bot.get_user(target) or await self.bot.fetch_user(target)
+                        await user.send(embed=embed)
+                    else:
+                        await target.send(embed=embed)
+                    break
+                except discord.HTTPException as e:
+                    if getattr(e, 'status', None) == 429 and attempt == 0:
+                        await asyncio.sleep(getattr(e, 'retry_after', 1.0))
+                        continue
+                    if destination[0] == 'channel' and isinstance(e, (discord.Forbidden, discord.NotFound)):
+                        # Salon supprimé ou droits retirés : le résoudre à nouveau au prochain envoi
+                        await self._forget_channel(target)
+                    self.stats['failed'] += 1
+                    logger.warning(f"[Notifications] Envoi impossible vers {destination[0]} {destination[1]} : {e}")
+                    return
+
+        self.stats['sent'] += 1
+        self._latencies.append((time.monotonic() - enqueued_at) * 1000)
+
+    def get_stats(self) -> Dict:
+        """Compteurs et latence de livraison (file -> envoi) des 1000 derniers envois"""
+        latencies = sorted(self._latencies)
+        return {
+            **self.stats,
+            'pending': self._queue.qsize(),
+            'cached_channels': len(self._channels),
+            'avg_latency_ms': round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            'p95_latency_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else 0.0,
+            'max_latency_ms': round(latencies[-1], 1) if latencies else 0.0,
+        }
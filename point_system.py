@@ -111,17 +111,18 @@ class PointSystem:
             logger.error(f"Error getting inventory: {e}", exc_info=True)
             return []
     
-    def add_item(self, user_id: str, item: str):
-        """Ajouter un objet à l'inventaire"""
+    def add_item(self, user_id: str, item: str, quantity: int = 1) -> bool:
+        """Ajouter un ou plusieurs exemplaires d'un objet à l'inventaire"""
         try:
-            self.database.add_item(user_id, item)
+            return self.database.add_item(user_id, item, quantity)
         except Exception as e:
             logger.error(f"Error adding item: {e}", exc_info=True)
+            return False
     
-    def remove_item(self, user_id: str, item: str) -> bool:
-        """Retirer un objet de l'inventaire"""
+    def remove_item(self, user_id: str, item: str, quantity: int = 1) -> bool:
+        """Retirer un ou plusieurs exemplaires d'un objet (tout ou rien)"""
         try:
-            return self.database.remove_item(user_id, item)
+            return self.database.remove_item(user_id, item, quantity)
         except Exception as e:
             logger.error(f"Error removing item: {e}", exc_info=True)
             return False
@@ -129,8 +130,7 @@ class PointSystem:
     def has_item(self, user_id: str, item: str) -> bool:
         """Vérifier si l'utilisateur a un objet"""
         try:
-            inventory = self.get_inventory(user_id)
-            return item in inventory
+            return self.database.has_item(user_id, item)
         except Exception as e:
             logger.error(f"Error checking item: {e}", exc_info=True)
             return False
@@ -0,0 +1,66 @@
+"""
+Rétention des tables qui grossissent sans limite
+Chaque politique purge les lignes plus anciennes que sa durée de conservation, par petits
+lots successifs (les plus anciennes d'abord) ; les journaux de points et de coffres sont
+d'abord cumulés par jour pour garder l'historique agrégé
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger('EngagementBot')
+
+class RetentionManager:
+    """Applique les politiques de rétention et rend compte des lignes récupérées"""
+
+    def __init__(self, database, policies: Dict[str, Dict], interval: float = 3600, batch_size: int = 1000,
+                 max_batches: int = 50, pause: float = 0.1):
+        self.db = database
+        self.policies = policies
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.pause = pause
+        self.last_report: Dict[str, int] = {}
+
+    @staticmethod
+    def _cutoff(policy: Dict, now: datetime) -> str:
+        cutoff = now - timedelta(days=policy["days"])
+        return cutoff.date().isoformat() if policy.get("date_only") else cutoff.isoformat()
+
+    def _purge_batch(self, table: str, policy: Dict, cutoff: str) -> Optional[int]:
+        if policy.get("rollup"):
+            return self.db.rollup_ledger_rows(table, cutoff, self.batch_size)
+        return self.db.purge_old_rows(table, policy["column"], cutoff, self.batch_size)
+
+    async def purge_table(self, table: str, policy: Dict, now: Optional[datetime] = None) -> int:
+        """Purger une table lot par lot jusqu'à épuisement ou jusqu'au nombre max de lots"""
+        cutoff = self._cutoff(policy, now or datetime.now())
+        reclaimed = 0
+        for _ in range(self.max_batches):
+            deleted = await asyncio.to_thread(self._purge_batch, table, policy, cutoff)
+            if deleted is None:
+                break
+            reclaimed += deleted
+            if deleted < self.batch_size:
+                break
+            # Laisser passer les autres requêtes entre deux lots
+            await asyncio.sleep(self.pause)
+        return reclaimed
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Appliquer toutes les politiques ; retourne {table: lignes récupérées}"""
+        report = {}
+        for table, policy in self.policies.items():
+            try:
+                report[table] = await self.purge_table(table, policy, now)
+            except Exception as e:
+                logger.error(f"[Retention] Erreur sur {table} : {e}", exc_info=True)
+        self.last_report = report
+        total = sum(report.values())
+        if total:
+            details = ", ".join(f"{table}={count}" for table, count in report.items() if count)
+            logger.info(f"[Retention] {total} lignes récupérées ({details})")
+        return report
@@ -90,3 +90,586 @@ CREATE POLICY "Allow anonymous read" ON voice_sessions FOR SELECT USING (true);
 CREATE POLICY "Allow anonymous insert" ON voice_sessions FOR INSERT WITH CHECK (true);
 CREATE POLICY "Allow anonymous update" ON voice_sessions FOR UPDATE USING (true);
 CREATE POLICY "Allow anonymous delete" ON voice_sessions FOR DELETE USING (true);
+
+-- === TWITTER ENGAGEMENT ===
+
+CREATE TABLE IF NOT EXISTS twitter_links (
+  user_id TEXT PRIMARY KEY,
+  twitter_handle TEXT NOT NULL
+);
+ALTER TABLE twitter_links ADD COLUMN IF NOT EXISTS linked_at TIMESTAMP DEFAULT NOW();
+
+-- Dernières métriques vues par tweet : l'ingestion ne récompense que l'écart
+CREATE TABLE IF NOT EXISTS twitter_tweet_watermarks (
+  tweet_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  like_count INTEGER DEFAULT 0,
+  retweet_count INTEGER DEFAULT 0,
+  reply_count INTEGER DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS point_transactions (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  amount BIGINT NOT NULL,
+  reason TEXT,
+  timestamp TIMESTAMP DEFAULT NOW()
+);
+
+-- Crédite les points, écrit le journal et avance les watermarks en une seule transaction
+CREATE OR REPLACE FUNCTION apply_twitter_engagement(p_awards JSONB, p_watermarks JSONB)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO users (user_id, points)
+  SELECT a.user_id, a.amount
+  FROM jsonb_to_recordset(p_awards) AS a(user_id TEXT, amount BIGINT, reason TEXT)
+  ON CONFLICT (user_id) DO UPDATE SET points = users.points + EXCLUDED.points, updated_at = NOW();
+
+  INSERT INTO point_transactions (user_id, amount, reason, timestamp)
+  SELECT a.user_id, a.amount, a.reason, NOW()
+  FROM jsonb_to_recordset(p_awards) AS a(user_id TEXT, amount BIGINT, reason TEXT);
+
+  INSERT INTO twitter_tweet_watermarks (tweet_id, user_id, like_count, retweet_count, reply_count, updated_at)
+  SELECT w.tweet_id, w.user_id, w.like_count, w.retweet_count, w.reply_count, NOW()
+  FROM jsonb_to_recordset(p_watermarks)
+    AS w(tweet_id TEXT, user_id TEXT, like_count INTEGER, retweet_count INTEGER, reply_count INTEGER)
+  ON CONFLICT (tweet_id) DO UPDATE SET
+    like_count = GREATEST(twitter_tweet_watermarks.like_count, EXCLUDED.like_count),
+    retweet_count = GREATEST(twitter_tweet_watermarks.retweet_count, EXCLUDED.retweet_count),
+    reply_count = GREATEST(twitter_tweet_watermarks.reply_count, EXCLUDED.reply_count),
+    updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- === BOT STATE / LEADER ELECTION ===
+
+CREATE TABLE IF NOT EXISTS bot_state (
+  key TEXT PRIMARY KEY,
+  value JSONB,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Acquiert ou renouvelle un bail ; l'expiration est jugée avec l'horloge de la base
+CREATE OR REPLACE FUNCTION try_acquire_lease(p_key TEXT, p_holder TEXT, p_ttl_seconds DOUBLE PRECISION)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_now DOUBLE PRECISION := EXTRACT(EPOCH FROM clock_timestamp());
+  v_holder TEXT;
+BEGIN
+  INSERT INTO bot_state (key, value, updated_at)
+  VALUES (p_key, jsonb_build_object('holder', p_holder, 'expires_at', v_now + p_ttl_seconds), NOW())
+  ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+    WHERE bot_state.value->>'holder' = p_holder
+       OR COALESCE((bot_state.value->>'expires_at')::DOUBLE PRECISION, 0) < v_now
+  RETURNING value->>'holder' INTO v_holder;
+  RETURN COALESCE(v_holder = p_holder, FALSE);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION release_lease(p_key TEXT, p_holder TEXT)
+RETURNS VOID AS $$
+  UPDATE bot_state SET value = jsonb_set(value, '{expires_at}', '0'::jsonb), updated_at = NOW()
+  WHERE key = p_key AND value->>'holder' = p_holder;
+$$ LANGUAGE sql;
+
+-- === GANG VAULTS ===
+
+-- Journal des mouvements de coffre : chaque variation est un delta appliqué côté serveur
+CREATE TABLE IF NOT EXISTS gang_vault_ledger (
+  id BIGSERIAL PRIMARY KEY,
+  gang_id TEXT NOT NULL,
+  delta BIGINT NOT NULL,
+  balance_after BIGINT NOT NULL,
+  reason TEXT,
+  actor_id TEXT,
+  created_at TIMESTAMP DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_gang_vault_ledger_gang ON gang_vault_ledger (gang_id, created_at DESC);
+
+-- Applique un delta avec plancher ; p_allow_partial borne un retrait au solde disponible
+CREATE OR REPLACE FUNCTION apply_gang_vault_delta(
+  p_gang_id TEXT, p_delta BIGINT, p_reason TEXT DEFAULT '', p_actor_id TEXT DEFAULT NULL,
+  p_floor BIGINT DEFAULT 0, p_allow_partial BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (applied BIGINT, balance BIGINT) AS $$
+DECLARE
+  v_current BIGINT;
+  v_delta BIGINT := p_delta;
+BEGIN
+  SELECT vault_points INTO v_current FROM gangs WHERE id::TEXT = p_gang_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  IF v_current + v_delta < p_floor THEN
+    IF NOT p_allow_partial THEN
+      RETURN;
+    END IF;
+    v_delta := LEAST(0, p_floor - v_current);
+  END IF;
+
+  UPDATE gangs SET vault_points = v_current + v_delta WHERE id::TEXT = p_gang_id;
+  IF v_delta <> 0 THEN
+    INSERT INTO gang_vault_ledger (gang_id, delta, balance_after, reason, actor_id)
+    VALUES (p_gang_id, v_delta, v_current + v_delta, p_reason, p_actor_id);
+  END IF;
+
+  RETURN QUERY SELECT v_delta, v_current + v_delta;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Incrémente plusieurs coffres en une requête : p_deltas = {"gang_id": montant, ...}
+CREATE OR REPLACE FUNCTION increment_gang_vaults(p_deltas JSONB, p_reason TEXT DEFAULT '')
+RETURNS VOID AS $$
+  WITH updated AS (
+    UPDATE gangs g SET vault_points = g.vault_points + d.value::BIGINT
+    FROM jsonb_each_text(p_deltas) AS d
+    WHERE g.id::TEXT = d.key
+    RETURNING g.id::TEXT AS gang_id, d.value::BIGINT AS delta, g.vault_points AS balance_after
+  )
+  INSERT INTO gang_vault_ledger (gang_id, delta, balance_after, reason)
+  SELECT gang_id, delta, balance_after, p_reason FROM updated;
+$$ LANGUAGE sql;
+
+-- === GANG WARS ===
+
+CREATE TABLE IF NOT EXISTS gang_wars (
+  war_id TEXT PRIMARY KEY,
+  attacker_gang_id TEXT NOT NULL,
+  defender_gang_id TEXT NOT NULL,
+  war_type TEXT NOT NULL,
+  stake TEXT,
+  status TEXT NOT NULL DEFAULT 'declared',
+  declared_at TEXT NOT NULL,
+  starts_at TEXT,
+  ends_at TEXT,
+  attacker_power BIGINT DEFAULT 0,
+  defender_power BIGINT DEFAULT 0,
+  participants JSONB DEFAULT '{"attackers": [], "defenders": []}'::jsonb,
+  winner TEXT,
+  rewards JSONB DEFAULT '{}'::jsonb
+);
+
+-- Historique par gang : chaque branche du OR suit son index, déjà triée pour la pagination par curseur
+CREATE INDEX IF NOT EXISTS idx_gang_wars_attacker_history ON gang_wars (attacker_gang_id, declared_at DESC, war_id DESC);
+CREATE INDEX IF NOT EXISTS idx_gang_wars_defender_history ON gang_wars (defender_gang_id, declared_at DESC, war_id DESC);
+-- Guerres en cours (reconstruction de l'index mémoire et des minuteries de phase)
+CREATE INDEX IF NOT EXISTS idx_gang_wars_ongoing ON gang_wars (status) WHERE status IN ('declared', 'preparation', 'active');
+
+-- Crée une guerre si aucun des deux gangs n'est déjà en guerre (vérification et insertion atomiques)
+-- Les verrous consultatifs sont pris dans un ordre fixe : deux déclarations croisées ne s'interbloquent pas
+CREATE OR REPLACE FUNCTION create_war_exclusive(p_war JSONB)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_attacker TEXT := p_war->>'attacker_gang_id';
+  v_defender TEXT := p_war->>'defender_gang_id';
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('gang_war:' || LEAST(v_attacker, v_defender)));
+  PERFORM pg_advisory_xact_lock(hashtext('gang_war:' || GREATEST(v_attacker, v_defender)));
+
+  IF EXISTS (
+    SELECT 1 FROM gang_wars
+    WHERE status IN ('declared', 'preparation', 'active')
+    AND (attacker_gang_id IN (v_attacker, v_defender) OR defender_gang_id IN (v_attacker, v_defender))
+  ) THEN
+    RETURN FALSE;
+  END IF;
+
+  INSERT INTO gang_wars SELECT * FROM jsonb_populate_record(NULL::gang_wars, p_war);
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Points, gang et rang de plusieurs membres en une requête (calcul de puissance groupé)
+CREATE OR REPLACE FUNCTION get_war_power_inputs(p_user_ids TEXT[])
+RETURNS TABLE (user_id TEXT, points BIGINT, gang_id TEXT, rank TEXT) AS $$
+  SELECT ids.user_id, COALESCE(u.points, 0), gm.gang_id::TEXT, gm.rank
+  FROM unnest(p_user_ids) AS ids(user_id)
+  LEFT JOIN users u ON u.user_id = ids.user_id
+  LEFT JOIN gang_members gm ON gm.user_id = ids.user_id;
+$$ LANGUAGE sql STABLE;
+
+-- Ajoute des participants à un camp et incrémente son total de puissance sous verrou de ligne
+-- p_side = 'attackers' | 'defenders', p_powers = {"user_id": puissance, ...}
+CREATE OR REPLACE FUNCTION add_war_participants(p_war_id TEXT, p_side TEXT, p_powers JSONB)
+RETURNS TABLE (added JSONB, total_power BIGINT) AS $$
+DECLARE
+  v_participants JSONB;
+  v_added JSONB;
+  v_gain BIGINT;
+  v_power_field TEXT := CASE p_side WHEN 'attackers' THEN 'attacker_power' ELSE 'defender_power' END;
+BEGIN
+  SELECT participants INTO v_participants FROM gang_wars WHERE war_id = p_war_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  SELECT COALESCE(jsonb_agg(p.key), '[]'::jsonb), COALESCE(SUM(p.value::BIGINT), 0)
+  INTO v_added, v_gain
+  FROM jsonb_each_text(p_powers) AS p
+  WHERE NOT COALESCE(v_participants->p_side, '[]'::jsonb) ? p.key;
+
+  RETURN QUERY EXECUTE format(
+    'UPDATE gang_wars SET participants = jsonb_set(COALESCE(participants, ''{}''::jsonb), ARRAY[$1],
+       COALESCE(participants->$1, ''[]''::jsonb) || $2), %1$I = COALESCE(%1$I, 0) + $3
+     WHERE war_id = $4 RETURNING $2, %1$I::BIGINT', v_power_field)
+  USING p_side, v_added, v_gain, p_war_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- === GANG INFO ===
+
+-- Gangs avec membres et compteurs en une requête : p_gang_ids NULL = tous les gangs
+-- territory_count est recalculé depuis territories plutôt que lu dans la colonne dénormalisée
+CREATE OR REPLACE FUNCTION get_gangs_with_members(p_gang_ids TEXT[] DEFAULT NULL)
+RETURNS TABLE (gang JSONB) AS $$
+  SELECT to_jsonb(g) || jsonb_build_object(
+    'members', COALESCE(m.members, '{}'::jsonb),
+    'member_count', COALESCE(m.member_count, 0),
+    'territory_count', COALESCE(t.territory_count, 0)
+  )
+  FROM gangs g
+  LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(gm.user_id, jsonb_build_object('rank', gm.rank, 'joined_at', gm.joined_at)) AS members,
+           COUNT(*) AS member_count
+    FROM gang_members gm WHERE gm.gang_id::TEXT = g.id::TEXT
+  ) m ON TRUE
+  LEFT JOIN LATERAL (
+    SELECT COUNT(*) AS territory_count FROM territories tr WHERE tr.controlled_by::TEXT = g.id::TEXT
+  ) t ON TRUE
+  WHERE p_gang_ids IS NULL OR g.id::TEXT = ANY(p_gang_ids);
+$$ LANGUAGE sql STABLE;
+
+CREATE INDEX IF NOT EXISTS idx_gang_members_gang ON gang_members (gang_id);
+CREATE INDEX IF NOT EXISTS idx_territories_controlled_by ON territories (controlled_by);
+
+-- === GANG EVENTS ===
+
+-- Applique tous les effets d'un événement de gang en une transaction :
+--   p_vault_deltas    {"gang_id": delta}                       retraits bornés au solde
+--   p_territories     {"territory_id": {"controlled_by", "defense_points", "income_bonus"}}
+--   p_awards          [{"user_id", "amount", "reason", "source_gang"}]  source_gang borne au montant pris
+--   p_member_removals [{"gang_id", "user_id"}]
+-- Retourne {"gang_id": delta réellement appliqué}
+CREATE OR REPLACE FUNCTION apply_gang_event(
+  p_reason TEXT, p_vault_deltas JSONB, p_territories JSONB DEFAULT '{}'::jsonb,
+  p_awards JSONB DEFAULT '[]'::jsonb, p_member_removals JSONB DEFAULT '[]'::jsonb
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_applied JSONB := '{}'::jsonb;
+  v_current BIGINT;
+  v_delta BIGINT;
+  r RECORD;
+BEGIN
+  FOR r IN SELECT d.key AS gang_id, d.value::BIGINT AS delta FROM jsonb_each_text(p_vault_deltas) AS d ORDER BY d.key LOOP
+    SELECT vault_points INTO v_current FROM gangs WHERE id::TEXT = r.gang_id FOR UPDATE;
+    CONTINUE WHEN NOT FOUND;
+    v_delta := GREATEST(r.delta, -v_current);
+    UPDATE gangs SET vault_points = v_current + v_delta WHERE id::TEXT = r.gang_id;
+    IF v_delta <> 0 THEN
+      INSERT INTO gang_vault_ledger (gang_id, delta, balance_after, reason)
+      VALUES (r.gang_id, v_delta, v_current + v_delta, p_reason);
+    END IF;
+    v_applied := v_applied || jsonb_build_object(r.gang_id, v_delta);
+  END LOOP;
+
+  -- Changement de propriétaire : territory_count de l'ancien et du nouveau gang ajusté dans la même transaction
+  UPDATE gangs g SET territory_count = GREATEST(0, COALESCE(g.territory_count, 0) + c.delta)
+  FROM (
+    SELECT o.gang_id, SUM(o.delta) AS delta
+    FROM territories t
+    JOIN jsonb_each(p_territories) AS u ON t.id::TEXT = u.key
+    CROSS JOIN LATERAL (VALUES (t.controlled_by::TEXT, -1), (u.value->>'controlled_by', 1)) AS o(gang_id, delta)
+    WHERE u.value ? 'controlled_by'
+      AND t.controlled_by::TEXT IS DISTINCT FROM u.value->>'controlled_by'
+      AND o.gang_id IS NOT NULL
+    GROUP BY o.gang_id
+  ) c
+  WHERE g.id::TEXT = c.gang_id;
+
+  UPDATE territories t SET
+    controlled_by = CASE WHEN u.value ? 'controlled_by' THEN u.value->>'controlled_by' ELSE t.controlled_by END,
+    defense_points = COALESCE((u.value->>'defense_points')::INTEGER, t.defense_points),
+    income_bonus = COALESCE((u.value->>'income_bonus')::INTEGER, t.income_bonus)
+  FROM jsonb_each(p_territories) AS u
+  WHERE t.id::TEXT = u.key;
+
+  DELETE FROM gang_members gm
+  USING jsonb_to_recordset(p_member_removals) AS m(gang_id TEXT, user_id TEXT)
+  WHERE gm.gang_id::TEXT = m.gang_id AND gm.user_id = m.user_id;
+
+  WITH awards AS (
+    SELECT a.user_id, a.reason,
+           CASE WHEN a.source_gang IS NULL THEN a.amount
+                ELSE LEAST(a.amount, -COALESCE((v_applied->>a.source_gang)::BIGINT, 0)) END AS amount
+    FROM jsonb_to_recordset(p_awards) AS a(user_id TEXT, amount BIGINT, reason TEXT, source_gang TEXT)
+  ), credited AS (
+    INSERT INTO users (user_id, points)
+    SELECT user_id, amount FROM awards WHERE amount > 0
+    ON CONFLICT (user_id) DO UPDATE SET points = users.points + EXCLUDED.points, updated_at = NOW()
+  )
+  INSERT INTO point_transactions (user_id, amount, reason, timestamp)
+  SELECT user_id, amount, COALESCE(reason, p_reason), NOW() FROM awards WHERE amount > 0;
+
+  RETURN v_applied;
+END;
+$$ LANGUAGE plpgsql;
+
+-- === ACTIVITY POINTS ===
+
+-- Crédite plusieurs utilisateurs et écrit le journal en une seule transaction
+CREATE OR REPLACE FUNCTION award_points_bulk(p_awards JSONB)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO users (user_id, points)
+  SELECT a.user_id, SUM(a.amount)
+  FROM jsonb_to_recordset(p_awards) AS a(user_id TEXT, amount BIGINT, reason TEXT)
+  GROUP BY a.user_id
+  ON CONFLICT (user_id) DO UPDATE SET points = users.points + EXCLUDED.points, updated_at = NOW();
+
+  INSERT INTO point_transactions (user_id, amount, reason, timestamp)
+  SELECT a.user_id, a.amount, a.reason, NOW()
+  FROM jsonb_to_recordset(p_awards) AS a(user_id TEXT, amount BIGINT, reason TEXT);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Sessions vocales : copie du suivi en mémoire, relue au démarrage
+ALTER TABLE voice_sessions ADD COLUMN IF NOT EXISTS guild_id TEXT;
+ALTER TABLE voice_sessions ADD COLUMN IF NOT EXISTS channel_id TEXT;
+ALTER TABLE voice_sessions ADD COLUMN IF NOT EXISTS pending_seconds DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE voice_sessions ADD COLUMN IF NOT EXISTS points_awarded INTEGER DEFAULT 0;
+ALTER TABLE voice_sessions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+-- Remplace les sessions sauvegardées par l'état courant en une transaction ; chaque instance
+-- ne remplace que les lignes des serveurs qu'elle suit (p_guild_ids)
+DROP FUNCTION IF EXISTS checkpoint_voice_sessions(JSONB);
+
+CREATE OR REPLACE FUNCTION checkpoint_voice_sessions(p_sessions JSONB, p_guild_ids TEXT[])
+RETURNS VOID AS $$
+BEGIN
+  DELETE FROM voice_sessions v
+  WHERE v.guild_id = ANY(p_guild_ids)
+  AND NOT EXISTS (
+    SELECT 1 FROM jsonb_to_recordset(p_sessions) AS s(user_id TEXT) WHERE s.user_id = v.user_id
+  );
+
+  INSERT INTO voice_sessions (user_id, guild_id, channel_id, start_time, pending_seconds, points_awarded, updated_at)
+  SELECT s.user_id, s.guild_id, s.channel_id, s.start_time, s.pending_seconds, s.points_awarded, NOW()
+  FROM jsonb_to_recordset(p_sessions)
+    AS s(user_id TEXT, guild_id TEXT, channel_id TEXT, start_time DOUBLE PRECISION,
+         pending_seconds DOUBLE PRECISION, points_awarded INTEGER)
+  ON CONFLICT (user_id) DO UPDATE SET
+    guild_id = EXCLUDED.guild_id,
+    channel_id = EXCLUDED.channel_id,
+    start_time = EXCLUDED.start_time,
+    pending_seconds = EXCLUDED.pending_seconds,
+    points_awarded = EXCLUDED.points_awarded,
+    updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- === INVENTORIES ===
+
+-- Une ligne par utilisateur et par objet, avec sa quantité
+CREATE TABLE IF NOT EXISTS inventory_items (
+  user_id TEXT NOT NULL,
+  item_id TEXT NOT NULL,
+  quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+  updated_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (user_id, item_id)
+);
+
+-- Reprise des anciennes listes inventories.items, une seule fois (table vide)
+DO $$
+BEGIN
+  IF to_regclass('inventories') IS NOT NULL AND NOT EXISTS (SELECT 1 FROM inventory_items) THEN
+    INSERT INTO inventory_items (user_id, item_id, quantity)
+    SELECT i.user_id, item.value, COUNT(*)
+    FROM inventories i, jsonb_array_elements_text(to_jsonb(i.items)) AS item
+    GROUP BY i.user_id, item.value;
+  END IF;
+END $$;
+
+-- Ajoute des objets à plusieurs inventaires en une transaction
+-- p_grants [{"user_id", "item_id", "quantity"}]
+CREATE OR REPLACE FUNCTION add_inventory_items(p_grants JSONB)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO inventory_items (user_id, item_id, quantity)
+  SELECT g.user_id, g.item_id, SUM(g.quantity)
+  FROM jsonb_to_recordset(p_grants) AS g(user_id TEXT, item_id TEXT, quantity INTEGER)
+  WHERE g.quantity > 0
+  GROUP BY g.user_id, g.item_id
+  ON CONFLICT (user_id, item_id) DO UPDATE SET
+    quantity = inventory_items.quantity + EXCLUDED.quantity,
+    updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retire des objets sous verrou de ligne ; retourne la quantité retirée
+-- Sans p_partial, rien n'est retiré si l'utilisateur possède moins de p_quantity objets
+CREATE OR REPLACE FUNCTION remove_inventory_item(p_user_id TEXT, p_item_id TEXT, p_quantity INTEGER,
+                                                 p_partial BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER AS $$
+DECLARE
+  v_current INTEGER;
+  v_removed INTEGER;
+BEGIN
+  SELECT quantity INTO v_current FROM inventory_items
+  WHERE user_id = p_user_id AND item_id = p_item_id FOR UPDATE;
+  IF NOT FOUND OR p_quantity <= 0 OR v_current = 0 OR (NOT p_partial AND v_current < p_quantity) THEN
+    RETURN 0;
+  END IF;
+
+  v_removed := LEAST(v_current, p_quantity);
+  IF v_removed = v_current THEN
+    DELETE FROM inventory_items WHERE user_id = p_user_id AND item_id = p_item_id;
+  ELSE
+    UPDATE inventory_items SET quantity = v_current - v_removed, updated_at = NOW()
+    WHERE user_id = p_user_id AND item_id = p_item_id;
+  END IF;
+  RETURN v_removed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Échange un exemplaire de p_item_a (de p_user_a) contre un exemplaire de p_item_b (de p_user_b)
+-- Les deux lignes sont verrouillées dans un ordre fixe ; rien n'est modifié si l'un des objets manque
+CREATE OR REPLACE FUNCTION swap_inventory_items(p_user_a TEXT, p_item_a TEXT, p_user_b TEXT, p_item_b TEXT)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_owned INTEGER;
+BEGIN
+  IF p_user_a = p_user_b THEN
+    RETURN FALSE;
+  END IF;
+
+  SELECT COUNT(*) INTO v_owned FROM (
+    SELECT 1 FROM inventory_items
+    WHERE ((user_id = p_user_a AND item_id = p_item_a) OR (user_id = p_user_b AND item_id = p_item_b))
+      AND quantity > 0
+    ORDER BY user_id, item_id
+    FOR UPDATE
+  ) AS locked;
+  IF v_owned < 2 THEN
+    RETURN FALSE;
+  END IF;
+
+  UPDATE inventory_items SET quantity = quantity - 1, updated_at = NOW()
+  WHERE (user_id = p_user_a AND item_id = p_item_a) OR (user_id = p_user_b AND item_id = p_item_b);
+  DELETE FROM inventory_items
+  WHERE ((user_id = p_user_a AND item_id = p_item_a) OR (user_id = p_user_b AND item_id = p_item_b))
+    AND quantity = 0;
+
+  INSERT INTO inventory_items (user_id, item_id, quantity)
+  VALUES (p_user_b, p_item_a, 1), (p_user_a, p_item_b, 1)
+  ON CONFLICT (user_id, item_id) DO UPDATE SET
+    quantity = inventory_items.quantity + 1,
+    updated_at = NOW();
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- === RETENTION ===
+
+-- Agrégats quotidiens des journaux purgés
+CREATE TABLE IF NOT EXISTS point_transactions_daily (
+  user_id TEXT NOT NULL,
+  day DATE NOT NULL,
+  total BIGINT NOT NULL DEFAULT 0,
+  transactions INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS gang_vault_ledger_daily (
+  gang_id TEXT NOT NULL,
+  day DATE NOT NULL,
+  total BIGINT NOT NULL DEFAULT 0,
+  movements INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (gang_id, day)
+);
+
+-- Les purges parcourent les lignes les plus anciennes en premier
+CREATE INDEX IF NOT EXISTS idx_point_transactions_timestamp ON point_transactions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_gang_vault_ledger_created ON gang_vault_ledger (created_at);
+CREATE INDEX IF NOT EXISTS idx_command_usage_date ON command_usage (date);
+
+-- Tables purgées créées hors de ce fichier : index ajouté seulement si la table existe
+DO $$
+DECLARE
+  v RECORD;
+BEGIN
+  FOR v IN SELECT * FROM (VALUES
+    ('daily_commands', 'command_date'),
+    ('gang_daily_contributions', 'contribution_date'),
+    ('admin_actions', 'performed_at'),
+    ('prison_work', 'worked_at'),
+    ('prison_visits', 'visited_at')
+  ) AS t(table_name, column_name) LOOP
+    IF to_regclass(v.table_name) IS NOT NULL THEN
+      EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I (%I)',
+                     'idx_' || v.table_name || '_' || v.column_name, v.table_name, v.column_name);
+    END IF;
+  END LOOP;
+END $$;
+
+-- Supprime au plus p_batch lignes antérieures à p_cutoff (les plus anciennes d'abord)
+-- Retourne le nombre de lignes supprimées ; l'appelant répète tant qu'un lot est plein
+CREATE OR REPLACE FUNCTION purge_old_rows(p_table TEXT, p_column TEXT, p_cutoff TEXT, p_batch INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+  v_deleted INTEGER;
+BEGIN
+  IF p_table NOT IN ('command_usage', 'daily_commands', 'gang_daily_contributions',
+                     'admin_actions', 'prison_work', 'prison_visits') THEN
+    RAISE EXCEPTION 'purge_old_rows: table % non autorisée', p_table;
+  END IF;
+
+  EXECUTE format(
+    'DELETE FROM %1$I WHERE ctid = ANY(ARRAY(SELECT ctid FROM %1$I WHERE %2$I < %3$L ORDER BY %2$I LIMIT %4$s))',
+    p_table, p_column, p_cutoff, p_batch
+  );
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reporte au plus p_batch lignes de journal antérieures à p_cutoff dans l'agrégat quotidien, puis les supprime
+CREATE OR REPLACE FUNCTION rollup_ledger_rows(p_table TEXT, p_cutoff TIMESTAMP, p_batch INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+  v_deleted INTEGER;
+BEGIN
+  IF p_table = 'point_transactions' THEN
+    WITH doomed AS (
+      DELETE FROM point_transactions
+      WHERE id = ANY(ARRAY(SELECT id FROM point_transactions WHERE timestamp < p_cutoff ORDER BY timestamp, id LIMIT p_batch))
+      RETURNING user_id, amount, timestamp
+    ), daily AS (
+      INSERT INTO point_transactions_daily (user_id, day, total, transactions)
+      SELECT user_id, timestamp::DATE, SUM(amount), COUNT(*) FROM doomed GROUP BY user_id, timestamp::DATE
+      ON CONFLICT (user_id, day) DO UPDATE SET
+        total = point_transactions_daily.total + EXCLUDED.total,
+        transactions = point_transactions_daily.transactions + EXCLUDED.transactions
+    )
+    SELECT COUNT(*) INTO v_deleted FROM doomed;
+  ELSIF p_table = 'gang_vault_ledger' THEN
+    WITH doomed AS (
+      DELETE FROM gang_vault_ledger
+      WHERE id = ANY(ARRAY(SELECT id FROM gang_vault_ledger WHERE created_at < p_cutoff ORDER BY created_at, id LIMIT p_batch))
+      RETURNING gang_id, delta, created_at
+    ), daily AS (
+      INSERT INTO gang_vault_ledger_daily (gang_id, day, total, movements)
+      SELECT gang_id, created_at::DATE, SUM(delta), COUNT(*) FROM doomed GROUP BY gang_id, created_at::DATE
+      ON CONFLICT (gang_id, day) DO UPDATE SET
+        total = gang_vault_ledger_daily.total + EXCLUDED.total,
+        movements = gang_vault_ledger_daily.movements + EXCLUDED.movements
+    )
+    SELECT COUNT(*) INTO v_deleted FROM doomed;
+  ELSE
+    RAISE EXCEPTION 'rollup_ledger_rows: table % non autorisée', p_table;
+  END IF;
+  RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
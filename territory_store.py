@@ -0,0 +1,98 @@
+"""
+Stockage mémoire des territoires
+Index inverse gang -> territoires et revenus précalculés par gang, tenus à jour par les
+écritures ; un numéro de version croissant signale tout changement sans rien comparer
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger('EngagementBot')
+
+class TerritoryStore:
+    """Territoires indexés par gang, rechargés entièrement au plus toutes les `ttl` secondes"""
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self.territories: Dict[str, Dict] = {}
+        self._by_gang: Dict[str, Set[str]] = {}
+        self._income_by_gang: Dict[str, int] = {}
+        # Incrémenté à chaque changement effectif (chargement différent ou écriture)
+        self.version = 0
+        self._loaded_at: Optional[float] = None
+
+    def is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def invalidate(self):
+        """Forcer un rechargement complet à la prochaine lecture"""
+        self._loaded_at = None
+
+    def load(self, rows: Iterable[Dict]):
+        """Remplacer le contenu par une lecture complète de la table"""
+        territories = {row['id']: dict(row) for row in rows}
+        self._loaded_at = time.monotonic()
+        if territories == self.territories:
+            return
+        self.territories = territories
+        self._by_gang.clear()
+        self._income_by_gang.clear()
+        for territory_id, data in territories.items():
+            self._index(territory_id, data)
+        self.version += 1
+
+    def _index(self, territory_id: str, data: Dict):
+        gang_id = data.get('controlled_by')
+        if gang_id:
+            self._by_gang.setdefault(gang_id, set()).add(territory_id)
+            self._income_by_gang[gang_id] = self._income_by_gang.get(gang_id, 0) + (data.get('income_bonus') or 0)
+
+    def _unindex(self, territory_id: str, data: Dict):
+        gang_id = data.get('controlled_by')
+        if not gang_id or gang_id not in self._by_gang:
+            return
+        self._by_gang[gang_id].discard(territory_id)
+        self._income_by_gang[gang_id] -= data.get('income_bonus') or 0
+        if not self._by_gang[gang_id]:
+            del self._by_gang[gang_id]
+            del self._income_by_gang[gang_id]
+
+    def update(self, territory_id: str, **fields) -> bool:
+        """Appliquer une écriture réussie ; un territoire inconnu force un rechargement"""
+        data = self.territories.get(territory_id)
+        if data is None:
+            self.invalidate()
+            return False
+        changed = {key: value for key, value in fields.items() if data.get(key) != value}
+        if not changed:
+            return False
+        self._unindex(territory_id, data)
+        data.update(changed)
+        self._index(territory_id, data)
+        self.version += 1
+        return True
+
+    def release_gang(self, gang_id: str, **fields) -> int:
+        """Libérer tous les territoires d'un gang (dissolution)"""
+        territory_ids = list(self._by_gang.get(gang_id, ()))
+        for territory_id in territory_ids:
+            self.update(territory_id, controlled_by=None, **fields)
+        return len(territory_ids)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copie des territoires : la modifier ne touche ni le stockage ni l'index inverse"""
+        return {territory_id: dict(data) for territory_id, data in self.territories.items()}
+
+    def get_gang_territory_ids(self, gang_id: str) -> Set[str]:
+        return set(self._by_gang.get(gang_id, ()))
+
+    def get_gang_territories(self, gang_id: str) -> List[Dict]:
+        return [{"id": territory_id, **self.territories[territory_id]}
+                for territory_id in sorted(self._by_gang.get(gang_id, ()))]
+
+    def get_gang_income(self, gang_id: str) -> int:
+        return self._income_by_gang.get(gang_id, 0)
+
+    def get_income_by_gang(self) -> Dict[str, int]:
+        return {gang_id: income for gang_id, income in self._income_by_gang.items() if income}
@@ -37,6 +37,11 @@ class TerritorySystem:
 
                 capture_cost = actual_cost
 
+            # Deduct vault points (atomic, floor-checked) before any other change
+            if self.gang_system.remove_vault_points(gang_id, capture_cost, reason=f"capture:{territory_id}") is None:
+                return False, f"Votre gang a besoin de {capture_cost} points dans le coffre pour capturer ce territoire."
+
+            if territory["controlled_by"]:
                 # Decrement territory_count for old owner
                 old_gang = self.gang_system.get_gang_info(territory["controlled_by"])
                 if old_gang:
@@ -44,8 +49,6 @@ class TerritorySystem:
 
                 logger.info(f"Territory {territory_id} attacked by {gang_data['name']}")
 
-            # Deduct vault points and transfer territory
-            self.db.update_gang_vault(gang_id, gang_data["vault_points"] - capture_cost)
             self.db.capture_territory(territory_id, gang_id, defense_points=100)
             self.db.update_gang_stats(gang_id, territory_count=gang_data["territory_count"] + 1)
 
@@ -78,8 +81,9 @@ class TerritorySystem:
             actual_defense_gained = new_defense - territory["defense_points"]
             actual_cost = actual_defense_gained * 10
 
+            if self.gang_system.remove_vault_points(gang_id, actual_cost, reason=f"defense:{territory_id}") is None:
+                return False, "Pas assez de points dans le coffre du gang."
             self.db.update_territory_defense(territory_id, new_defense)
-            self.db.update_gang_vault(gang_id, gang_data["vault_points"] - actual_cost)
 
             return True, f"Défenses du territoire '{territory['name']}' améliorées ! Défense: {new_defense}/1000"
 
@@ -89,36 +93,34 @@ class TerritorySystem:
 
     def get_gang_territories(self, gang_id: str) -> List[Dict]:
         """Get all territories controlled by a gang"""
-        all_territories = self.db.get_all_territories()
-        return [
-            {"id": tid, **tdata}
-            for tid, tdata in all_territories.items()
-            if tdata.get("controlled_by") == gang_id
-        ]
+        return self.db.get_territories_of_gang(gang_id)
 
     def get_territory_income(self, gang_id: str) -> int:
         """Calculate total daily income from territories"""
-        all_territories = self.db.get_all_territories()
-        return sum(
-            t["income_bonus"]
-            for t in all_territories.values()
-            if t.get("controlled_by") == gang_id
-        )
-
-    def distribute_territory_income(self):
-        """Distribute daily income from territories to gangs"""
+        return self.db.get_territory_income_by_gang().get(gang_id, 0)
+
+    def get_income_by_gang(self) -> Dict[str, int]:
+        """Sum territory income per controlling gang"""
+        return self.db.get_territory_income_by_gang()
+
+    @property
+    def version(self) -> int:
+        """Version of the territory data; changes whenever any territory does"""
+        return self.db.territories_version
+
+    def distribute_territory_income(self) -> Dict[str, int]:
+        """Distribute territory income to gangs (one aggregated bulk increment)"""
         try:
-            all_territories = self.db.get_all_territories()
-            for territory_data in all_territories.values():
-                gang_id = territory_data.get("controlled_by")
-                if gang_id:
-                    gang_data = self.gang_system.get_gang_info(gang_id)
-                    if gang_data:
-                        income = territory_data["income_bonus"]
-                        self.db.update_gang_vault(gang_id, gang_data["vault_points"] + income)
-                        logger.info(f"Gang {gang_data['name']} received {income} points from territory income")
+            income_by_gang = self.get_income_by_gang()
+            if not income_by_gang:
+                return {}
+            if not self.db.add_gang_vaults_bulk(income_by_gang, reason="territory_income"):
+                return {}
+            logger.info(f"Distributed {sum(income_by_gang.values())} points of territory income to {len(income_by_gang)} gangs")
+            return income_by_gang
         except Exception as e:
             logger.error(f"Error distributing territory income: {e}", exc_info=True)
+            return {}
 
     def get_all_territories(self) -> Dict[str, Dict]:
         """Get all territories with their current status"""
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests du sink JSONL asynchrone d'advanced_logging
+Vérifie le cache des loggers, l'écriture par lots et la rotation compressée
+"""
+
+import gzip
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from advanced_logging import AsyncJsonlSink, CompressedRotatingFileHandler, SamplingFilter, get_logger
+
+
+def test_logger_cache():
+    """get_logger() doit retourner la même instance pour un même nom"""
+    print("🔍 Test du cache des loggers...")
+    first = get_logger('CacheTest')
+    second = get_logger('CacheTest')
+    assert first is second
+    assert len(first.logger.handlers) == 3
+    print("  ✅ Instance réutilisée, handlers non dupliqués")
+
+
+def test_sink_batches_and_flushes():
+    """Les événements empilés sont écrits par le thread du sink"""
+    print("🔍 Test d'écriture par lots...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'events.jsonl'
+        sink = AsyncJsonlSink(path, flush_interval=0.05)
+
+        start = time.perf_counter()
+        for i in range(500):
+            sink.emit({'type': 'test', 'index': i})
+        enqueue_ms = (time.perf_counter() - start) * 1000
+        sink.close()
+
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 500
+        assert json.loads(lines[-1])['index'] == 499
+        assert sink.get_stats()['written'] == 500
+        print(f"  ✅ 500 événements empilés en {enqueue_ms:.2f}ms et écrits")
+
+
+def test_sink_rotates_and_compresses():
+    """Un segment trop gros est renommé puis compressé en .gz"""
+    print("🔍 Test de rotation compressée...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'events.jsonl'
+        sink = AsyncJsonlSink(path, max_bytes=200, batch_size=1, flush_interval=0.05, backup_count=2)
+
+        for i in range(30):
+            sink.emit({'type': 'rotation', 'index': i, 'padding': 'x' * 50})
+        sink.close()
+
+        segments = sorted(Path(tmp).glob('events-*.jsonl.gz'))
+        assert sink.rotations > 0
+        assert 0 < len(segments) <= 2
+        with gzip.open(segments[-1], 'rt', encoding='utf-8') as f:
+            assert json.loads(f.readline())['type'] == 'rotation'
+        print(f"  ✅ {sink.rotations} rotations, {len(segments)} segments conservés")
+
+
+def test_sink_rotations_in_same_second_keep_every_segment():
+    """Plusieurs rotations dans la même seconde : aucun segment écrasé, aucun événement perdu"""
+    print("🔍 Test des rotations rapprochées...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'events.jsonl'
+        sink = AsyncJsonlSink(path, max_bytes=200, batch_size=1, flush_interval=0.05, backup_count=100)
+
+        for i in range(30):
+            sink.emit({'type': 'rotation', 'index': i, 'padding': 'x' * 50})
+        sink.close()
+
+        segments = sorted(Path(tmp).glob('events-*.jsonl.gz'))
+        assert len(segments) == sink.rotations > 1
+        indexes = []
+        for segment in segments:
+            with gzip.open(segment, 'rt', encoding='utf-8') as f:
+                indexes += [json.loads(line)['index'] for line in f]
+        with open(path, encoding='utf-8') as f:
+            indexes += [json.loads(line)['index'] for line in f]
+        assert indexes == list(range(30))
+        print(f"  ✅ {len(segments)} segments distincts, 30 événements conservés dans l'ordre")
+
+
+def test_sink_counts_write_errors():
+    """Un lot impossible à écrire est compté dans les statistiques, le thread continue"""
+    print("🔍 Test des erreurs d'écriture...")
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = AsyncJsonlSink(Path(tmp) / 'events.jsonl', batch_size=1, flush_interval=0.05)
+        sink.emit({('clé', 'non', 'textuelle'): 1})
+        time.sleep(0.2)
+        sink.emit({'type': 'ok'})
+        sink.close()
+        stats = sink.get_stats()
+        assert stats['write_errors'] == 1 and stats['dropped'] == 1 and stats['written'] == 1
+        assert stats['last_error'].startswith('TypeError')
+        print(f"  ✅ Erreur comptée : {stats['last_error']}")
+
+
+def test_sink_drops_when_full():
+    """emit() ne bloque jamais, même si la file est pleine"""
+    print("🔍 Test de file pleine...")
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = AsyncJsonlSink(Path(tmp) / 'events.jsonl', max_queue=1, flush_interval=0.05)
+        for i in range(1000):
+            sink.emit({'index': i})
+        sink.close()
+        stats = sink.get_stats()
+        assert stats['written'] + stats['dropped'] == 1000
+        print(f"  ✅ {stats['dropped']} événements ignorés sans bloquer")
+
+
+def test_sampling_filter():
+    """Les INFO répétitifs sont échantillonnés, les WARNING passent toujours"""
+    print("🔍 Test de l'échantillonnage INFO...")
+    sampler = SamplingFilter(window=60, max_per_window=5)
+
+    def record(level, created):
+        rec = logging.LogRecord('EngagementBot', level, 'bot.py', 42, 'User joined voice channel', None, None)
+        rec.created = created
+        return rec
+
+    passed = sum(sampler.filter(record(logging.INFO, 1000.0)) for _ in range(50))
+    assert passed == 5
+    assert sampler.filter(record(logging.WARNING, 1000.0))
+
+    summary = record(logging.INFO, 1061.0)
+    assert sampler.filter(summary)
+    assert '+45 messages similaires ignorés' in summary.getMessage()
+    print("  ✅ 5/50 INFO émis, résumé des messages ignorés ajouté")
+
+
+def test_compressed_rotating_handler():
+    """Le fichier de log tourne par taille et les archives sont compressées"""
+    print("🔍 Test du handler rotatif compressé...")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / 'bot.log'
+        handler = CompressedRotatingFileHandler(str(log_file), max_bytes=300, backup_count=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for i in range(40):
+            handler.emit(logging.LogRecord('EngagementBot', logging.INFO, 'bot.py', 1, f'line {i:03d} ' + 'x' * 30, None, None))
+        handler.close()
+
+        archives = sorted(Path(tmp).glob('bot.log.*.gz'))
+        assert [a.name for a in archives] == ['bot.log.1.gz', 'bot.log.2.gz']
+        with gzip.open(archives[0], 'rt', encoding='utf-8') as f:
+            assert f.readline().startswith('line')
+        print("  ✅ Archives bot.log.1.gz / bot.log.2.gz créées")
+
+
+if __name__ == "__main__":
+    test_logger_cache()
+    test_sink_batches_and_flushes()
+    test_sink_rotates_and_compresses()
+    test_sink_rotations_in_same_second_keep_every_segment()
+    test_sink_counts_write_errors()
+    test_sink_drops_when_full()
+    test_sampling_filter()
+    test_compressed_rotating_handler()
+    print("\n✅ Tous les tests advanced_logging sont passés")
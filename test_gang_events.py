@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Tests des événements de gang
+Vérifie qu'un événement coûte un nombre constant d'allers-retours : un instantané, une écriture groupée,
+et que l'état volatile n'écrit que les catégories modifiées
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database_supabase import SupabaseDatabase
+from gang_events import GangEvents
+from gang_system import GangSystem
+from gang_wars import GangWarSystem
+from territory_store import TerritoryStore
+from territory_system import TerritorySystem
+
+
+class FakeEventDatabase:
+    """Gangs, territoires et apply_gang_event en mémoire, avec compteur de requêtes"""
+
+    def __init__(self, gang_count=50):
+        self.queries = 0
+        self.commits = []
+        self.state = {}
+        self.state_writes = []
+        self.gangs = {
+            f"g{i}": {"id": f"g{i}", "name": f"Gang {i}", "boss_id": f"{i}00", "vault_points": 1000,
+                      "member_count": 3, "territory_count": i % 2,
+                      "members": {f"{i}00": {"rank": "boss"}, f"{i}01": {"rank": "membre"}, f"{i}02": {"rank": "membre"}}}
+            for i in range(gang_count)
+        }
+        self.territories = {
+            f"t{i}": {"id": f"t{i}", "name": f"Zone {i}", "controlled_by": f"g{i}", "income_bonus": 400, "defense_points": 0}
+            for i in range(5)
+        }
+
+    def load_bot_state(self, key):
+        return self.state.get(key)
+
+    def load_bot_states(self, keys):
+        return {key: self.state[key] for key in keys if key in self.state}
+
+    def save_bot_state(self, key, data):
+        self.state_writes.append(key)
+        self.state[key] = data
+        return True
+
+    def get_all_gangs(self):
+        self.queries += 1
+        return self.gangs
+
+    def get_all_territories(self):
+        self.queries += 1
+        return self.territories
+
+    def apply_gang_event(self, reason, vault_deltas, territory_updates=None, point_awards=None, member_removals=None):
+        self.queries += 1
+        self.commits.append((reason, dict(vault_deltas), dict(territory_updates or {}), list(point_awards or []),
+                             list(member_removals or [])))
+        applied = {}
+        for gang_id, delta in vault_deltas.items():
+            delta = max(delta, -self.gangs[gang_id]["vault_points"])
+            self.gangs[gang_id]["vault_points"] += delta
+            applied[gang_id] = delta
+        for territory_id, fields in (territory_updates or {}).items():
+            self.territories[territory_id].update(fields)
+        return applied
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.gang_messages = []
+        self.broadcasts = []
+
+    def notify_users(self, user_ids, embed, key=None):
+        self.gang_messages.append((sorted(user_ids), embed.title))
+        return len(user_ids)
+
+    def broadcast(self, embed, key=None):
+        self.broadcasts.append(embed.title)
+        return 1
+
+
+def _gang_events(db):
+    bot = SimpleNamespace(notifications=FakeNotifications(), guilds=[])
+    gang_system = GangSystem(db)
+    return GangEvents(db, bot, gang_system, GangWarSystem(db, gang_system), TerritorySystem(db, gang_system)), bot
+
+
+def test_daily_bonus_is_one_batch():
+    """50 gangs crédités : 1 instantané + 1 écriture, notifications mises en file"""
+    print("🔍 Test du bonus quotidien groupé...")
+    db = FakeEventDatabase(gang_count=50)
+    events, bot = _gang_events(db)
+
+    asyncio.run(events._daily_gang_bonuses())
+    assert db.queries == 3
+    (reason, deltas, _, _, _), = db.commits
+    assert reason == "daily_bonus" and len(deltas) == 50
+    assert deltas["g1"] == 100 + 3 * 50 + 200 and db.gangs["g1"]["vault_points"] == 1450
+    assert len(bot.notifications.gang_messages) == 50
+    assert bot.notifications.gang_messages[0][0] == ["000", "001", "002"]
+    print(f"  ✅ 50 coffres crédités en {db.queries} requêtes")
+
+
+def test_betrayal_and_revolt_are_single_commits():
+    """Trahison : retrait, départ et paiement du traître ensemble ; révolte puis restauration des revenus"""
+    print("🔍 Test de la trahison et de la révolte...")
+    random.seed(7)
+    db = FakeEventDatabase(gang_count=3)
+    events, bot = _gang_events(db)
+
+    async def scenario():
+        await events._handle_betrayal({})
+        await events._handle_territory_revolt({})
+        territory_id = next(iter(events._volatile["territory_effects"]))
+        assert events.scheduler.has_job(f"gang_events.restore.{territory_id}")
+        await events._restore_territory_effect(territory_id)
+        return territory_id
+
+    territory_id = asyncio.run(scenario())
+    (reason, deltas, _, awards, removals), revolt, restore = db.commits
+    gang_id = removals[0]["gang_id"]
+    assert reason == "betrayal" and deltas[gang_id] < 0
+    assert awards == [{"user_id": removals[0]["user_id"], "amount": -deltas[gang_id], "reason": "betrayal", "source_gang": gang_id}]
+    assert revolt[2] == {territory_id: {"income_bonus": 200}} and restore[2] == {territory_id: {"income_bonus": 400}}
+    assert db.territories[territory_id]["income_bonus"] == 400 and not events._volatile["territory_effects"]
+    assert db.queries == 2 + 1 + 2 + 1 + 1  # trahison, révolte, restauration
+    print(f"  ✅ 3 événements, {len(db.commits)} écritures groupées")
+
+
+def test_volatile_state_is_diffed_and_debounced():
+    """Plusieurs changements rapprochés : une écriture par catégorie modifiée ; entrées expirées purgées"""
+    print("🔍 Test de la persistance de l'état volatile...")
+    db = FakeEventDatabase(gang_count=3)
+    expired = (datetime.now() - timedelta(minutes=1)).isoformat()
+    # Ancien format (clé unique) avec un marché échu
+    db.state["gang_event_volatile"] = {"black_markets": {"old": {"expires_at": expired}}, "active_treasures": {}}
+    events, _ = _gang_events(db)
+    assert not events._volatile["black_markets"]
+
+    async def scenario():
+        events.volatile_flush_delay = 0.2
+        for _ in range(3):
+            await events._handle_treasure_hunt({})
+        await asyncio.sleep(0.3)
+        first = sorted(db.state_writes)
+        db.state_writes.clear()
+        # Un marché qui expire dans la fenêtre : retiré de la mémoire par sa tâche d'expiration, une seule écriture
+        await events.scheduler.start()
+        events._set_volatile("black_markets", "m1", {"expires_at": (datetime.now() + timedelta(seconds=0.05)).isoformat()})
+        await asyncio.sleep(0.3)
+        await events.stop_events()
+        return first
+
+    first = asyncio.run(scenario())
+    assert first == ["gang_event_volatile.active_treasures", "gang_event_volatile.black_markets"]
+    assert len(db.state["gang_event_volatile.active_treasures"]) == 3
+    assert [key for key in db.state_writes if key.startswith("gang_event_volatile")] == ["gang_event_volatile.black_markets"]
+    assert db.state["gang_event_volatile.black_markets"] == {} and not events._volatile["black_markets"]
+    print("  ✅ 3 trésors en 1 écriture, expiration purgée sans réécrire les autres catégories")
+
+
+def test_owner_change_refreshes_both_gangs():
+    """Territoire qui change de mains : une écriture, les deux gangs relus ensuite (territory_count)"""
+    print("🔍 Test du changement de propriétaire...")
+    calls = []
+
+    def rpc(name, params):
+        calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data={}))
+
+    db = SupabaseDatabase.__new__(SupabaseDatabase)
+    db.supabase = SimpleNamespace(rpc=rpc)
+    db.last_connection_attempt = None
+    db._cache, db._cache_expiry = {}, {}
+    db.territory_store = TerritoryStore()
+    db.territory_store.load([{"id": "t1", "controlled_by": "g1", "income_bonus": 100}])
+    for gang_id in ("g1", "g2", "g3"):
+        db._cache_set(f"gang:{gang_id}", {"id": gang_id}, ttl=60)
+
+    assert db.apply_gang_event("territory_attack", {}, {"t1": {"controlled_by": "g2"}}) == {}
+    assert len(calls) == 1 and calls[0][0] == "apply_gang_event"
+    assert db._cache_get("gang:g1") is None and db._cache_get("gang:g2") is None
+    assert db._cache_get("gang:g3") == {"id": "g3"}
+    assert db.territory_store.get_gang_territory_ids("g2") == {"t1"}
+    print("  ✅ 1 écriture, ancien et nouveau propriétaires invalidés")
+
+
+if __name__ == "__main__":
+    test_daily_bonus_is_one_batch()
+    test_betrayal_and_revolt_are_single_commits()
+    test_volatile_state_is_diffed_and_debounced()
+    test_owner_change_refreshes_both_gangs()
+    print("\n✅ Tous les tests des événements de gang sont passés")
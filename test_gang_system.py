@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests du système de gangs
+Vérifie que les gangs, leurs membres et leurs compteurs sont chargés en une seule requête
+"""
+
+from types import SimpleNamespace
+
+from database_supabase import SupabaseDatabase
+from gang_system import GangSystem
+
+
+class FakeRpcClient:
+    """Client Supabase réduit à rpc(), qui filtre les gangs comme get_gangs_with_members"""
+
+    def __init__(self, gangs):
+        self.gangs = gangs
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        ids = params['p_gang_ids']
+        rows = [{'gang': dict(gang)} for gang in self.gangs if ids is None or gang['id'] in ids]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+
+def _database(gangs):
+    db = SupabaseDatabase.__new__(SupabaseDatabase)
+    db.supabase = FakeRpcClient(gangs)
+    db.last_connection_attempt = None
+    db._cache, db._cache_expiry = {}, {}
+    return db
+
+
+def test_gangs_loaded_in_one_request():
+    """Tous les gangs avec membres et compteurs en 1 requête, qui alimente aussi get_gang_info"""
+    print("🔍 Test du chargement groupé des gangs...")
+    gangs = [
+        {'id': f'g{i}', 'name': f'Gang {i}', 'vault_points': 1000 * i, 'member_count': i, 'territory_count': i % 2,
+         'members': {f'u{i}_{j}': {'rank': 'membre', 'joined_at': '2026-01-01'} for j in range(i)}}
+        for i in range(1, 21)
+    ]
+    db = _database(gangs)
+    gang_system = GangSystem(db)
+
+    all_gangs = gang_system.get_all_gangs()
+    assert len(all_gangs) == 20 and all_gangs['g3']['member_count'] == 3 and len(all_gangs['g3']['members']) == 3
+    assert db.supabase.calls == [('get_gangs_with_members', {'p_gang_ids': None})]
+
+    assert gang_system.get_gang_info('g7')['name'] == 'Gang 7'
+    assert len(db.supabase.calls) == 1  # servi par le cache rempli lors du chargement groupé
+
+    db._cache.clear()
+    assert gang_system.get_gang_info('g7')['members'] == gangs[6]['members']
+    assert db.supabase.calls[-1] == ('get_gangs_with_members', {'p_gang_ids': ['g7']})
+    print(f"  ✅ 20 gangs en 1 requête, fiche d'un gang en {len(db.supabase.calls) - 1} requête")
+
+
+if __name__ == "__main__":
+    test_gangs_loaded_in_one_request()
+    print("\n✅ Tous les tests du système de gangs sont passés")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tests du système de guerres de gangs
+Vérifie le calcul groupé des puissances, les totaux tenus à jour à chaque enrôlement
+et les transitions de phase déclenchées par échéance
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database_supabase import SupabaseDatabase
+from gang_wars import GangWarSystem, WarStatus, MIN_WAR_POWER
+from job_scheduler import JobScheduler
+
+
+class FakeWarDatabase:
+    """Base minimale : membres, une guerre active et un compteur d'allers-retours"""
+
+    def __init__(self):
+        self.queries = 0
+        self.members = {
+            'boss': {'user_id': 'boss', 'points': 50000, 'gang_id': 'g1', 'rank': 'Chef'},
+            'lt': {'user_id': 'lt', 'points': 30000, 'gang_id': 'g1', 'rank': 'lieutenant'},
+            'rookie': {'user_id': 'rookie', 'points': 100, 'gang_id': 'g1', 'rank': 'recrue'},
+            'enemy': {'user_id': 'enemy', 'points': 20000, 'gang_id': 'g2', 'rank': 'Membre'},
+        }
+        self.war = {
+            'war_id': 'war_1', 'attacker_gang_id': 'g1', 'defender_gang_id': 'g2',
+            'status': WarStatus.ACTIVE.value, 'war_type': 'reputation',
+            'attacker_power': 0, 'defender_power': 0,
+            'participants': {'attackers': [], 'defenders': []}
+        }
+
+    def get_war_power_inputs(self, user_ids):
+        self.queries += 1
+        return {uid: dict(self.members[uid]) for uid in user_ids if uid in self.members}
+
+    def get_active_wars(self):
+        self.queries += 1
+        return [{**self.war, 'participants': {k: list(v) for k, v in self.war['participants'].items()}}]
+
+    def get_war(self, war_id):
+        self.queries += 1
+        return dict(self.war) if war_id == self.war['war_id'] else None
+
+    def update_war(self, war_id, **fields):
+        self.queries += 1
+        self.war.update(fields)
+        return True
+
+    def add_war_participants(self, war_id, side, powers):
+        self.queries += 1
+        added = [uid for uid in powers if uid not in self.war['participants'][side]]
+        self.war['participants'][side].extend(added)
+        field = 'attacker_power' if side == 'attackers' else 'defender_power'
+        self.war[field] += sum(powers[uid] for uid in added)
+        return {'added': added, 'total_power': self.war[field]}
+
+
+class RecordingQuery:
+    """Imite le query builder PostgREST et enregistre chaque requête exécutée"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.calls = [('table', table)]
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name.rstrip('_'), args, kwargs) if kwargs else (name.rstrip('_'), *args))
+            return self
+        return method
+
+    def execute(self):
+        self.client.executed.append(self.calls)
+        return SimpleNamespace(data=self.client.rows)
+
+
+class RecordingClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def table(self, name):
+        return RecordingQuery(self, name)
+
+    def rpc(self, name, params):
+        def execute():
+            self.executed.append([('rpc', name, params)])
+            return SimpleNamespace(data=True)
+        return SimpleNamespace(execute=execute)
+
+
+def _recording_database(rows):
+    db = SupabaseDatabase.__new__(SupabaseDatabase)
+    db.supabase = RecordingClient(rows)
+    db.last_connection_attempt = None
+    db._cache, db._cache_expiry = {}, {}
+    db._active_war_by_gang, db._active_war_gangs, db._active_war_index_expiry = {}, {}, 0.0
+    return db
+
+
+def test_batch_war_powers():
+    """Les puissances de tous les participants sont calculées en une requête"""
+    print("🔍 Test du calcul groupé des puissances...")
+    db = FakeWarDatabase()
+    wars = GangWarSystem(db, gang_system=None)
+
+    powers = wars.calculate_war_powers(['boss', 'lt', 'rookie', 'ghost'])
+    assert db.queries == 1
+    assert powers == {'boss': 1000, 'lt': 450, 'rookie': MIN_WAR_POWER, 'ghost': MIN_WAR_POWER}
+    assert wars.calculate_war_powers(['boss', 'enemy'], gang_id='g1') == {'boss': 1000}
+    print(f"  ✅ 4 puissances en 1 requête : {powers}")
+
+
+def test_running_totals():
+    """Chaque enrôlement incrémente le total du camp, sans recalcul ni doublon"""
+    print("🔍 Test des totaux incrémentaux...")
+    db = FakeWarDatabase()
+    wars = GangWarSystem(db, gang_system=None)
+
+    success, _ = wars.join_war('enemy', 'defenders')
+    assert success and db.war['defender_power'] == 240
+    assert not wars.join_war('enemy', 'defenders')[0]
+
+    war_data = db.get_active_wars()[0]
+    db.queries = 0
+    gained, added = wars.enlist_members(war_data, 'g1', ['boss', 'lt', 'rookie', 'enemy'])
+    assert db.queries == 2
+    assert sorted(added) == ['boss', 'lt', 'rookie']
+    assert gained == db.war['attacker_power'] == war_data['attacker_power'] == 1500
+    assert wars.enlist_members(war_data, 'g1', ['boss']) == (0, [])
+    print(f"  ✅ Attaquants {db.war['attacker_power']} / défenseurs {db.war['defender_power']}")
+
+
+def test_war_phase_timers():
+    """Les phases s'enchaînent à l'échéance près, sans polling entre deux transitions"""
+    print("🔍 Test des minuteries de phase...")
+
+    async def scenario():
+        db = FakeWarDatabase()
+        now = datetime.now()
+        db.war.update(status=WarStatus.DECLARED.value,
+                      starts_at=(now + timedelta(seconds=0.1)).isoformat(),
+                      ends_at=(now + timedelta(seconds=0.4)).isoformat())
+        scheduler = JobScheduler()
+        wars = GangWarSystem(db, gang_system=None, scheduler=scheduler)
+        wars.preparation_phase = 0.1
+        phases = []
+
+        async def listener(war_data, status):
+            phases.append((status, time.time()))
+
+        wars.add_phase_listener(listener)
+        await scheduler.start()
+        try:
+            assert await wars.restore_war_timers() == 1
+            db.queries = 0
+            await asyncio.sleep(0.6)
+        finally:
+            await scheduler.stop(persist=False)
+        return db, phases, now.timestamp(), scheduler
+
+    db, phases, start, scheduler = asyncio.run(scenario())
+    assert [status for status, _ in phases] == ['preparation', 'active', 'finished']
+    for (_, fired_at), deadline in zip(phases, (0.1, 0.2, 0.4)):
+        assert 0 <= fired_at - (start + deadline) < 1
+    assert db.war['status'] == WarStatus.FINISHED.value and db.war['winner'] == 'draw'
+    assert db.queries == 8  # 3 lectures + 2 changements de statut + clôture (lecture, écriture, relecture)
+    assert not scheduler.has_job('gang_wars.war_1')
+    print(f"  ✅ 3 transitions à l'heure, {db.queries} requêtes au total")
+
+
+def test_sweep_picks_up_wars_from_other_replicas():
+    """Guerre déclarée sur une instance non leader : le balayage du leader la programme et la fait avancer"""
+    print("🔍 Test du balayage des guerres...")
+
+    async def scenario():
+        db = FakeWarDatabase()
+        now = datetime.now()
+        db.war.update(status=WarStatus.DECLARED.value,
+                      starts_at=(now - timedelta(seconds=1)).isoformat(),
+                      ends_at=(now + timedelta(hours=1)).isoformat())
+        # Déclarée ailleurs : rien dans le planificateur du leader
+        scheduler = JobScheduler()
+        wars = GangWarSystem(db, gang_system=None, scheduler=scheduler)
+        await scheduler.start()
+        try:
+            assert await wars.sweep_war_timers() == 1
+            await asyncio.sleep(0.1)
+            # Déjà programmée pour sa prochaine phase : le balayage suivant n'y touche pas
+            swept_again = await wars.sweep_war_timers()
+        finally:
+            await scheduler.stop(persist=False)
+        return db, swept_again, scheduler
+
+    db, swept_again, scheduler = asyncio.run(scenario())
+    assert db.war['status'] == WarStatus.PREPARATION.value
+    assert swept_again == 0 and scheduler.has_job('gang_wars.war_1')
+    print("  ✅ Guerre reprise par le leader, pas de reprogrammation en double")
+
+
+def test_war_history_and_active_index():
+    """Historique en une requête OR paginée ; index mémoire pour l'affichage, base pour la déclaration"""
+    print("🔍 Test de l'historique paginé et de l'index des guerres...")
+    war = {'war_id': 'war_2', 'attacker_gang_id': 'g1', 'defender_gang_id': 'g2', 'status': 'active'}
+    db = _recording_database([war])
+
+    db.get_gang_war_history('g1', limit=10, before=('2026-01-02T10:00:00', 'war_9'))
+    (query,) = db.supabase.executed
+    condition = next(call[1] for call in query if call[0] == 'or')
+    assert condition.count('attacker_gang_id.eq.g1') == 1 and condition.count('defender_gang_id.eq.g1') == 1
+    assert 'declared_at.lt."2026-01-02T10:00:00"' in condition and 'war_id.lt."war_9"' in condition
+    assert ('order', ('declared_at',), {'desc': True}) in query and ('limit', 10) in query
+
+    db.supabase.executed.clear()
+    assert db.gang_in_active_war('g1') and db.gang_in_active_war('g2') and not db.gang_in_active_war('g3')
+    assert len(db.supabase.executed) == 1
+
+    db.update_war('war_2', status='finished')
+    assert not db.gang_in_active_war('g1')
+    db.create_war({**war, 'war_id': 'war_3', 'defender_gang_id': 'g4', 'status': 'declared'})
+    assert db.gang_in_active_war('g4')
+    assert len(db.supabase.executed) == 3  # une lecture + les deux écritures
+    assert db.supabase.executed[-1][0][:2] == ('rpc', 'create_war_exclusive')
+
+    # Déclaration : vérification directe en base, une requête pour les deux gangs
+    db.supabase.executed.clear()
+    assert db.gangs_in_active_war(['g1', 'g5'])
+    (query,) = db.supabase.executed
+    condition = next(call[1] for call in query if call[0] == 'or')
+    assert condition == "attacker_gang_id.in.(g1,g5),defender_gang_id.in.(g1,g5)"
+    print("  ✅ 1 requête d'historique, 3 vérifications servies par 1 lecture, déclaration vérifiée en base")
+
+
+if __name__ == "__main__":
+    test_batch_war_powers()
+    test_running_totals()
+    test_war_phase_timers()
+    test_sweep_picks_up_wars_from_other_replicas()
+    test_war_history_and_active_index()
+    print("\n✅ Tous les tests des guerres de gangs sont passés")
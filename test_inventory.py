@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests des inventaires par quantité
+Vérifie qu'un don groupé coûte un seul appel, que les retraits sont tout-ou-rien
+et que la vérification de possession est servie par le cache
+"""
+
+from types import SimpleNamespace
+
+from database_supabase import SupabaseDatabase
+
+
+class FakeInventoryClient:
+    """Tables inventory_items et admin_actions en mémoire, fonctions RPC comprises"""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append(name)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=getattr(self, name)(**params)))
+
+    def add_inventory_items(self, p_grants):
+        for grant in p_grants:
+            key = (grant['user_id'], grant['item_id'])
+            self.rows[key] = self.rows.get(key, 0) + grant['quantity']
+
+    def remove_inventory_item(self, p_user_id, p_item_id, p_quantity, p_partial):
+        current = self.rows.get((p_user_id, p_item_id), 0)
+        if not current or (not p_partial and current < p_quantity):
+            return 0
+        removed = min(current, p_quantity)
+        self.rows[(p_user_id, p_item_id)] = current - removed
+        return removed
+
+    def table(self, name):
+        client = self
+        filters = {}
+
+        class Query:
+            def select(self, *_):
+                return self
+
+            def insert(self, *_):
+                return self
+
+            def eq(self, column, value):
+                filters[column] = value
+                return self
+
+            def execute(self):
+                client.calls.append(name)
+                rows = [{'item_id': item, 'quantity': qty} for (uid, item), qty in client.rows.items()
+                        if uid == filters.get('user_id')]
+                return SimpleNamespace(data=rows)
+
+        return Query()
+
+
+def _database():
+    db = SupabaseDatabase.__new__(SupabaseDatabase)
+    db.supabase = FakeInventoryClient()
+    db.last_connection_attempt = None
+    db._cache, db._cache_expiry = {}, {}
+    return db
+
+
+def test_bulk_grant_is_one_call():
+    """100 objets donnés par un admin : un appel RPC (plus le journal admin)"""
+    print("🔍 Test du don groupé...")
+    db = _database()
+    assert db.admin_add_item("admin", "u1", "bouclier", 100, "event")
+    assert db.supabase.calls == ["add_inventory_items", "admin_actions"]
+    assert db.get_inventory_counts("u1") == {"bouclier": 100}
+
+    db.supabase.calls.clear()
+    assert db.grant_items([{'user_id': f"u{i}", 'item_id': "potion", 'quantity': 2} for i in range(50)])
+    assert db.supabase.calls == ["add_inventory_items"]
+    print("  ✅ 100 objets en 1 appel, 50 inventaires en 1 appel")
+
+
+def test_atomic_remove_and_membership():
+    """Retrait tout-ou-rien, retrait partiel admin et possession en O(1) depuis le cache"""
+    print("🔍 Test des retraits et de la possession...")
+    db = _database()
+    db.add_item("u1", "clé", 3)
+    assert not db.remove_item("u1", "clé", 5) and db.has_item("u1", "clé", 3)
+    assert db.remove_item("u1", "clé", 2) and db.get_inventory("u1") == ["clé"]
+    assert db.admin_remove_item("admin", "u1", "clé", 10) == (True, 1)
+    assert not db.has_item("u1", "clé")
+
+    db.supabase.calls.clear()
+    db.add_item("u2", "dé", 1)
+    assert all(db.has_item("u2", "dé") for _ in range(100))
+    assert db.supabase.calls == ["add_inventory_items", "inventory_items"]
+    print("  ✅ Aucun retrait partiel involontaire, 100 vérifications pour 1 lecture")
+
+
+if __name__ == "__main__":
+    test_bulk_grant_is_one_call()
+    test_atomic_remove_and_membership()
+    print("\n✅ Tous les tests des inventaires sont passés")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests du planificateur de tâches
+Vérifie la persistance des échéances, le rattrapage, l'absence de chevauchement et les tâches ponctuelles
+"""
+
+import asyncio
+import time
+
+from job_scheduler import JobScheduler, LocalTask
+
+
+class FakeStateDatabase:
+    """bot_state en mémoire"""
+    def __init__(self):
+        self.state = {}
+
+    def load_bot_state(self, key):
+        return self.state.get(key)
+
+    def save_bot_state(self, key, data):
+        self.state[key] = data
+
+
+def test_next_run_survives_restart():
+    """Une échéance persistée est reprise après redémarrage, et rattrapée si elle est passée"""
+    print("🔍 Test de la persistance des échéances...")
+    db = FakeStateDatabase()
+    runs = []
+
+    async def job():
+        runs.append(time.time())
+
+    async def first_session():
+        scheduler = JobScheduler(db)
+        scheduler.register('daily', job, 86400)
+        await scheduler.start()
+        await scheduler.stop()
+
+    asyncio.run(first_session())
+    saved = db.state['job_scheduler']['jobs']['daily']['next_run']
+    assert saved > time.time() + 86000 and runs == []
+
+    # Simuler un redémarrage après l'échéance
+    db.state['job_scheduler']['jobs']['daily']['next_run'] = time.time() - 10
+
+    async def second_session():
+        scheduler = JobScheduler(db)
+        scheduler.register('daily', job, 86400)
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        status = scheduler.get_status()['daily']
+        await scheduler.stop()
+        return status
+
+    status = asyncio.run(second_session())
+    assert len(runs) == 1 and status['runs'] == 1
+    assert db.state['job_scheduler']['jobs']['daily']['next_run'] > time.time() + 86000
+    print("  ✅ Échéance reprise puis rattrapée au redémarrage")
+
+
+def test_no_overlapping_runs():
+    """Une tâche encore en cours n'est pas relancée à l'échéance suivante"""
+    print("🔍 Test de l'absence de chevauchement...")
+    active = 0
+    max_active = 0
+
+    async def slow_job():
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.12)
+        active -= 1
+
+    async def scenario():
+        scheduler = JobScheduler()
+        scheduler.register('slow', slow_job, 0.03, first_run=time.time())
+        await scheduler.start()
+        await asyncio.sleep(0.3)
+        status = scheduler.get_status()['slow']
+        await scheduler.stop()
+        return status
+
+    status = asyncio.run(scenario())
+    assert max_active == 1
+    assert status['skipped_overlaps'] > 0 and status['runs'] >= 2
+    assert status['max_duration_ms'] >= 100
+    print(f"  ✅ {status['runs']} exécutions, {status['skipped_overlaps']} échéances ignorées")
+
+
+def test_one_shot_jobs_fire_in_order():
+    """Les tâches ponctuelles s'exécutent une fois, dans l'ordre de leurs échéances"""
+    print("🔍 Test des tâches ponctuelles...")
+    order = []
+
+    async def fire(label):
+        order.append(label)
+
+    async def scenario():
+        scheduler = JobScheduler()
+        await scheduler.start()
+        now = time.time()
+        scheduler.schedule_at('release:b', now + 0.06, fire, 'b')
+        scheduler.schedule_at('release:a', now + 0.02, fire, 'a')
+        scheduler.schedule_at('release:c', now + 0.04, fire, 'c')
+        scheduler.cancel('release:c')
+        await asyncio.sleep(0.15)
+        remaining = dict(scheduler.jobs)
+        await scheduler.stop()
+        return remaining
+
+    remaining = asyncio.run(scenario())
+    assert order == ['a', 'b']
+    assert remaining == {}
+    print("  ✅ Ordre respecté, tâche annulée ignorée")
+
+
+def test_local_task_finishes_current_run_on_stop():
+    """Boucle locale : exécutée à chaque intervalle, l'écriture en cours n'est pas interrompue à l'arrêt"""
+    print("🔍 Test de la tâche locale...")
+    done = []
+
+    async def flush():
+        await asyncio.sleep(0.05)
+        done.append(time.time())
+
+    async def scenario():
+        task = LocalTask('flush', flush, 0.02)
+        task.start()
+        await asyncio.sleep(0.1)
+        await task.stop()
+        return task
+
+    task = asyncio.run(scenario())
+    assert len(done) >= 1 and len(done) == task.run_count and not task.running
+    print("  ✅ Exécutions menées à terme, boucle arrêtée")
+
+
+if __name__ == "__main__":
+    test_next_run_survives_restart()
+    test_no_overlapping_runs()
+    test_one_shot_jobs_fire_in_order()
+    test_local_task_finishes_current_run_on_stop()
+    print("\n✅ Tous les tests du planificateur sont passés")
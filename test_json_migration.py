@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests de la migration en flux de data.json
+Vérifie la lecture incrémentale, les lots bornés et la reprise après une interruption
+"""
+
+import io
+import json
+import os
+import tempfile
+
+from json_migrator import JsonMigrator, JsonStreamReader
+
+
+DATA = {
+    "users": {str(i): {"points": i * 10, "history": [1, 2, 3]} for i in range(1234)},
+    "version": 3,
+    "rob_cooldowns": {"1": 1700000000.5, "2": 12345},
+    "unknown_section": {"a": {"b": [1, {"c": "}"}]}},
+    "inventories": {"1": ["épée", "épée", "bouclier"], "2": []},
+    "daily_commands": {},
+}
+
+
+class FakeMigrationDatabase:
+    def __init__(self, fail_on_call=None):
+        self.state = {}
+        self.tables = {}
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def load_bot_state(self, key):
+        return json.loads(json.dumps(self.state[key])) if key in self.state else None
+
+    def save_bot_state(self, key, data):
+        self.state[key] = json.loads(json.dumps(data))
+        return True
+
+    def upsert_rows(self, table, rows):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            return False
+        assert len(rows) <= 100
+        for row in rows:
+            key = (row['user_id'], row.get('cooldown_type') or row.get('item_id'))
+            self.tables.setdefault(table, {})[key] = row
+        return True
+
+
+def test_stream_reader():
+    """Les entrées sont relues à l'identique même découpées en blocs de 7 caractères"""
+    print("🔍 Test de la lecture incrémentale...")
+    reader = JsonStreamReader(io.StringIO(json.dumps(DATA, ensure_ascii=False, indent=1)), chunk_size=7)
+    parsed = {}
+    for section, entries in reader.sections():
+        if section == "unknown_section":
+            continue  # Section abandonnée sans être consommée
+        parsed[section] = dict(entries)
+    assert parsed["users"] == DATA["users"] and parsed["rob_cooldowns"] == DATA["rob_cooldowns"]
+    assert parsed["inventories"] == DATA["inventories"] and parsed["version"] == {} and parsed["daily_commands"] == {}
+    print(f"  ✅ {len(parsed)} sections relues")
+
+
+def test_chunked_resumable_migration():
+    """Lots de 100 lignes en parallèle ; une écriture échouée est reprise sans tout recommencer"""
+    print("🔍 Test de la migration reprenable...")
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(DATA, f, ensure_ascii=False)
+    try:
+        db = FakeMigrationDatabase(fail_on_call=7)
+        first = JsonMigrator(db, f.name, batch_size=100, parallelism=4).run()
+        assert not first['completed'] and not first['sections']['users']['ok']
+        assert db.state['json_migration']['sections']['users']['entries'] == 400
+
+        calls_before = db.calls
+        second = JsonMigrator(db, f.name, batch_size=100, parallelism=4).run()
+        assert second['completed'] and second['sections']['users']['skipped'] == 400
+        assert db.calls - calls_before == 9 + 1 + 1  # 834 utilisateurs restants, cooldowns, inventaires
+        assert len(db.tables['users']) == 1234 and db.tables['users'][('7', None)]['points'] == 70
+        assert db.tables['inventory_items'][('1', 'épée')]['quantity'] == 2
+        assert db.tables['user_cooldowns'][('1', 'rob_cooldowns')]['cooldown_until'] == 1700000000.5
+        assert JsonMigrator(db, f.name).run()['resumed']
+
+        dry = FakeMigrationDatabase()
+        report = JsonMigrator(dry, f.name, dry_run=True).run()
+        assert report['completed'] and report['sections']['users']['rows'] == 1234 and not dry.calls and not dry.state
+    finally:
+        os.unlink(f.name)
+    print(f"  ✅ Reprise à l'entrée 400, {second['sections']['users']['rows_per_second']} lignes/s")
+
+
+if __name__ == "__main__":
+    test_stream_reader()
+    test_chunked_resumable_migration()
+    print("\n✅ Tous les tests de la migration sont passés")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Tests de l'élection de leader
+Deux processus locaux se disputent un bail stocké dans SQLite (substitut de bot_state)
+"""
+
+import asyncio
+import json
+import multiprocessing
+import queue
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from types import SimpleNamespace
+
+from database_supabase import SupabaseDatabase
+from job_scheduler import JobScheduler
+from leader_election import LeaderLease
+
+
+class SqliteLeaseDatabase:
+    """Substitut SQLite de bot_state avec les mêmes sémantiques que try_acquire_lease / release_lease"""
+    def __init__(self, path):
+        self.path = str(path)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def try_acquire_lease(self, key, holder, ttl_seconds):
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            current = json.loads(row[0]) if row else None
+            if current and current['holder'] != holder and current['expires_at'] >= now:
+                conn.execute("COMMIT")
+                return False
+            value = json.dumps({'holder': holder, 'expires_at': now + ttl_seconds})
+            conn.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, value))
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def release_lease(self, key, holder):
+        with sqlite3.connect(self.path, timeout=5) as conn:
+            row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+            if row and json.loads(row[0])['holder'] == holder:
+                conn.execute("UPDATE bot_state SET value = ? WHERE key = ?",
+                             (json.dumps({'holder': holder, 'expires_at': 0}), key))
+
+
+class MemoryStateDatabase:
+    """bot_state en mémoire partagé par plusieurs instances d'un même processus"""
+    def __init__(self):
+        self.state = {}
+
+    def try_acquire_lease(self, key, holder, ttl_seconds):
+        current = self.state.get(key)
+        if current and current['holder'] != holder and current['expires_at'] >= time.time():
+            return False
+        self.state[key] = {'holder': holder, 'expires_at': time.time() + ttl_seconds}
+        return True
+
+    def release_lease(self, key, holder):
+        if self.state.get(key, {}).get('holder') == holder:
+            self.state[key]['expires_at'] = 0
+
+    def load_bot_state(self, key):
+        return self.state.get(key)
+
+    def save_bot_state(self, key, data):
+        self.state[key] = data
+
+
+def _run_replica(db_path, name, events):
+    """Processus réplica : signale chaque élection puis tourne jusqu'à être tué"""
+    async def main():
+        async def elected():
+            events.put((name, time.time()))
+
+        lease = LeaderLease(SqliteLeaseDatabase(db_path), ttl=1.0, heartbeat_interval=0.2,
+                            holder_id=name, on_elected=elected)
+        await lease.start()
+        while True:
+            await asyncio.sleep(1)
+
+    asyncio.run(main())
+
+
+def test_two_processes_single_leader_and_failover():
+    """Un seul processus est leader ; l'autre prend le relais en quelques secondes quand il meurt"""
+    print("🔍 Test de bascule entre deux processus...")
+    ctx = multiprocessing.get_context('spawn')
+    events = ctx.Queue()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'state.db'
+        SqliteLeaseDatabase(db_path)
+        first = ctx.Process(target=_run_replica, args=(db_path, 'replica-a', events), daemon=True)
+        second = ctx.Process(target=_run_replica, args=(db_path, 'replica-b', events), daemon=True)
+        try:
+            first.start()
+            assert events.get(timeout=20)[0] == 'replica-a'
+            second.start()
+            try:
+                unexpected = events.get(timeout=3)
+            except queue.Empty:
+                unexpected = None
+            assert unexpected is None, f"deux leaders simultanés : {unexpected}"
+
+            # Crash brutal : pas de libération du bail, la reprise passe par l'expiration
+            killed_at = time.time()
+            first.kill()
+            leader, elected_at = events.get(timeout=10)
+            failover = elected_at - killed_at
+        finally:
+            for proc in (first, second):
+                if proc.is_alive():
+                    proc.kill()
+                proc.join(timeout=5)
+
+    assert leader == 'replica-b'
+    assert failover < 2.5
+    print(f"  ✅ replica-b élu {failover:.2f}s après la mort de replica-a")
+
+
+def test_release_hands_over_on_next_heartbeat():
+    """Un arrêt propre libère le bail : la reprise n'attend pas l'expiration"""
+    print("🔍 Test de libération du bail...")
+
+    async def scenario():
+        db = MemoryStateDatabase()
+        first = LeaderLease(db, ttl=30, heartbeat_interval=0.05, holder_id='a')
+        second = LeaderLease(db, ttl=30, heartbeat_interval=0.05, holder_id='b')
+        await first.start()
+        await second.start()
+        assert first.is_leader and not second.is_leader
+        await first.stop()
+        await asyncio.sleep(0.15)
+        leader = second.is_leader
+        await second.stop()
+        return leader
+
+    assert asyncio.run(scenario())
+    print("  ✅ Reprise immédiate après libération")
+
+
+def test_only_leader_runs_scheduled_jobs():
+    """Deux instances enregistrent la même tâche, seule celle du leader s'exécute"""
+    print("🔍 Test des tâches réservées au leader...")
+    runs = []
+
+    async def scenario():
+        db = MemoryStateDatabase()
+        instances = []
+        for name in ('a', 'b'):
+            scheduler = JobScheduler(db)
+
+            async def job(name=name):
+                runs.append(name)
+
+            scheduler.register('territory_income', job, 0.05, first_run=time.time())
+            lease = LeaderLease(db, ttl=5, heartbeat_interval=0.05, holder_id=name,
+                                on_elected=scheduler.start,
+                                on_demoted=lambda s=scheduler: s.stop(persist=False))
+            await lease.start()
+            instances.append((lease, scheduler))
+        await asyncio.sleep(0.3)
+        for lease, scheduler in instances:
+            await scheduler.stop()
+            await lease.stop()
+
+    asyncio.run(scenario())
+    assert runs and set(runs) == {'a'}
+    print(f"  ✅ {len(runs)} exécutions, toutes sur le leader")
+
+
+def test_transient_error_keeps_lease():
+    """Une erreur réseau ponctuelle ne fait pas perdre le bail avant son expiration locale"""
+    print("🔍 Test d'une coupure réseau passagère...")
+
+    def failing_rpc(*args, **kwargs):
+        raise ConnectionError("network blip")
+
+    db = SupabaseDatabase.__new__(SupabaseDatabase)
+    db.supabase = SimpleNamespace(rpc=failing_rpc)
+    db.last_connection_attempt = None
+    assert db.try_acquire_lease('scheduler_leader', 'a', 15) is None
+
+    async def scenario():
+        state = MemoryStateDatabase()
+        demoted = []
+
+        async def on_demoted():
+            demoted.append(time.time())
+
+        lease = LeaderLease(state, ttl=5, heartbeat_interval=0.05, holder_id='a', on_demoted=on_demoted)
+        await lease.start()
+        state.try_acquire_lease = lambda *args: db.try_acquire_lease(*args)
+        await asyncio.sleep(0.2)
+        still_leader, demoted_during_blip = lease.is_leader, list(demoted)
+        await lease.stop()
+        return still_leader, demoted_during_blip
+
+    still_leader, demoted = asyncio.run(scenario())
+    assert still_leader and not demoted
+    print("  ✅ Bail conservé pendant la coupure")
+
+
+if __name__ == "__main__":
+    test_two_processes_single_leader_and_failover()
+    test_release_hands_over_on_next_heartbeat()
+    test_only_leader_runs_scheduled_jobs()
+    test_transient_error_keeps_lease()
+    print("\n✅ Tous les tests d'élection de leader sont passés")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests des points d'activité des messages
+Vérifie l'anti-spam, le plafond par minute et l'écriture groupée des points accumulés
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from message_activity import MessageActivityTracker
+
+
+class FakeActivityDatabase:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def award_points_bulk(self, awards):
+        if self.fail:
+            return False
+        self.calls.append({a['user_id']: a['amount'] for a in awards})
+        return True
+
+
+def _message(user_id, content, bot=False, guild=True):
+    return SimpleNamespace(author=SimpleNamespace(id=user_id, bot=bot), content=content,
+                           guild=SimpleNamespace(id=1) if guild else None)
+
+
+def test_anti_spam_and_caps():
+    """Délai min, doublons, commandes, DM et plafond par minute"""
+    print("🔍 Test de l'anti-spam des messages...")
+    tracker = MessageActivityTracker(FakeActivityDatabase(), points_per_message=2, min_interval=10, max_messages_per_minute=3)
+
+    assert tracker.on_message(_message(1, "salut tout le monde"), now=0)
+    assert not tracker.on_message(_message(1, "encore moi"), now=5)            # trop rapproché
+    assert not tracker.on_message(_message(1, "salut tout le monde"), now=15)  # doublon
+    assert tracker.on_message(_message(1, "autre chose"), now=20)
+    assert tracker.on_message(_message(1, "troisième"), now=30)
+    assert not tracker.on_message(_message(1, "quatrième"), now=45)           # plafond de la minute
+    assert tracker.on_message(_message(1, "nouvelle minute"), now=61)
+    assert not tracker.on_message(_message(2, "!daily"), now=0)
+    assert not tracker.on_message(_message(3, "bip boup", bot=True), now=0)
+    assert not tracker.on_message(_message(4, "en privé", guild=False), now=0)
+    assert not tracker.on_message(_message(5, "ok"), now=0)
+    assert tracker.pending_points(1) == 8
+    print(f"  ✅ {tracker.stats['counted']} messages comptés, {tracker.stats['ignored']} ignorés")
+
+
+def test_bulk_flush():
+    """1000 utilisateurs : une seule écriture ; un échec conserve les points pour la suivante"""
+    print("🔍 Test de l'écriture groupée...")
+    db = FakeActivityDatabase(fail=True)
+    tracker = MessageActivityTracker(db, points_per_message=2)
+    for user_id in range(1000):
+        tracker.on_message(_message(user_id, f"message {user_id}"), now=0)
+
+    assert asyncio.run(tracker.flush(now=1)) == 0 and tracker.pending_points(7) == 2
+    db.fail = False
+    tracker.on_message(_message(7, "deuxième message"), now=20)
+    assert asyncio.run(tracker.flush(now=21)) == 1000
+    (awards,) = db.calls
+    assert len(awards) == 1000 and awards["7"] == 4 and awards["8"] == 2
+    assert asyncio.run(tracker.flush(now=200)) == 0 and not tracker._windows
+    print("  ✅ 1000 utilisateurs crédités en 1 écriture")
+
+
+if __name__ == "__main__":
+    test_anti_spam_and_caps()
+    test_bulk_flush()
+    print("\n✅ Tous les tests des points de messages sont passés")
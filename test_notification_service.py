@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests du service de notifications
+Vérifie la diffusion à concurrence bornée, le cache des salons, les doublons et le débit global
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import nextcord as discord
+
+from notification_service import NotificationService
+
+
+class FakeChannel:
+    def __init__(self, channel_id, name, tracker, can_send=True):
+        self.id = channel_id
+        self.name = name
+        self.tracker = tracker
+        self.can_send = can_send
+
+    def permissions_for(self, member):
+        return SimpleNamespace(send_messages=self.can_send)
+
+    async def send(self, embed=None):
+        self.tracker['active'] += 1
+        self.tracker['peak'] = max(self.tracker['peak'], self.tracker['active'])
+        await asyncio.sleep(0.02)  # latence d'un appel HTTP
+        self.tracker['active'] -= 1
+        self.tracker['sent'].append(self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, tracker):
+        self.id = guild_id
+        self.me = object()
+        self.scans = 0
+        self._channels = [
+            FakeChannel(guild_id * 10 + 1, "general", tracker),
+            FakeChannel(guild_id * 10 + 2, "gang-events", tracker, can_send=guild_id % 2 == 0),
+        ]
+
+    @property
+    def text_channels(self):
+        self.scans += 1
+        return self._channels
+
+    def get_channel(self, channel_id):
+        return next(c for c in self._channels if c.id == channel_id)
+
+
+def _tracker():
+    return {'active': 0, 'peak': 0, 'sent': []}
+
+
+def test_broadcast_is_bounded_and_fast():
+    """500 serveurs servis en parallèle borné, salons résolus une seule fois"""
+    print("🔍 Test de la diffusion globale...")
+
+    async def scenario():
+        tracker = _tracker()
+        bot = SimpleNamespace(guilds=[FakeGuild(i, tracker) for i in range(500)])
+        service = NotificationService(bot, max_concurrency=20, global_rate=0, dedup_window=0)
+        await service.start()
+        started = time.perf_counter()
+        queued = service.broadcast(discord.Embed(title="🚨 Raid de Police", description="3 gangs"))
+        await service.join()
+        elapsed = time.perf_counter() - started
+        service.broadcast(discord.Embed(title="💰 Trésor", description="Docks"))
+        await service.join()
+        await service.stop()
+        return bot, tracker, queued, elapsed, service.get_stats()
+
+    bot, tracker, queued, elapsed, stats = asyncio.run(scenario())
+    assert queued == 500 and stats['sent'] == 1000
+    assert tracker['peak'] <= 20
+    assert elapsed < 2  # ~10s si les envois étaient séquentiels
+    assert all(guild.scans == 1 for guild in bot.guilds)
+    # gang-events quand il est accessible en écriture, sinon general
+    assert 22 in tracker['sent'] and 11 in tracker['sent'] and 12 not in tracker['sent']
+    assert stats['max_latency_ms'] > 0 and stats['p95_latency_ms'] <= stats['max_latency_ms']
+    print(f"  ✅ 500 serveurs en {elapsed:.2f}s, {tracker['peak']} envois simultanés max, "
+          f"p95 {stats['p95_latency_ms']}ms")
+
+
+def test_duplicates_and_global_rate():
+    """Les DM identiques sont fusionnés et le débit global est respecté"""
+    print("🔍 Test des doublons et du débit global...")
+
+    async def scenario():
+        tracker = _tracker()
+        users = {i: FakeChannel(i, f"user{i}", tracker) for i in range(25)}
+        bot = SimpleNamespace(guilds=[], get_user=users.get)
+        service = NotificationService(bot, max_concurrency=10, global_rate=50)
+        await service.start()
+        embed = discord.Embed(title="💰 Bonus Quotidien", description="1,000 points")
+        started = time.perf_counter()
+        first = service.notify_users(users, embed)
+        again = service.notify_users([str(i) for i in users], discord.Embed(title=embed.title, description=embed.description))
+        await service.join()
+        elapsed = time.perf_counter() - started
+        await service.stop()
+        return tracker, first, again, elapsed, service.get_stats()
+
+    tracker, first, again, elapsed, stats = asyncio.run(scenario())
+    assert first == 25 and again == 0
+    assert stats['duplicates'] == 25 and len(tracker['sent']) == 25
+    assert elapsed >= 24 / 50  # 25 requêtes à 50/s
+    print(f"  ✅ 25 doublons ignorés, 25 DM en {elapsed:.2f}s sous 50 req/s")
+
+
+if __name__ == "__main__":
+    test_broadcast_is_bounded_and_fast()
+    test_duplicates_and_global_rate()
+    print("\n✅ Tous les tests du service de notifications sont passés")
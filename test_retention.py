@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests de la rétention des tables
+Vérifie la purge par lots bornés, le cumul quotidien des journaux et le rapport des lignes récupérées
+"""
+
+import asyncio
+from datetime import datetime
+
+from retention import RetentionManager
+
+
+class FakeRetentionDatabase:
+    """Nombre de lignes expirées par table ; chaque appel en supprime au plus un lot"""
+
+    def __init__(self, expired):
+        self.expired = dict(expired)
+        self.calls = []
+
+    def _take(self, table, batch_size):
+        deleted = min(batch_size, self.expired.get(table, 0))
+        self.expired[table] = self.expired.get(table, 0) - deleted
+        return deleted
+
+    def purge_old_rows(self, table, column, cutoff, batch_size):
+        self.calls.append(('purge', table, column, cutoff))
+        return None if table == "broken" else self._take(table, batch_size)
+
+    def rollup_ledger_rows(self, table, cutoff, batch_size):
+        self.calls.append(('rollup', table, cutoff))
+        return self._take(table, batch_size)
+
+
+POLICIES = {
+    "command_usage": {"column": "date", "days": 30, "date_only": True},
+    "point_transactions": {"column": "timestamp", "days": 90, "rollup": True},
+    "admin_actions": {"column": "performed_at", "days": 90},
+    "broken": {"column": "created_at", "days": 1},
+}
+
+
+def test_batched_purge_and_report():
+    """Lots de 100 lignes, plafond de lots par passage, reprise au passage suivant"""
+    print("🔍 Test de la purge par lots...")
+    db = FakeRetentionDatabase({"command_usage": 250, "point_transactions": 1000, "admin_actions": 0})
+    retention = RetentionManager(db, POLICIES, batch_size=100, max_batches=5, pause=0)
+    now = datetime(2026, 3, 31, 12, 0)
+
+    report = asyncio.run(retention.run_once(now))
+    assert report == {"command_usage": 250, "point_transactions": 500, "admin_actions": 0, "broken": 0}
+    assert ('purge', 'command_usage', 'date', '2026-03-01') in db.calls
+    assert ('rollup', 'point_transactions', '2025-12-31T12:00:00') in db.calls
+    assert sum(1 for call in db.calls if call[1] == "point_transactions") == 5
+
+    assert asyncio.run(retention.run_once(now))["point_transactions"] == 500
+    assert db.expired["point_transactions"] == 0 and retention.last_report["command_usage"] == 0
+    print(f"  ✅ {sum(report.values())} lignes récupérées au premier passage, reste au suivant")
+
+
+if __name__ == "__main__":
+    test_batched_purge_and_report()
+    print("\n✅ Tous les tests de rétention sont passés")
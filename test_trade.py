@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests des échanges d'objets
+Vérifie la table des échanges en attente et l'échange atomique en un seul appel
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from commands import Commands
+from trade_sessions import TradeBook, AWAITING_CONFIRM
+
+
+class FakeTradeDatabase:
+    def __init__(self):
+        self.items = {"a": {"épée": 1}, "b": {"bouclier": 1}}
+        self.swaps = 0
+
+    def has_item(self, user_id, item, quantity=1):
+        return self.items.get(user_id, {}).get(item, 0) >= quantity
+
+    def get_inventory_counts(self, user_id):
+        return dict(self.items.get(user_id, {}))
+
+    def swap_items(self, user_a, item_a, user_b, item_b):
+        self.swaps += 1
+        if not (self.has_item(user_a, item_a) and self.has_item(user_b, item_b)):
+            return False
+        for user, item, delta in ((user_a, item_a, -1), (user_b, item_b, -1), (user_b, item_a, 1), (user_a, item_b, 1)):
+            self.items[user][item] = self.items[user].get(item, 0) + delta
+        return True
+
+
+class FakeChannel:
+    id = 5
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **_):
+        self.sent.append(content)
+
+
+def _message(author_id, content, channel):
+    return SimpleNamespace(author=SimpleNamespace(id=author_id, bot=False, display_name=author_id),
+                           content=content, channel=channel)
+
+
+def test_trade_book():
+    """Un seul échange par joueur, réponse attendue du bon joueur dans le bon salon, expiration"""
+    print("🔍 Test de la table des échanges...")
+    book = TradeBook(offer_timeout=60, confirm_timeout=30)
+    session = book.open("a", "b", 5, "épée", now=0)
+    assert book.open("b", "c", 5, "dé", now=1) is None
+    assert book.pending_for("b", 5, now=1) is session and book.pending_for("b", 6, now=1) is None
+    assert book.pending_for("a", 5, now=1) is None
+
+    book.offer(session, "bouclier", now=10)
+    assert session.state == AWAITING_CONFIRM and book.pending_for("a", 5, now=11) is session
+    assert book.pending_for("a", 5, now=41) is None and len(book) == 0
+    assert book.open("b", "c", 5, "bouclier", now=42) is not None
+    print("  ✅ Échanges indexés par joueur attendu, expiration appliquée")
+
+
+def test_trade_close_cancels_timer():
+    """Fermer un échange annule sa minuterie d'expiration"""
+    print("🔍 Test de l'annulation de la minuterie...")
+    book = TradeBook()
+    session = book.open("a", "b", 5, "épée", now=0)
+    fired = []
+
+    async def scenario():
+        session.timer = asyncio.get_running_loop().call_later(0.01, lambda: fired.append(True))
+        book.close(session)
+        await asyncio.sleep(0.03)
+
+    asyncio.run(scenario())
+    assert not fired and session.timer is None
+    print("  ✅ Minuterie annulée à la fermeture")
+
+
+def test_trade_flow_single_swap():
+    """Proposition, contre-offre puis acceptation : un seul appel d'échange atomique"""
+    print("🔍 Test du déroulé d'un échange...")
+    db = FakeTradeDatabase()
+    cog = Commands(SimpleNamespace(command_prefix='!'), SimpleNamespace(db=db), None)
+    channel = FakeChannel()
+
+    async def scenario():
+        ctx = SimpleNamespace(author=SimpleNamespace(id="a", display_name="A"), channel=channel, send=channel.send)
+        member = SimpleNamespace(id="b", mention="@b")
+        await cog.trade.callback(cog, ctx, member, "épée")
+        await cog.on_trade_message(_message("a", "oui", channel))   # pas encore son tour
+        await cog.on_trade_message(_message("b", "bouclier", channel))
+        await cog.on_trade_message(_message("a", "oui", channel))
+
+    asyncio.run(scenario())
+    assert db.swaps == 1 and db.items == {"a": {"épée": 0, "bouclier": 1}, "b": {"bouclier": 0, "épée": 1}}
+    assert channel.sent[-1].startswith("Échange réussi") and len(cog.trades) == 0
+    print(f"  ✅ Échange conclu en {db.swaps} appel")
+
+
+if __name__ == "__main__":
+    test_trade_book()
+    test_trade_close_cancels_timer()
+    test_trade_flow_single_swap()
+    print("\n✅ Tous les tests des échanges sont passés")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests de l'ingestion de l'engagement Twitter
+Vérifie le regroupement des recherches, le diff par watermarks et l'écriture groupée
+"""
+
+import asyncio
+
+from config import POINTS_TWITTER_LIKE, POINTS_TWITTER_RT, POINTS_TWITTER_COMMENT
+from twitter_engagement import TwitterEngagementIngestor, build_search_queries, compute_engagement
+
+
+def _tweet(tweet_id, author, likes=0, retweets=0, replies=0, created_at='2026-01-02T00:00:00+00:00'):
+    return {
+        'id': tweet_id,
+        'author_username': author,
+        'created_at': created_at,
+        'public_metrics': {'like_count': likes, 'retweet_count': retweets, 'reply_count': replies}
+    }
+
+
+class FakeDatabase:
+    def __init__(self, links):
+        self.links = links
+        self.watermarks = {}
+        self.writes = []
+        self.state = {}
+
+    def load_bot_state(self, key):
+        return self.state.get(key)
+
+    def save_bot_state(self, key, data):
+        self.state[key] = data
+        return True
+
+    def get_twitter_links(self):
+        return self.links
+
+    def get_tweet_watermarks(self, tweet_ids):
+        return {tweet_id: self.watermarks[tweet_id] for tweet_id in tweet_ids if tweet_id in self.watermarks}
+
+    def apply_twitter_engagement(self, awards, watermarks):
+        self.writes.append((awards, watermarks))
+        for mark in watermarks:
+            self.watermarks[mark['tweet_id']] = mark
+        return True
+
+
+class FakeTwitter:
+    def __init__(self, tweets, tokens=None):
+        self.tweets = tweets
+        self.queries = []
+        # Requêtes acceptées par cycle (None = illimité), comme un bucket d'une requête par fenêtre
+        self.tokens = tokens
+
+    def is_available(self):
+        return True
+
+    async def search_recent_tweets(self, query, start_time=None, max_pages=1):
+        if self.tokens is not None:
+            if not self.tokens:
+                return False, []
+            self.tokens -= 1
+        self.queries.append(query)
+        return True, [t for t in self.tweets if f"from:{t['author_username'].lower()}" in query]
+
+
+def test_queries_are_packed():
+    """Les comptes sont regroupés dans des requêtes de 512 caractères maximum"""
+    print("🔍 Test du regroupement des recherches...")
+    handles = [f"account_{i:04d}" for i in range(200)]
+    queries = build_search_queries(handles)
+    assert all(len(q) <= 512 for q in queries)
+    assert sum(q.count('from:') for q in queries) == 200
+    assert len(queries) < 10
+    print(f"  ✅ 200 comptes couverts par {len(queries)} requêtes")
+
+
+def test_only_new_engagement_is_rewarded():
+    """Seul l'écart avec le watermark rapporte, et un watermark ne recule jamais"""
+    print("🔍 Test du diff par watermarks...")
+    owners = {'alice': '1', 'bob': '2'}
+    tweets = [_tweet('t1', 'Alice', likes=10, retweets=2), _tweet('t2', 'bob', likes=3), _tweet('t3', 'bob', replies=1)]
+    watermarks = {
+        't1': {'like_count': 8, 'retweet_count': 2, 'reply_count': 0},
+        't2': {'like_count': 5, 'retweet_count': 0, 'reply_count': 0},
+    }
+    awards, marks = compute_engagement(tweets, watermarks, owners)
+
+    by_user = {a['user_id']: a['amount'] for a in awards}
+    assert by_user == {'1': 2 * POINTS_TWITTER_LIKE, '2': POINTS_TWITTER_COMMENT}
+    assert {m['tweet_id'] for m in marks} == {'t1', 't3'}
+    print(f"  ✅ {len(awards)} récompenses, {len(marks)} watermarks avancés")
+
+
+def test_tweets_before_link_only_set_baseline():
+    """Un tweet antérieur à la liaison sert de référence sans rapporter de points"""
+    print("🔍 Test des tweets antérieurs à la liaison...")
+    awards, marks = compute_engagement(
+        [_tweet('old', 'alice', likes=50, created_at='2026-01-01T00:00:00+00:00')],
+        {}, {'alice': '1'}, {'1': '2026-01-05T00:00:00+00:00'}
+    )
+    assert awards == []
+    assert marks[0]['like_count'] == 50
+    print("  ✅ Référence enregistrée sans points")
+
+
+def test_ingestion_cycle_is_incremental():
+    """Un cycle fait une écriture groupée, le suivant ne récompense que la nouveauté"""
+    print("🔍 Test d'un cycle d'ingestion complet...")
+    db = FakeDatabase([{'user_id': str(i), 'twitter_handle': f"user{i}", 'linked_at': None} for i in range(50)])
+    twitter = FakeTwitter([_tweet(f"t{i}", f"user{i}", likes=1, retweets=1) for i in range(50)])
+    ingestor = TwitterEngagementIngestor(db, twitter)
+
+    first = asyncio.run(ingestor.run_once())
+    assert len(db.writes) == 1 and first['awards'] == 50
+    assert first['points'] == 50 * (POINTS_TWITTER_LIKE + POINTS_TWITTER_RT)
+
+    twitter.tweets[0]['public_metrics']['like_count'] = 4
+    second = asyncio.run(ingestor.run_once())
+    assert len(db.writes) == 2
+    assert second['awards'] == 1 and second['points'] == 3 * POINTS_TWITTER_LIKE
+    assert second['watermarks'] == 1
+
+    third = asyncio.run(ingestor.run_once())
+    assert len(db.writes) == 2 and third['points'] == 0
+    print(f"  ✅ {first['queries']} requête(s) par cycle, écritures proportionnelles à l'engagement")
+
+
+def test_queries_rotate_across_cycles():
+    """Une seule recherche acceptée par cycle : chaque cycle reprend à la requête suivante"""
+    print("🔍 Test de la rotation des recherches...")
+    db = FakeDatabase([{'user_id': str(i), 'twitter_handle': f"account_{i:04d}", 'linked_at': None} for i in range(200)])
+    twitter = FakeTwitter([_tweet(f"t{i}", f"account_{i:04d}", likes=1) for i in range(200)])
+    ingestor = TwitterEngagementIngestor(db, twitter)
+    queries = build_search_queries([link['twitter_handle'] for link in db.links])
+
+    rewarded = set()
+    for _ in range(len(queries)):
+        twitter.tokens = 1
+        stats = asyncio.run(ingestor.run_once())
+        assert stats['queries'] == 1
+        rewarded.update(award['user_id'] for award in db.writes[-1][0])
+    assert twitter.queries == queries and len(rewarded) == 200
+    assert db.state['twitter_engagement_cursor'] == {'next_query': 0}
+    print(f"  ✅ {len(queries)} requêtes couvertes en {len(queries)} cycles, tous les comptes récompensés")
+
+
+if __name__ == "__main__":
+    test_queries_are_packed()
+    test_only_new_engagement_is_rewarded()
+    test_tweets_before_link_only_set_baseline()
+    test_ingestion_cycle_is_incremental()
+    test_queries_rotate_across_cycles()
+    print("\n✅ Tous les tests d'ingestion Twitter sont passés")
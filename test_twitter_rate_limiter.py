@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Tests du rate limiter Twitter
+Vérifie le regroupement GET_USERS, les seaux de jetons et le cache sans appeler l'API réelle
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from twitter_rate_limiter import (
+    TwitterRateLimiter, TwitterResponseCache, TokenBucket, APIEndpoint,
+    MAX_USERS_PER_LOOKUP, PRIORITY_HIGH, PRIORITY_LOW
+)
+
+
+def _fake_get_users(calls):
+    """Simule client.get_users : retourne les comptes connus parmi les noms demandés"""
+    def get_users(usernames):
+        calls.append(list(usernames))
+        known = [u for u in usernames if not u.startswith('ghost')]
+        return [{'id': str(i), 'username': u.upper()} for i, u in enumerate(known)]
+    return get_users
+
+
+def test_lookups_are_batched():
+    """Des recherches simultanées partagent un seul appel GET_USERS"""
+    print("🔍 Test du regroupement GET_USERS...")
+
+    async def scenario():
+        limiter = TwitterRateLimiter()
+        await limiter.start()
+        calls = []
+        fetch = _fake_get_users(calls)
+        try:
+            names = [f"user{i}" for i in range(10)] + ["ghost", "user0"]
+            return calls, await asyncio.gather(*(limiter.lookup_user(n, fetch) for n in names))
+        finally:
+            await limiter.stop()
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(calls[0]) == sorted({f"user{i}" for i in range(10)} | {"ghost"})
+    assert all(success for success, _ in results)
+    assert results[0][1]['username'] == "USER0" and results[-1][1]['username'] == "USER0"
+    assert results[10][1] is None
+    print(f"  ✅ 12 recherches servies par 1 appel ({len(calls[0])} noms)")
+
+
+def test_batch_is_capped():
+    """Un lot ne dépasse jamais MAX_USERS_PER_LOOKUP noms"""
+    print("🔍 Test de la limite de 100 noms par lot...")
+
+    async def scenario():
+        limiter = TwitterRateLimiter()
+        calls = []
+        fetch = _fake_get_users(calls)
+        tasks = [asyncio.create_task(limiter.lookup_user(f"user{i}", fetch)) for i in range(MAX_USERS_PER_LOOKUP + 5)]
+        await asyncio.sleep(0)
+        queued = sorted(limiter.queues[APIEndpoint.GET_USERS])
+        sizes = [len(item['batch']['usernames']) for _, _, item in queued]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return sizes
+
+    sizes = asyncio.run(scenario())
+    assert sizes == [MAX_USERS_PER_LOOKUP, 5]
+    print(f"  ✅ Lots de tailles {sizes}")
+
+
+def test_bucket_follows_headers():
+    """Les en-têtes x-rate-limit-* remplacent les limites codées en dur"""
+    print("🔍 Test du recalage sur les en-têtes...")
+    limiter = TwitterRateLimiter()
+    reset = time.time() + 42
+    response = SimpleNamespace(
+        url="https://api.twitter.com/2/users/by?usernames=a,b",
+        headers={'x-rate-limit-limit': '300', 'x-rate-limit-remaining': '0', 'x-rate-limit-reset': str(reset)}
+    )
+    limiter.observe_response(response)
+
+    bucket = limiter.limits[APIEndpoint.GET_USERS]
+    assert bucket.requests_per_window == 300
+    assert not bucket.available(time.time())
+    assert 40 < bucket.wait_time(time.time()) <= 42
+    assert bucket.available(reset) and bucket.tokens == 300
+    assert limiter.limits[APIEndpoint.GET_ME].tokens == 1
+    print("  ✅ Seau GET_USERS recalé (300 req, reset dans 42s)")
+
+
+def test_throttled_endpoint_does_not_block_others():
+    """Un endpoint sans jetons n'empêche pas les autres d'être servis, par ordre de priorité"""
+    print("🔍 Test des queues par endpoint...")
+
+    async def scenario():
+        limiter = TwitterRateLimiter()
+        limiter.limits[APIEndpoint.GET_USERS] = TokenBucket(tokens=0, reset_time=time.time() + 900)
+        limiter.limits[APIEndpoint.GET_USER_TWEETS] = TokenBucket(requests_per_window=5)
+        await limiter.start()
+        order = []
+        try:
+            blocked = asyncio.create_task(limiter.make_request(APIEndpoint.GET_USERS, lambda: 'users'))
+            low = limiter.make_request(APIEndpoint.GET_USER_TWEETS, lambda: order.append('low') or 'low', priority=PRIORITY_LOW)
+            high = limiter.make_request(APIEndpoint.GET_USER_TWEETS, lambda: order.append('high') or 'high', priority=PRIORITY_HIGH)
+            results = await asyncio.wait_for(asyncio.gather(low, high), timeout=2)
+            assert not blocked.done()
+            blocked.cancel()
+            return order, results
+        finally:
+            await limiter.stop()
+
+    order, results = asyncio.run(scenario())
+    assert results == [(True, 'low'), (True, 'high')]
+    assert order == ['high', 'low']
+    print("  ✅ GET_USER_TWEETS servi pendant que GET_USERS attend, priorité respectée")
+
+
+def test_blocking_calls_run_off_the_loop():
+    """Un appel tweepy lent ne bloque pas l'event loop et respecte le timeout"""
+    print("🔍 Test de l'exécution hors event loop...")
+
+    async def scenario():
+        limiter = TwitterRateLimiter(max_workers=2, request_timeout=0.2)
+        limiter.limits[APIEndpoint.GET_USER_TWEETS] = TokenBucket(requests_per_window=5)
+        await limiter.start()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        try:
+            slow = await limiter.make_request(APIEndpoint.GET_USER_TWEETS, time.sleep, 0.5)
+            fast = await limiter.make_request(APIEndpoint.GET_USER_TWEETS, lambda: 'ok')
+        finally:
+            ticking.cancel()
+            await limiter.stop()
+        return ticks, slow, fast, limiter.get_status()['endpoints'][APIEndpoint.GET_USER_TWEETS.value]
+
+    ticks, slow, fast, status = asyncio.run(scenario())
+    assert slow == (False, "Timeout de la requête Twitter")
+    assert fast == (True, 'ok')
+    assert ticks >= 10
+    assert status['timeouts'] == 1 and status['max_latency_ms'] >= 200
+    print(f"  ✅ Event loop actif pendant l'appel ({ticks} ticks), timeout appliqué")
+
+
+def test_identical_requests_are_deduplicated():
+    """Des requêtes identiques simultanées partagent un appel, puis le cache répond"""
+    print("🔍 Test de la déduplication des requêtes...")
+
+    async def scenario():
+        limiter = TwitterRateLimiter()
+        limiter.limits[APIEndpoint.GET_USER_TWEETS] = TokenBucket(requests_per_window=5)
+        await limiter.start()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return [{'id': '1', 'text': 'gm'}]
+
+        try:
+            params = {'id': '42', 'max_results': 5}
+            results = await asyncio.gather(*(
+                limiter.make_request(APIEndpoint.GET_USER_TWEETS, fetch, cache_params=params) for _ in range(5)
+            ))
+            cached = await limiter.make_request(APIEndpoint.GET_USER_TWEETS, fetch, cache_params=dict(reversed(params.items())))
+            return calls, results, cached, limiter.get_status()
+        finally:
+            await limiter.stop()
+
+    calls, results, cached, status = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == (True, [{'id': '1', 'text': 'gm'}]) for result in results)
+    assert cached == results[0]
+    assert status['cache_hits'] == 1 and not status['pending_requests']
+    print("  ✅ 6 demandes servies par 1 appel API")
+
+
+def test_cache_is_bounded_and_expires():
+    """Le cache évince les entrées les moins récentes et respecte le TTL par endpoint"""
+    print("🔍 Test des limites du cache...")
+    cache = TwitterResponseCache(max_entries=3, ttl={'get_users': 60, 'get_me': -1})
+    keys = [cache.make_key(APIEndpoint.GET_USERS, {'username': f'user{i}'}) for i in range(4)]
+    for key in keys[:3]:
+        cache.set(APIEndpoint.GET_USERS, key, {'id': key})
+    cache.get(keys[0])
+    cache.set(APIEndpoint.GET_USERS, keys[3], None)
+
+    assert len(cache) == 3
+    assert keys[1] not in cache._entries  # le moins récemment utilisé est évincé
+    assert cache.get(keys[0]) == {'id': keys[0]}
+    assert cache.get(keys[3]) is None  # compte introuvable mis en cache
+    me_key = cache.make_key(APIEndpoint.GET_ME, {})
+    cache.set(APIEndpoint.GET_ME, me_key, {'id': 'me'})
+    cache.get(me_key)
+    assert me_key not in cache._entries
+    print("  ✅ Éviction LRU et expiration par endpoint")
+
+
+def test_cache_survives_restart():
+    """Le cache est sauvegardé à l'arrêt et rechargé au démarrage suivant"""
+    print("🔍 Test de la persistance du cache...")
+
+    async def run_once(path, calls):
+        limiter = TwitterRateLimiter(cache_file=str(path))
+        await limiter.start()
+        try:
+            return await limiter.lookup_user('alice', _fake_get_users(calls))
+        finally:
+            await limiter.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'twitter_cache.json'
+        calls = []
+        first = asyncio.run(run_once(path, calls))
+        assert path.exists()
+        second = asyncio.run(run_once(path, calls))
+
+    assert len(calls) == 1
+    assert first == second == (True, {'id': '0', 'username': 'ALICE'})
+    print("  ✅ Réponse servie depuis le cache après redémarrage")
+
+
+if __name__ == "__main__":
+    test_lookups_are_batched()
+    test_batch_is_capped()
+    test_bucket_follows_headers()
+    test_throttled_endpoint_does_not_block_others()
+    test_blocking_calls_run_off_the_loop()
+    test_identical_requests_are_deduplicated()
+    test_cache_is_bounded_and_expires()
+    test_cache_survives_restart()
+    print("\n✅ Tous les tests du rate limiter sont passés")
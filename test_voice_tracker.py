@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests du suivi des sessions vocales
+Vérifie le crédit par minute en une écriture, les changements d'état (salon, micro, AFK)
+et la reconstruction des sessions depuis l'état vocal des serveurs
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from voice_tracker import VoiceTracker
+
+
+class FakeVoiceDatabase:
+    def __init__(self, saved=None):
+        self.award_calls = []
+        self.checkpoints = []
+        self.saved = saved or []
+
+    def award_points_bulk(self, awards):
+        self.award_calls.append({a['user_id']: a['amount'] for a in awards})
+        return True
+
+    def checkpoint_voice_sessions(self, sessions, guild_ids):
+        self.checkpoints.append(sessions)
+        self.checkpoint_guilds = guild_ids
+        return True
+
+    def get_voice_sessions(self):
+        return self.saved
+
+
+AFK = SimpleNamespace(id=99)
+
+
+def _member(user_id, bot=False):
+    guild = SimpleNamespace(id=1, afk_channel=AFK)
+    return SimpleNamespace(id=user_id, bot=bot, guild=guild)
+
+
+def _state(channel_id=None, self_mute=False):
+    channel = SimpleNamespace(id=channel_id) if channel_id else None
+    return SimpleNamespace(channel=channel, afk=False, self_mute=self_mute, mute=False, self_deaf=False, deaf=False)
+
+
+def test_minute_accrual_is_batched():
+    """100 membres en vocal : un tick, une écriture ; muet, AFK et départ pris en compte"""
+    print("🔍 Test du crédit vocal groupé...")
+    db = FakeVoiceDatabase()
+    tracker = VoiceTracker(db, points_per_minute=1, min_session_minutes=0, max_points_per_session=120)
+    for user_id in range(100):
+        tracker.on_voice_state_update(_member(user_id), _state(), _state(10), now=0)
+    tracker.on_voice_state_update(_member(500, bot=True), _state(), _state(10), now=0)
+
+    # 0 : micro coupé après 1 min ; 1 : part dans le salon AFK ; 2 : change de salon ; 3 : quitte après 90 s
+    tracker.on_voice_state_update(_member(0), _state(10), _state(10, self_mute=True), now=60)
+    tracker.on_voice_state_update(_member(1), _state(10), _state(AFK.id), now=30)
+    tracker.on_voice_state_update(_member(2), _state(10), _state(11), now=30)
+    tracker.on_voice_state_update(_member(3), _state(10), _state(), now=90)
+
+    assert asyncio.run(tracker.tick(now=180)) == 99
+    (awards,) = db.award_calls
+    assert awards["0"] == 1 and "1" not in awards and awards["2"] == 3 and awards["3"] == 1 and awards["50"] == 3
+    assert "500" not in awards and len(tracker.sessions) == 99
+
+    # Plafond par session
+    assert asyncio.run(tracker.tick(now=180 + 3600 * 3)) == 97
+    assert db.award_calls[1]["50"] == 117 and tracker.sessions["50"].points_awarded == 120
+    print("  ✅ 99 membres crédités en 1 écriture, plafond de 120 points respecté")
+
+
+def test_reconcile_from_voice_states():
+    """Au démarrage : lignes obsolètes ignorées, membres en vocal repris avec leurs points déjà attribués"""
+    print("🔍 Test de la reconstruction des sessions...")
+    db = FakeVoiceDatabase(saved=[
+        {'user_id': '7', 'start_time': 1000.0, 'pending_seconds': 30.0, 'points_awarded': 40},
+        {'user_id': '8', 'start_time': 1000.0, 'pending_seconds': 0.0, 'points_awarded': 10},
+    ])
+    members = {7: _member(7), 9: _member(9), 10: _member(10, bot=True)}
+    channel = SimpleNamespace(id=10, voice_states={7: _state(10), 9: _state(10, self_mute=True), 10: _state(10)})
+    guild = SimpleNamespace(id=1, voice_channels=[channel], stage_channels=[], get_member=members.get)
+    tracker = VoiceTracker(db)
+
+    assert asyncio.run(tracker.reconcile([guild], now=5000)) == 2
+    assert tracker.sessions["7"].started_at == 1000.0 and tracker.sessions["7"].points_awarded == 40
+    assert not tracker.sessions["9"].active and "8" not in tracker.sessions
+    assert sorted(row['user_id'] for row in db.checkpoints[-1]) == ["7", "9"]
+
+    asyncio.run(tracker.tick(now=5030))
+    assert db.award_calls == [{"7": 2}]
+    assert db.checkpoint_guilds == ["1"]
+    print("  ✅ 2 sessions reprises, ligne obsolète abandonnée")
+
+
+def test_minimum_session_length():
+    """Moins de 5 minutes actives : rien ; au-delà, toutes les minutes sont créditées à 2 points"""
+    print("🔍 Test de la durée minimale de session...")
+    db = FakeVoiceDatabase()
+    tracker = VoiceTracker(db)
+    tracker.on_voice_state_update(_member(1), _state(), _state(10), now=0)
+    tracker.on_voice_state_update(_member(2), _state(), _state(10), now=0)
+    tracker.on_voice_state_update(_member(1), _state(10), _state(), now=240)
+
+    assert asyncio.run(tracker.tick(now=240)) == 0
+    assert asyncio.run(tracker.tick(now=300)) == 1
+    assert db.award_calls == [{"2": 10}]
+    asyncio.run(tracker.tick(now=360))
+    assert db.award_calls[-1] == {"2": 2}
+    print("  ✅ Session de 4 min ignorée, 5 min créditées 10 points puis 2 par minute")
+
+
+if __name__ == "__main__":
+    test_minute_accrual_is_batched()
+    test_reconcile_from_voice_states()
+    test_minimum_session_length()
+    print("\n✅ Tous les tests du suivi vocal sont passés")
@@ -0,0 +1,94 @@
+"""
+Échanges d'objets en cours
+Table mémoire des échanges en attente, indexée par le joueur dont on attend la réponse :
+un seul écouteur de messages retrouve l'échange concerné par simple recherche, au lieu
+d'un prédicat wait_for évalué sur chaque message pour chaque échange ouvert
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# Étapes d'un échange
+AWAITING_OFFER = "awaiting_offer"      # la cible doit proposer un objet
+AWAITING_CONFIRM = "awaiting_confirm"  # l'initiateur doit accepter ou refuser
+
+@dataclass
+class TradeSession:
+    """Échange proposé par `author_id` à `target_id`"""
+    author_id: str
+    target_id: str
+    channel_id: int
+    author_item: str
+    expires_at: float
+    state: str = AWAITING_OFFER
+    target_item: Optional[str] = None
+    # Minuterie d'expiration de l'étape en cours, annulée à la fermeture
+    timer: Optional[asyncio.TimerHandle] = field(default=None, repr=False, compare=False)
+
+    @property
+    def responder_id(self) -> str:
+        """Joueur dont on attend le prochain message"""
+        return self.target_id if self.state == AWAITING_OFFER else self.author_id
+
+class TradeBook:
+    """Échanges en attente ; un joueur ne participe qu'à un échange à la fois"""
+
+    def __init__(self, offer_timeout: float = 60, confirm_timeout: float = 30):
+        self.offer_timeout = offer_timeout
+        self.confirm_timeout = confirm_timeout
+        self._by_responder: Dict[str, TradeSession] = {}
+        self._by_player: Dict[str, TradeSession] = {}
+
+    def is_busy(self, user_id: str, now: Optional[float] = None) -> bool:
+        session = self._by_player.get(user_id)
+        if session is not None and session.expires_at <= (time.time() if now is None else now):
+            self.close(session)
+            return False
+        return session is not None
+
+    def open(self, author_id: str, target_id: str, channel_id: int, item_id: str,
+             now: Optional[float] = None) -> Optional[TradeSession]:
+        """Ouvrir un échange ; None si l'un des deux joueurs a déjà un échange en cours"""
+        now = time.time() if now is None else now
+        if self.is_busy(author_id, now) or self.is_busy(target_id, now):
+            return None
+        session = TradeSession(author_id, target_id, channel_id, item_id, expires_at=now + self.offer_timeout)
+        self._by_responder[target_id] = session
+        self._by_player[author_id] = self._by_player[target_id] = session
+        return session
+
+    def pending_for(self, user_id: str, channel_id: int, now: Optional[float] = None) -> Optional[TradeSession]:
+        """Échange attendant un message de ce joueur dans ce salon"""
+        session = self._by_responder.get(user_id)
+        if session is None or session.channel_id != channel_id:
+            return None
+        if session.expires_at <= (time.time() if now is None else now):
+            self.close(session)
+            return None
+        return session
+
+    def offer(self, session: TradeSession, item_id: str, now: Optional[float] = None):
+        """La cible a proposé son objet : la main passe à l'initiateur"""
+        del self._by_responder[session.target_id]
+        session.target_item = item_id
+        session.state = AWAITING_CONFIRM
+        session.expires_at = (time.time() if now is None else now) + self.confirm_timeout
+        self._by_responder[session.author_id] = session
+
+    def close(self, session: TradeSession):
+        if session.timer is not None:
+            session.timer.cancel()
+            session.timer = None
+        if self._by_responder.get(session.responder_id) is session:
+            del self._by_responder[session.responder_id]
+        for user_id in (session.author_id, session.target_id):
+            if self._by_player.get(user_id) is session:
+                del self._by_player[user_id]
+
+    def is_open(self, session: TradeSession) -> bool:
+        return self._by_responder.get(session.responder_id) is session
+
+    def __len__(self) -> int:
+        return len(self._by_responder)
@@ -0,0 +1,218 @@
+"""
+Ingestion de l'engagement Twitter
+Récupère les tweets récents des comptes liés par recherches groupées, compare leurs
+métriques aux watermarks stockés et crédite les points en une seule écriture
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config import POINTS_TWITTER_LIKE, POINTS_TWITTER_RT, POINTS_TWITTER_COMMENT, TWITTER_ENGAGEMENT_CONFIG
+
+logger = logging.getLogger('EngagementBot')
+
+# Clé bot_state de la requête par laquelle reprendre au prochain cycle
+CURSOR_STATE_KEY = 'twitter_engagement_cursor'
+
+# Métrique publique -> points par nouvelle interaction
+METRIC_POINTS = {
+    'like_count': POINTS_TWITTER_LIKE,
+    'retweet_count': POINTS_TWITTER_RT,
+    'reply_count': POINTS_TWITTER_COMMENT,
+}
+
+def build_search_queries(handles: List[str], max_length: int = 512) -> List[str]:
+    """Regrouper les comptes dans le moins de requêtes "from:a OR from:b" possible"""
+    suffix = " -is:retweet"
+    queries = []
+    terms: List[str] = []
+    for handle in sorted({h.lower().lstrip('@') for h in handles if h}):
+        term = f"from:{handle}"
+        candidate = "(" + " OR ".join(terms + [term]) + ")" + suffix
+        if terms and len(candidate) > max_length:
+            queries.append("(" + " OR ".join(terms) + ")" + suffix)
+            terms = [term]
+        else:
+            terms.append(term)
+    if terms:
+        queries.append("(" + " OR ".join(terms) + ")" + suffix)
+    return queries
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    # Les dates sans fuseau (datetime.now() côté bot) sont en heure locale
+    return parsed if parsed.tzinfo else parsed.astimezone()
+
+def compute_engagement(tweets: List[Dict], watermarks: Dict[str, Dict], owners: Dict[str, str],
+                       linked_at: Optional[Dict[str, str]] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Calculer les points gagnés depuis les derniers watermarks
+
+    Args:
+        tweets: Tweets récents (id, author_username, created_at, public_metrics)
+        watermarks: tweet_id -> métriques déjà récompensées
+        owners: nom Twitter (minuscules) -> user_id Discord
+        linked_at: user_id -> date de liaison ; les tweets antérieurs servent de référence sans rapporter
+
+    Returns:
+        (awards: une ligne par utilisateur, watermarks: tweets dont les métriques ont avancé)
+    """
+    linked_at = linked_at or {}
+    gains: Dict[str, Dict[str, int]] = {}
+    new_watermarks = []
+
+    for tweet in tweets:
+        user_id = owners.get((tweet.get('author_username') or '').lower())
+        if user_id is None:
+            continue
+
+        metrics = tweet.get('public_metrics') or {}
+        current = {metric: int(metrics.get(metric) or 0) for metric in METRIC_POINTS}
+        previous = watermarks.get(tweet['id'])
+
+        if previous is None:
+            created_at = _parse_time(tweet.get('created_at'))
+            linked = _parse_time(linked_at.get(user_id))
+            if created_at and linked and created_at < linked:
+                # Tweet publié avant la liaison : on enregistre la référence sans points
+                new_watermarks.append({'tweet_id': tweet['id'], 'user_id': user_id, **current})
+                continue
+            previous = {}
+
+        gained = {metric: max(0, current[metric] - int(previous.get(metric) or 0)) for metric in METRIC_POINTS}
+        if not any(gained.values()):
+            continue
+
+        # Le watermark ne recule jamais : retirer puis remettre un like ne rapporte qu'une fois
+        new_watermarks.append({
+            'tweet_id': tweet['id'],
+            'user_id': user_id,
+            **{metric: max(current[metric], int(previous.get(metric) or 0)) for metric in METRIC_POINTS}
+        })
+        user_gains = gains.setdefault(user_id, dict.fromkeys(METRIC_POINTS, 0))
+        for metric, count in gained.items():
+            user_gains[metric] += count
+
+    awards = []
+    for user_id, user_gains in gains.items():
+        amount = sum(count * METRIC_POINTS[metric] for metric, count in user_gains.items())
+        if amount <= 0:
+            continue
+        awards.append({
+            'user_id': user_id,
+            'amount': amount,
+            'reason': (f"Twitter engagement ({user_gains['like_count']} likes, "
+                       f"{user_gains['retweet_count']} RT, {user_gains['reply_count']} réponses)")
+        })
+
+    return awards, new_watermarks
+
+class TwitterEngagementIngestor:
+    """Étape d'ingestion planifiée : quelques recherches, un diff en mémoire, une écriture groupée"""
+
+    def __init__(self, database, twitter_handler, interval: float = 900, lookback_hours: float = 48,
+                 max_query_length: int = 512, max_pages: int = 1):
+        self.db = database
+        self.twitter_handler = twitter_handler
+        self.interval = interval
+        self.lookback_hours = lookback_hours
+        self.max_query_length = max_query_length
+        self.max_pages = max_pages
+        self.last_run: Dict = {}
+
+    async def run_once(self) -> Dict:
+        """Exécuter un cycle d'ingestion et retourner ses statistiques"""
+        started = time.perf_counter()
+        stats = {'linked_accounts': 0, 'queries': 0, 'tweets': 0, 'awards': 0, 'points': 0, 'watermarks': 0}
+
+        if not self.twitter_handler.is_available():
+            return stats
+
+        links = await asyncio.to_thread(self.db.get_twitter_links)
+        owners = {link['twitter_handle'].lower().lstrip('@'): link['user_id'] for link in links if link.get('twitter_handle')}
+        stats['linked_accounts'] = len(owners)
+        if not owners:
+            return stats
+
+        queries = build_search_queries(list(owners), self.max_query_length)
+        start_time = datetime.now(timezone.utc) - timedelta(hours=self.lookback_hours)
+        tweets, cursor = await self._run_queries(queries, start_time, stats)
+        stats['tweets'] = len(tweets)
+        if not tweets:
+            await self._save_cursor(cursor)
+            return stats
+
+        watermarks = await asyncio.to_thread(self.db.get_tweet_watermarks, list(tweets))
+        linked_at = {link['user_id']: link.get('linked_at') for link in links}
+        awards, new_watermarks = compute_engagement(list(tweets.values()), watermarks, owners, linked_at)
+
+        if awards or new_watermarks:
+            applied = await asyncio.to_thread(self.db.apply_twitter_engagement, awards, new_watermarks)
+            if not applied:
+                # Les watermarks n'ont pas avancé : le prochain cycle retentera les mêmes écarts
+                logger.warning("Twitter engagement batch not applied, will retry next cycle")
+                return stats
+        await self._save_cursor(cursor)
+
+        stats.update(
+            awards=len(awards),
+            points=sum(award['amount'] for award in awards),
+            watermarks=len(new_watermarks),
+            duration_ms=round((time.perf_counter() - started) * 1000)
+        )
+        self.last_run = stats
+        logger.info(
+            f"Twitter engagement: {stats['tweets']} tweets via {stats['queries']} queries, "
+            f"{stats['points']} points to {stats['awards']} users"
+        )
+        return stats
+
+    async def _run_queries(self, queries: List[str], start_time: datetime, stats: Dict) -> Tuple[Dict[str, Dict], int]:
+        """
+        Exécuter les recherches l'une après l'autre, à partir du curseur persisté
+
+        Le bucket SEARCH_TWEETS ne sert qu'une requête par fenêtre : on s'arrête au premier
+        refus et le cycle suivant reprend à cette requête, pour que chaque groupe de comptes
+        passe à son tour au lieu de toujours laisser les derniers de côté.
+
+        Returns:
+            (tweets par id, indice de la requête du prochain cycle)
+        """
+        state = await asyncio.to_thread(self.db.load_bot_state, CURSOR_STATE_KEY) or {}
+        start = int(state.get('next_query') or 0) % len(queries)
+        tweets = {}
+        cursor = start
+        for offset in range(len(queries)):
+            index = (start + offset) % len(queries)
+            success, batch = await self.twitter_handler.search_recent_tweets(
+                queries[index], start_time=start_time, max_pages=self.max_pages)
+            if not success:
+                break
+            stats['queries'] += 1
+            for tweet in batch:
+                tweets[tweet['id']] = tweet
+            cursor = (index + 1) % len(queries)
+        return tweets, cursor
+
+    async def _save_cursor(self, cursor: int):
+        """Avancer le curseur une fois les tweets récupérés traités"""
+        await asyncio.to_thread(self.db.save_bot_state, CURSOR_STATE_KEY, {'next_query': cursor})
+
+async def setup_twitter_engagement(bot, database, twitter_handler) -> TwitterEngagementIngestor:
+    """Configurer l'ingestion de l'engagement Twitter sur le planificateur du bot"""
+    ingestor = TwitterEngagementIngestor(database, twitter_handler, **TWITTER_ENGAGEMENT_CONFIG)
+    bot.scheduler.register('twitter_engagement', ingestor.run_once, ingestor.interval)
+    bot.twitter_engagement = ingestor
+    logger.info(f"Twitter engagement ingestion scheduled every {ingestor.interval}s")
+    return ingestor
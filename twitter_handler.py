@@ -2,12 +2,13 @@ import tweepy
 import logging
 import asyncio
 from datetime import datetime
+from typing import Optional
 from config import (
     TWITTER_API_KEY, TWITTER_API_SECRET, 
     TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_SECRET, 
-    TWITTER_BEARER_TOKEN, TWITTER_CONFIGURED
+    TWITTER_BEARER_TOKEN, TWITTER_CONFIGURED, TWITTER_API_CONFIG
 )
-from twitter_rate_limiter import TwitterRateLimiter, APIEndpoint
+from twitter_rate_limiter import TwitterRateLimiter, APIEndpoint, PRIORITY_LOW
 from tweepy.errors import TooManyRequests, Unauthorized, Forbidden
 
 logger = logging.getLogger('EngagementBot')
@@ -15,9 +16,10 @@ logger = logging.getLogger('EngagementBot')
 class TwitterHandler:
     """Gestionnaire Twitter avec rate limiting pour plan gratuit"""
     
-    def __init__(self):
+    def __init__(self, database=None):
         self.client = None
-        self.rate_limiter = TwitterRateLimiter()
+        # Le cache des réponses est persisté dans bot_state si la base est disponible
+        self.rate_limiter = TwitterRateLimiter(database=database, **TWITTER_API_CONFIG)
         self._initialize_client()
     
     def _initialize_client(self):
@@ -36,6 +38,9 @@ class TwitterHandler:
                 wait_on_rate_limit=False  # On gère nous-mêmes le rate limiting
             )
             
+            # Les en-têtes x-rate-limit-* de chaque réponse alimentent les seaux du rate limiter
+            self.client.session.hooks['response'].append(self.rate_limiter.observe_response)
+            
             logger.info("Twitter client initialized")
             
         except Exception as e:
@@ -78,28 +83,33 @@ class TwitterHandler:
             if not username:
                 return False, "Nom d'utilisateur invalide"
             
-            # Faire la requête avec rate limiting
-            def make_request():
-                return self.client.get_users(
-                    usernames=[username],
+            # Recherche groupée : jusqu'à 100 noms par appel GET_USERS
+            def make_request(usernames):
+                response = self.client.get_users(
+                    usernames=usernames,
                     user_fields=['id', 'username', 'name', 'public_metrics']
                 )
+                return [
+                    {
+                        'id': str(user.id),
+                        'username': user.username,
+                        'name': user.name,
+                        'public_metrics': user.public_metrics or {}
+                    }
+                    for user in (response.data or [])
+                ]
             
-            success, response = await self.rate_limiter.make_request(
-                APIEndpoint.GET_USERS,
-                make_request
-            )
+            success, user = await self.rate_limiter.lookup_user(username, make_request)
             
             if not success:
-                return False, str(response)
+                return False, str(user)
             
-            if response.data:
-                user = response.data[0]
+            if user is not None:
                 return True, {
-                    'id': user.id,
-                    'username': user.username,
-                    'name': user.name,
-                    'followers_count': user.public_metrics.get('followers_count', 0),
+                    'id': user['id'],
+                    'username': user['username'],
+                    'name': user['name'],
+                    'followers_count': user['public_metrics'].get('followers_count', 0),
                     'verified_at': datetime.now().isoformat()
                 }
             else:
@@ -130,38 +140,104 @@ class TwitterHandler:
             return False, []
         
         try:
+            max_results = min(max_results, 10)  # Limiter pour le plan gratuit
+            
             def make_request():
-                return self.client.get_users_tweets(
+                response = self.client.get_users_tweets(
                     id=user_id,
-                    max_results=min(max_results, 10),  # Limiter pour le plan gratuit
+                    max_results=max_results,
                     tweet_fields=['created_at', 'public_metrics']
                 )
+                return [
+                    {
+                        'id': str(tweet.id),
+                        'text': tweet.text,
+                        'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
+                        'public_metrics': tweet.public_metrics or {}
+                    }
+                    for tweet in (response.data or [])
+                ]
             
-            success, response = await self.rate_limiter.make_request(
+            success, tweets = await self.rate_limiter.make_request(
                 APIEndpoint.GET_USER_TWEETS,
-                make_request
+                make_request,
+                cache_params={'id': str(user_id), 'max_results': max_results}
             )
             
             if not success:
                 return False, []
             
-            if response.data:
-                tweets = []
-                for tweet in response.data:
-                    tweets.append({
-                        'id': tweet.id,
-                        'text': tweet.text,
-                        'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
-                        'public_metrics': tweet.public_metrics or {}
-                    })
-                return True, tweets
-            else:
-                return True, []
+            return True, tweets
                 
         except Exception as e:
             logger.error(f"Error getting user tweets: {e}", exc_info=True)
             return False, []
     
+    async def search_recent_tweets(self, query: str, start_time: Optional[datetime] = None,
+                                   max_pages: int = 1) -> tuple[bool, list]:
+        """
+        Rechercher les tweets récents correspondant à une requête (ex: "from:a OR from:b")
+        
+        Un seul appel SEARCH_TWEETS couvre jusqu'à 100 tweets de plusieurs comptes à la fois.
+        
+        Args:
+            query: Requête de recherche Twitter (512 caractères max)
+            start_time: Ignorer les tweets plus anciens
+            max_pages: Nombre maximum de pages de 100 tweets
+            
+        Returns:
+            (success: bool, tweets: list) avec 'author_username' pour chaque tweet
+        """
+        if not self.is_available():
+            return False, []
+        
+        try:
+            def fetch_page(next_token):
+                response = self.client.search_recent_tweets(
+                    query=query,
+                    max_results=100,
+                    start_time=start_time,
+                    next_token=next_token,
+                    tweet_fields=['created_at', 'public_metrics', 'author_id'],
+                    expansions=['author_id'],
+                    user_fields=['username']
+                )
+                authors = {str(user.id): user.username for user in (response.includes or {}).get('users', [])}
+                tweets = [
+                    {
+                        'id': str(tweet.id),
+                        'author_id': str(tweet.author_id),
+                        'author_username': authors.get(str(tweet.author_id)),
+                        'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
+                        'public_metrics': tweet.public_metrics or {}
+                    }
+                    for tweet in (response.data or [])
+                ]
+                return tweets, (response.meta or {}).get('next_token')
+            
+            # Un jeton du limiteur par page : chaque page est une requête SEARCH_TWEETS
+            # Pas de cache : on veut les métriques à jour
+            tweets = []
+            next_token = None
+            for page in range(max_pages):
+                success, result = await self.rate_limiter.make_request(
+                    APIEndpoint.SEARCH_TWEETS,
+                    lambda token=next_token: fetch_page(token),
+                    priority=PRIORITY_LOW
+                )
+                if not success:
+                    # Les pages déjà lues restent valables
+                    return (True, tweets) if page else (False, [])
+                page_tweets, next_token = result
+                tweets.extend(page_tweets)
+                if not next_token:
+                    break
+            return True, tweets
+            
+        except Exception as e:
+            logger.error(f"Error searching recent tweets: {e}", exc_info=True)
+            return False, []
+    
     async def health_check(self) -> tuple[bool, str]:
         """Vérifier l'état de santé de la connexion Twitter"""
         if not self.is_available():
@@ -169,11 +245,14 @@ class TwitterHandler:
         
         try:
             def make_request():
-                return self.client.get_me()
+                response = self.client.get_me()
+                return {'id': str(response.data.id), 'username': response.data.username} if response.data else None
             
             success, response = await self.rate_limiter.make_request(
                 APIEndpoint.GET_ME,
-                make_request
+                make_request,
+                priority=PRIORITY_LOW,
+                cache_params={}
             )
             
             if success and response:
@@ -1,13 +1,32 @@
 import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import json
+import os
+import re
 import time
 import logging
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Callable, Any
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Any
 from dataclasses import dataclass
 from enum import Enum
+from urllib.parse import urlparse
+
+from tweepy.errors import TooManyRequests
 
 logger = logging.getLogger('EngagementBot')
 
+# Nombre maximum de noms d'utilisateur par appel GET /2/users/by
+MAX_USERS_PER_LOOKUP = 100
+
+# Priorités des requêtes (plus petit = servi en premier dans la queue de l'endpoint)
+PRIORITY_HIGH = 0     # Commandes utilisateur (ex: !linktwitter)
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # Tâches de fond (santé, ingestion)
+
 class APIEndpoint(Enum):
     """Endpoints de l'API Twitter avec leurs limites"""
     GET_USERS = "get_users"
@@ -15,37 +34,226 @@ class APIEndpoint(Enum):
     GET_USER_TWEETS = "get_user_tweets"
     SEARCH_TWEETS = "search_tweets"
 
+# Routes v2 -> endpoint, pour rattacher les en-têtes x-rate-limit-* au bon seau
+ENDPOINT_ROUTES = [
+    (re.compile(r"^/2/users/me$"), APIEndpoint.GET_ME),
+    (re.compile(r"^/2/users/[^/]+/tweets$"), APIEndpoint.GET_USER_TWEETS),
+    (re.compile(r"^/2/users(/by)?$"), APIEndpoint.GET_USERS),
+    (re.compile(r"^/2/tweets/search/"), APIEndpoint.SEARCH_TWEETS),
+]
+
 @dataclass
-class RateLimitInfo:
-    """Informations de limite de taux pour un endpoint"""
+class TokenBucket:
+    """Seau de jetons d'un endpoint, recalé sur les en-têtes x-rate-limit-* de l'API"""
     requests_per_window: int = 1  # 1 requête par fenêtre pour le plan gratuit
     window_minutes: int = 15      # Fenêtre de 15 minutes
+    tokens: Optional[int] = None  # Jetons restants (None = seau plein)
+    reset_time: Optional[float] = None
     last_request_time: Optional[float] = None
     request_count: int = 0
-    reset_time: Optional[float] = None
+    
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = self.requests_per_window
+    
+    def refill(self, now: float):
+        """Remplir le seau si la fenêtre est écoulée"""
+        if self.reset_time is not None and now >= self.reset_time:
+            self.tokens = self.requests_per_window
+            self.reset_time = None
+            self.request_count = 0
+    
+    def available(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens > 0
+    
+    def consume(self, now: float):
+        """Consommer un jeton (ouvre la fenêtre si besoin)"""
+        self.tokens -= 1
+        self.request_count += 1
+        self.last_request_time = now
+        if self.reset_time is None:
+            self.reset_time = now + self.window_minutes * 60
+    
+    def wait_time(self, now: float) -> float:
+        """Secondes avant le prochain jeton disponible"""
+        if self.available(now):
+            return 0
+        if self.reset_time is None:
+            return self.window_minutes * 60
+        return max(0, self.reset_time - now)
+    
+    def update_from_headers(self, headers) -> bool:
+        """Recaler le seau sur x-rate-limit-limit / -remaining / -reset"""
+        try:
+            limit = headers.get('x-rate-limit-limit')
+            remaining = headers.get('x-rate-limit-remaining')
+            reset = headers.get('x-rate-limit-reset')
+            if remaining is None or reset is None:
+                return False
+            if limit is not None:
+                self.requests_per_window = int(limit)
+            self.tokens = int(remaining)
+            self.reset_time = float(reset)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+@dataclass
+class EndpointLatency:
+    """Latences observées des appels API d'un endpoint"""
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_ms: float = 0.0
+    
+    def record(self, duration_ms: float, error: bool = False, timeout: bool = False):
+        self.calls += 1
+        self.errors += int(error)
+        self.timeouts += int(timeout)
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.last_ms = duration_ms
+    
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+_MISS = object()
+
+class TwitterResponseCache:
+    """Cache LRU borné des réponses Twitter, persisté (bot_state ou fichier local) pour survivre aux redémarrages"""
+    
+    STATE_KEY = 'twitter_response_cache'
+    
+    def __init__(self, max_entries: int = 2000, ttl: Optional[Dict[str, float]] = None,
+                 database=None, path: Optional[str] = None, default_ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = dict(ttl or {})
+        self.default_ttl = default_ttl
+        self.db = database
+        self.path = Path(path) if path else None
+        # clé -> (expiration epoch, valeur JSON), dans l'ordre LRU
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(endpoint: APIEndpoint, params: Optional[dict]) -> str:
+        """Clé (endpoint, paramètres normalisés)"""
+        return f"{endpoint.value}|{json.dumps(params or {}, sort_keys=True, default=str)}"
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: str) -> Any:
+        """Retourne la valeur en cache, ou _MISS si absente/expirée (None est une valeur valide)"""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() < entry[0]:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+            self._dirty = True
+        self.misses += 1
+        return _MISS
+    
+    def set(self, endpoint: APIEndpoint, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttl.get(endpoint.value, self.default_ttl)
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+    
+    def take_snapshot(self) -> Optional[dict]:
+        """Copie sérialisable des entrées valides (None si rien n'a changé depuis la dernière sauvegarde)"""
+        if not self._dirty:
+            return None
+        now = time.time()
+        self._dirty = False
+        return {'entries': [[key, expires_at, value] for key, (expires_at, value) in self._entries.items() if expires_at > now]}
+    
+    def restore(self, data: Optional[dict]):
+        now = time.time()
+        for key, expires_at, value in (data or {}).get('entries', [])[-self.max_entries:]:
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+    
+    def load(self):
+        """Charger le cache persisté (appel bloquant)"""
+        try:
+            if self.db is not None and self.db.is_connected():
+                self.restore(self.db.load_bot_state(self.STATE_KEY))
+            elif self.path and self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.restore(json.load(f))
+            if self._entries:
+                logger.info(f"Restored {len(self._entries)} cached Twitter responses")
+        except Exception as e:
+            logger.warning(f"Failed to load Twitter response cache: {e}")
+    
+    def write(self, data: dict):
+        """Écrire un snapshot (appel bloquant, exécuté hors event loop)"""
+        try:
+            if self.db is not None and self.db.is_connected():
+                self.db.save_bot_state(self.STATE_KEY, data)
+            elif self.path:
+                tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to persist Twitter response cache: {e}")
 
 class TwitterRateLimiter:
     """Gestionnaire de rate limiting pour l'API Twitter gratuite"""
     
-    def __init__(self):
-        # Configuration pour le plan gratuit X API
+    def __init__(self, max_workers: int = 4, request_timeout: float = 30.0, cache_max_entries: int = 2000,
+                 cache_ttl: Optional[Dict[str, float]] = None, cache_file: Optional[str] = None,
+                 cache_persist_interval: float = 60.0, database=None):
+        # Valeurs initiales du plan gratuit X API, corrigées ensuite par les en-têtes de réponse
         self.limits = {
-            APIEndpoint.GET_USERS: RateLimitInfo(requests_per_window=1, window_minutes=15),
-            APIEndpoint.GET_ME: RateLimitInfo(requests_per_window=1, window_minutes=15),
-            APIEndpoint.GET_USER_TWEETS: RateLimitInfo(requests_per_window=1, window_minutes=15),
-            APIEndpoint.SEARCH_TWEETS: RateLimitInfo(requests_per_window=1, window_minutes=15),
+            APIEndpoint.GET_USERS: TokenBucket(requests_per_window=1, window_minutes=15),
+            APIEndpoint.GET_ME: TokenBucket(requests_per_window=1, window_minutes=15),
+            APIEndpoint.GET_USER_TWEETS: TokenBucket(requests_per_window=1, window_minutes=15),
+            APIEndpoint.SEARCH_TWEETS: TokenBucket(requests_per_window=1, window_minutes=15),
         }
         
-        # Queue des requêtes en attente
-        self.pending_requests = asyncio.Queue()
+        # Une queue de priorité par endpoint : un endpoint bloqué ne retarde pas les autres
+        self.queues: Dict[APIEndpoint, list] = {endpoint: [] for endpoint in APIEndpoint}
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
         
         # Tâche de traitement en arrière-plan
         self.processor_task = None
         self.running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Les appels tweepy sont bloquants : exécutés dans un pool dédié et borné, jamais sur l'event loop
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_workers)
+        self._inflight_tasks: set = set()
+        self.latency: Dict[APIEndpoint, EndpointLatency] = {endpoint: EndpointLatency() for endpoint in APIEndpoint}
+        
+        # Cache des résultats : chaque réponse coûte une fenêtre de quota, on la conserve entre redémarrages
+        self.cache = TwitterResponseCache(max_entries=cache_max_entries, ttl=cache_ttl, database=database, path=cache_file)
+        self.cache_persist_interval = cache_persist_interval
+        self._persist_task = None
+        
+        # Requêtes identiques en cours : les appelants concurrents partagent le même appel API
+        self._inflight_requests: Dict[str, dict] = {}
         
-        # Cache des résultats pour éviter les requêtes répétées
-        self.cache = {}
-        self.cache_duration = 300  # 5 minutes de cache
+        # Lot GET_USERS encore ouvert : les nouvelles recherches s'y ajoutent jusqu'à son exécution
+        self._open_user_batch: Optional[dict] = None
+        # Nom d'utilisateur -> lot (ouvert ou en cours) qui le recherche déjà
+        self._user_lookups: Dict[str, dict] = {}
     
     async def start(self):
         """Démarrer le processeur de requêtes"""
@@ -53,104 +261,275 @@ class TwitterRateLimiter:
             return
         
         self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="twitter-api"
+        )
+        await self._loop.run_in_executor(self._executor, self.cache.load)
         self.processor_task = asyncio.create_task(self._process_requests())
+        self._persist_task = asyncio.create_task(self._persist_loop())
         logger.info("Twitter rate limiter started")
     
     async def stop(self):
         """Arrêter le processeur de requêtes"""
         self.running = False
-        if self.processor_task:
-            self.processor_task.cancel()
-            try:
-                await self.processor_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self.processor_task, self._persist_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        
+        # Annuler les appels en cours ; un appel déjà lancé dans un thread se termine mais son résultat est ignoré
+        for task in list(self._inflight_tasks):
+            task.cancel()
+        await asyncio.gather(*self._inflight_tasks, return_exceptions=True)
+        await self._persist_cache()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         logger.info("Twitter rate limiter stopped")
     
-    async def make_request(self, endpoint: APIEndpoint, request_func: Callable, *args, **kwargs) -> tuple[bool, Any]:
+    @property
+    def pending_count(self) -> int:
+        """Nombre total de requêtes en attente, tous endpoints confondus"""
+        return sum(len(pending) for pending in self.queues.values())
+    
+    def observe_response(self, response, *args, **kwargs):
+        """Hook requests : met à jour le seau de l'endpoint à partir des en-têtes de la réponse"""
+        endpoint = self._endpoint_for_url(getattr(response, 'url', ''))
+        if not endpoint:
+            return
+        headers = {key.lower(): value for key, value in response.headers.items()}
+        if self._loop is not None and self._loop.is_running():
+            # Appelé depuis un thread du pool : appliquer la mise à jour sur l'event loop
+            self._loop.call_soon_threadsafe(self._apply_headers, endpoint, headers)
+        else:
+            self._apply_headers(endpoint, headers)
+    
+    def _apply_headers(self, endpoint: APIEndpoint, headers: dict):
+        bucket = self.limits[endpoint]
+        if bucket.update_from_headers(headers):
+            logger.debug(f"Rate limit for {endpoint.value}: {bucket.tokens}/{bucket.requests_per_window} remaining")
+    
+    def _endpoint_for_url(self, url: str) -> Optional[APIEndpoint]:
+        path = urlparse(url).path
+        for pattern, endpoint in ENDPOINT_ROUTES:
+            if pattern.search(path):
+                return endpoint
+        return None
+    
+    def _enqueue(self, endpoint: APIEndpoint, request_item: dict, priority: int):
+        """Ajouter une requête dans la queue de son endpoint et réveiller le scheduler"""
+        request_item['order'] = (priority, next(self._sequence))
+        heapq.heappush(self.queues[endpoint], (*request_item['order'], request_item))
+        self._wakeup.set()
+    
+    async def make_request(self, endpoint: APIEndpoint, request_func: Callable, *args,
+                           priority: int = PRIORITY_NORMAL, cache_params: Optional[dict] = None,
+                           **kwargs) -> tuple[bool, Any]:
         """
         Faire une requête avec rate limiting
         
         Args:
             endpoint: Type d'endpoint API
-            request_func: Fonction à appeler pour faire la requête
+            request_func: Fonction à appeler pour faire la requête (doit retourner des données JSON)
+            priority: Priorité dans la queue de l'endpoint (PRIORITY_HIGH passe en premier)
+            cache_params: Paramètres identifiant la requête (clé de cache et de déduplication) ;
+                par défaut dérivés de args/kwargs, sans cache si la requête n'en a pas
             *args, **kwargs: Arguments pour la fonction
             
         Returns:
             (success: bool, result: Any)
         """
-        # Créer une clé de cache
-        cache_key = self._generate_cache_key(endpoint, args, kwargs)
+        if cache_params is None and (args or kwargs):
+            cache_params = {'args': list(args), 'kwargs': kwargs}
+        cache_key = self.cache.make_key(endpoint, cache_params) if cache_params is not None else None
+        
+        if cache_key is not None:
+            # Vérifier le cache
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not _MISS:
+                logger.info(f"Returning cached result for {endpoint.value}")
+                return True, cached_result
+            
+            # Une requête identique est déjà en attente ou en cours : partager son résultat
+            request_item = self._inflight_requests.get(cache_key)
+        else:
+            request_item = None
+        
+        if request_item is None:
+            request_item = {
+                'endpoint': endpoint,
+                'function': request_func,
+                'args': args,
+                'kwargs': kwargs,
+                'cache_key': cache_key,
+                'future': asyncio.get_running_loop().create_future(),
+                'waiters': 0,
+                'timestamp': time.time()
+            }
+            if cache_key is not None:
+                self._inflight_requests[cache_key] = request_item
+                request_item['future'].add_done_callback(
+                    lambda _: self._inflight_requests.pop(cache_key, None)
+                )
+            self._enqueue(endpoint, request_item, priority)
+            logger.info(f"Queued request for {endpoint.value}")
+        else:
+            logger.info(f"Joined in-flight request for {endpoint.value}")
+        
+        # Attendre le résultat (avec timeout) sans annuler le résultat partagé
+        request_item['waiters'] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(request_item['future']), timeout=300)  # 5 minutes timeout
+        except asyncio.TimeoutError:
+            logger.error(f"Request timeout for {endpoint.value}")
+            return False, "Timeout de la requête Twitter"
+        finally:
+            request_item['waiters'] -= 1
+            if request_item['waiters'] == 0 and not request_item['future'].done():
+                # Plus personne n'attend : le scheduler ignorera cette requête
+                request_item['future'].cancel()
+    
+    async def lookup_user(self, username: str, batch_func: Callable[[List[str]], Any]) -> tuple[bool, Any]:
+        """
+        Rechercher un utilisateur via une requête GET_USERS groupée
+        
+        Les recherches en attente sont regroupées (jusqu'à 100 noms) en un seul
+        appel batch_func(usernames), puis chaque appelant reçoit son utilisateur.
+        
+        Args:
+            username: Nom d'utilisateur Twitter (sans @)
+            batch_func: Fonction recevant la liste des noms et retournant une liste de dicts (avec 'username')
+            
+        Returns:
+            (success: bool, user: dict retourné par batch_func, ou None si introuvable)
+        """
+        username = username.lower()
+        cache_key = self.cache.make_key(APIEndpoint.GET_USERS, {'username': username})
         
-        # Vérifier le cache
-        cached_result = self._get_from_cache(cache_key)
-        if cached_result is not None:
-            logger.info(f"Returning cached result for {endpoint.value}")
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not _MISS:
+            logger.info(f"Returning cached result for {APIEndpoint.GET_USERS.value}")
             return True, cached_result
         
-        # Créer un Future pour attendre le résultat
-        result_future = asyncio.Future()
+        result_future = asyncio.get_running_loop().create_future()
         
-        # Ajouter à la queue
-        request_item = {
-            'endpoint': endpoint,
-            'function': request_func,
-            'args': args,
-            'kwargs': kwargs,
-            'cache_key': cache_key,
-            'future': result_future,
-            'timestamp': time.time()
-        }
+        # Même nom déjà recherché par un lot ouvert ou en cours : s'y joindre
+        batch = self._user_lookups.get(username) or self._open_user_batch
+        if batch is None or (username not in batch['usernames'] and len(batch['usernames']) >= MAX_USERS_PER_LOOKUP):
+            # Ouvrir un nouveau lot et le placer dans la queue (les commandes utilisateur passent en premier)
+            batch = {'usernames': {}}
+            self._open_user_batch = batch
+            self._enqueue(APIEndpoint.GET_USERS, {
+                'endpoint': APIEndpoint.GET_USERS,
+                'function': batch_func,
+                'batch': batch,
+                'timestamp': time.time()
+            }, PRIORITY_HIGH)
+            logger.info(f"Queued batched request for {APIEndpoint.GET_USERS.value}")
         
-        await self.pending_requests.put(request_item)
-        logger.info(f"Queued request for {endpoint.value}")
+        batch['usernames'].setdefault(username, []).append(result_future)
+        self._user_lookups[username] = batch
         
-        # Attendre le résultat (avec timeout)
         try:
             return await asyncio.wait_for(result_future, timeout=300)  # 5 minutes timeout
         except asyncio.TimeoutError:
-            logger.error(f"Request timeout for {endpoint.value}")
+            logger.error(f"Request timeout for {APIEndpoint.GET_USERS.value} ({username})")
             return False, "Timeout de la requête Twitter"
     
     async def _process_requests(self):
-        """Traiter les requêtes en queue en respectant les limites"""
+        """Scheduler unique : sert chaque endpoint tant qu'il a des jetons, puis dort jusqu'au prochain remplissage"""
         while self.running:
             try:
-                # Attendre une requête (avec timeout pour permettre l'arrêt)
-                try:
-                    request_item = await asyncio.wait_for(
-                        self.pending_requests.get(), 
-                        timeout=1.0
-                    )
-                except asyncio.TimeoutError:
-                    continue
-                
-                endpoint = request_item['endpoint']
+                self._wakeup.clear()
+                next_wake = None
                 
-                # Vérifier si on peut faire la requête maintenant
-                if not self._can_make_request(endpoint):
-                    wait_time = self._get_wait_time(endpoint)
-                    logger.info(f"Rate limit hit for {endpoint.value}, waiting {wait_time:.1f}s")
+                for endpoint, pending in self.queues.items():
+                    bucket = self.limits[endpoint]
+                    while pending and bucket.available(time.time()):
+                        _, _, request_item = heapq.heappop(pending)
+                        if self._is_abandoned(request_item):
+                            # Tous les appelants ont abandonné : ne pas dépenser de jeton
+                            continue
+                        bucket.consume(time.time())
+                        self._dispatch(request_item)
                     
-                    # Remettre la requête en queue après attente
-                    asyncio.create_task(self._requeue_after_delay(request_item, wait_time))
-                    continue
+                    if pending:
+                        wait_time = bucket.wait_time(time.time())
+                        next_wake = wait_time if next_wake is None else min(next_wake, wait_time)
                 
-                # Faire la requête
-                await self._execute_request(request_item)
+                if next_wake is None:
+                    # Rien en attente : dormir jusqu'à la prochaine requête
+                    await self._wakeup.wait()
+                else:
+                    logger.debug(f"Twitter scheduler sleeping {next_wake:.1f}s until next bucket refill")
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_wake, 0.01))
+                    except asyncio.TimeoutError:
+                        pass
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in request processor: {e}", exc_info=True)
                 await asyncio.sleep(1)
     
-    async def _requeue_after_delay(self, request_item: dict, delay: float):
-        """Remettre une requête en queue après un délai"""
-        await asyncio.sleep(delay)
-        if self.running:
-            await self.pending_requests.put(request_item)
+    def _is_abandoned(self, request_item: dict) -> bool:
+        if 'batch' in request_item:
+            return all(future.done() for futures in request_item['batch']['usernames'].values() for future in futures)
+        return request_item['future'].done()
+    
+    def _dispatch(self, request_item: dict):
+        """Lancer l'exécution sans bloquer le scheduler"""
+        task = asyncio.create_task(self._execute_request(request_item))
+        self._inflight_tasks.add(task)
+        task.add_done_callback(self._inflight_tasks.discard)
+        
+    async def _call_api(self, endpoint: APIEndpoint, func: Callable, *args, **kwargs) -> Any:
+        """Exécuter un appel tweepy bloquant dans le pool, avec timeout et mesure de latence"""
+        async with self._slots:
+            start = time.perf_counter()
+            error = timeout = False
+            try:
+                if self._executor is None:
+                    raise RuntimeError("Twitter rate limiter not started")
+                call = asyncio.wrap_future(self._executor.submit(func, *args, **kwargs))
+                return await asyncio.wait_for(call, timeout=self.request_timeout)
+            except asyncio.TimeoutError:
+                timeout = True
+                raise
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                error = True
+                raise
+            finally:
+                duration_ms = (time.perf_counter() - start) * 1000
+                self.latency[endpoint].record(duration_ms, error=error, timeout=timeout)
+                logger.debug(f"Twitter {endpoint.value} call took {duration_ms:.0f}ms")
+    
+    def _handle_rate_limited(self, request_item: dict, error: TooManyRequests) -> bool:
+        """Sur 429 : recaler le seau et remettre la requête en tête de sa queue"""
+        endpoint = request_item['endpoint']
+        bucket = self.limits[endpoint]
+        if not bucket.update_from_headers(error.response.headers):
+            bucket.tokens = 0
+        if not self.running:
+            return False
+        heapq.heappush(self.queues[endpoint], (*request_item['order'], request_item))
+        self._wakeup.set()
+        logger.warning(f"Rate limited on {endpoint.value}, retrying in {bucket.wait_time(time.time()):.1f}s")
+        return True
     
     async def _execute_request(self, request_item: dict):
         """Exécuter une requête"""
+        if 'batch' in request_item:
+            await self._execute_user_batch(request_item)
+            return
+        
         try:
             endpoint = request_item['endpoint']
             request_func = request_item['function']
@@ -159,15 +538,13 @@ class TwitterRateLimiter:
             cache_key = request_item['cache_key']
             result_future = request_item['future']
             
-            # Mettre à jour les compteurs
-            self._update_rate_limit_counters(endpoint)
-            
             # Exécuter la requête
             logger.info(f"Executing request for {endpoint.value}")
-            result = request_func(*args, **kwargs)
+            result = await self._call_api(endpoint, request_func, *args, **kwargs)
             
             # Mettre en cache
-            self._set_cache(cache_key, result)
+            if cache_key is not None:
+                self.cache.set(endpoint, cache_key, result)
             
             # Retourner le résultat
             if not result_future.done():
@@ -175,119 +552,118 @@ class TwitterRateLimiter:
             
             logger.info(f"Request completed successfully for {endpoint.value}")
             
+        except TooManyRequests as e:
+            if not self._handle_rate_limited(request_item, e) and not request_item['future'].done():
+                request_item['future'].set_result((False, "Limite de requêtes Twitter atteinte"))
+        except asyncio.TimeoutError:
+            logger.error(f"Twitter API call timed out for {request_item['endpoint'].value} after {self.request_timeout}s")
+            if not request_item['future'].done():
+                request_item['future'].set_result((False, "Timeout de la requête Twitter"))
         except Exception as e:
             logger.error(f"Error executing request: {e}", exc_info=True)
             if not request_item['future'].done():
                 request_item['future'].set_result((False, f"Erreur API: {str(e)}"))
     
-    def _can_make_request(self, endpoint: APIEndpoint) -> bool:
-        """Vérifier si on peut faire une requête pour cet endpoint"""
-        limit_info = self.limits[endpoint]
-        current_time = time.time()
-        
-        # Si pas de requête précédente, on peut faire la requête
-        if limit_info.last_request_time is None:
-            return True
-        
-        # Calculer le temps écoulé depuis la dernière requête
-        time_since_last = current_time - limit_info.last_request_time
-        window_seconds = limit_info.window_minutes * 60
-        
-        # Si la fenêtre est écoulée, reset les compteurs
-        if time_since_last >= window_seconds:
-            limit_info.request_count = 0
-            limit_info.reset_time = current_time + window_seconds
-            return True
+    async def _execute_user_batch(self, request_item: dict):
+        """Exécuter un lot GET_USERS et redistribuer chaque utilisateur à ses appelants"""
+        batch = request_item['batch']
+        if self._open_user_batch is batch:
+            # Fermer le lot : les recherches suivantes ouvriront un nouveau lot
+            self._open_user_batch = None
         
-        # Vérifier si on a dépassé la limite
-        return limit_info.request_count < limit_info.requests_per_window
+        usernames = list(batch['usernames'])
+        try:
+            logger.info(f"Executing batched request for {APIEndpoint.GET_USERS.value} ({len(usernames)} usernames)")
+            response = await self._call_api(APIEndpoint.GET_USERS, request_item['function'], usernames)
+            
+            found = {user['username'].lower(): user for user in (response or [])}
+            for username, futures in batch['usernames'].items():
+                user = found.get(username)
+                # Les comptes introuvables sont aussi mis en cache, plus brièvement
+                self.cache.set(
+                    APIEndpoint.GET_USERS,
+                    self.cache.make_key(APIEndpoint.GET_USERS, {'username': username}),
+                    user,
+                    ttl=None if user is not None else self.cache.default_ttl
+                )
+                for future in futures:
+                    if not future.done():
+                        future.set_result((True, user))
+            self._release_user_batch(batch)
+            
+            logger.info(f"Batched request completed for {APIEndpoint.GET_USERS.value}: {len(found)}/{len(usernames)} found")
+            
+        except TooManyRequests as e:
+            if self._handle_rate_limited(request_item, e):
+                return
+            self._fail_user_batch(batch, "Limite de requêtes Twitter atteinte")
+        except asyncio.CancelledError:
+            self._release_user_batch(batch)
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"Batched GET_USERS call timed out after {self.request_timeout}s")
+            self._fail_user_batch(batch, "Timeout de la requête Twitter")
+        except Exception as e:
+            logger.error(f"Error executing batched request: {e}", exc_info=True)
+            self._fail_user_batch(batch, f"Erreur API: {str(e)}")
     
-    def _get_wait_time(self, endpoint: APIEndpoint) -> float:
-        """Calculer le temps d'attente avant la prochaine requête possible"""
-        limit_info = self.limits[endpoint]
-        current_time = time.time()
-        
-        if limit_info.last_request_time is None:
-            return 0
-        
-        window_seconds = limit_info.window_minutes * 60
-        time_since_last = current_time - limit_info.last_request_time
-        
-        return max(0, window_seconds - time_since_last)
+    def _fail_user_batch(self, batch: dict, message: str):
+        for futures in batch['usernames'].values():
+            for future in futures:
+                if not future.done():
+                    future.set_result((False, message))
+        self._release_user_batch(batch)
     
-    def _update_rate_limit_counters(self, endpoint: APIEndpoint):
-        """Mettre à jour les compteurs de rate limiting"""
-        limit_info = self.limits[endpoint]
-        current_time = time.time()
-        
-        limit_info.last_request_time = current_time
-        limit_info.request_count += 1
-        
-        if limit_info.reset_time is None:
-            limit_info.reset_time = current_time + (limit_info.window_minutes * 60)
-    
-    def _generate_cache_key(self, endpoint: APIEndpoint, args: tuple, kwargs: dict) -> str:
-        """Générer une clé de cache pour la requête"""
-        # Créer une clé basée sur l'endpoint et les paramètres
-        key_parts = [endpoint.value]
-        key_parts.extend(str(arg) for arg in args)
-        key_parts.extend(f"{k}={v}" for k, v in sorted(kwargs.items()))
-        return "|".join(key_parts)
-    
-    def _get_from_cache(self, cache_key: str) -> Optional[Any]:
-        """Récupérer un résultat du cache"""
-        if cache_key in self.cache:
-            cached_item = self.cache[cache_key]
-            if time.time() - cached_item['timestamp'] < self.cache_duration:
-                return cached_item['data']
-            else:
-                # Cache expiré, le supprimer
-                del self.cache[cache_key]
-        return None
+    def _release_user_batch(self, batch: dict):
+        for username in batch['usernames']:
+            if self._user_lookups.get(username) is batch:
+                del self._user_lookups[username]
     
-    def _set_cache(self, cache_key: str, data: Any):
-        """Mettre un résultat en cache"""
-        self.cache[cache_key] = {
-            'data': data,
-            'timestamp': time.time()
-        }
-        
-        # Nettoyer le cache si trop grand
-        if len(self.cache) > 100:
-            self._cleanup_cache()
+    async def _persist_loop(self):
+        """Sauvegarder périodiquement le cache s'il a changé"""
+        while self.running:
+            await asyncio.sleep(self.cache_persist_interval)
+            await self._persist_cache()
     
-    def _cleanup_cache(self):
-        """Nettoyer les anciennes entrées du cache"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, item in self.cache.items()
-            if current_time - item['timestamp'] > self.cache_duration
-        ]
-        for key in expired_keys:
-            del self.cache[key]
+    async def _persist_cache(self):
+        snapshot = self.cache.take_snapshot()
+        if snapshot is None:
+            return
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.cache.write, snapshot)
+        else:
+            self.cache.write(snapshot)
     
     def get_status(self) -> dict:
         """Obtenir le statut du rate limiter"""
         status = {
             'running': self.running,
-            'pending_requests': self.pending_requests.qsize(),
+            'pending_requests': self.pending_count,
             'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'batched_usernames': len(self._open_user_batch['usernames']) if self._open_user_batch else 0,
+            'inflight_requests': len(self._inflight_tasks),
             'endpoints': {}
         }
         
         current_time = time.time()
-        for endpoint, limit_info in self.limits.items():
+        for endpoint, bucket in self.limits.items():
             next_available = "Maintenant"
-            if limit_info.last_request_time:
-                wait_time = self._get_wait_time(endpoint)
-                if wait_time > 0:
-                    next_available = f"Dans {wait_time:.1f}s"
+            wait_time = bucket.wait_time(current_time)
+            if wait_time > 0:
+                next_available = f"Dans {wait_time:.1f}s"
             
             status['endpoints'][endpoint.value] = {
-                'requests_used': limit_info.request_count,
-                'requests_limit': limit_info.requests_per_window,
-                'window_minutes': limit_info.window_minutes,
-                'next_available': next_available
+                'requests_used': bucket.request_count,
+                'requests_limit': bucket.requests_per_window,
+                'remaining': bucket.tokens,
+                'window_minutes': bucket.window_minutes,
+                'pending': len(self.queues[endpoint]),
+                'next_available': next_available,
+                'avg_latency_ms': round(self.latency[endpoint].avg_ms, 1),
+                'max_latency_ms': round(self.latency[endpoint].max_ms, 1),
+                'timeouts': self.latency[endpoint].timeouts
             }
         
-        return status
\ No newline at end of file
+        return status
@@ -0,0 +1,220 @@
+"""
+Suivi des sessions vocales
+Table des sessions tenue en mémoire et mise à jour par les événements vocaux sans accès DB ;
+un tick par minute crédite les points de tous les membres actifs en une écriture groupée
+et un point de contrôle périodique recopie les sessions en base pour survivre aux redémarrages
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger('EngagementBot')
+
+@dataclass
+class VoiceSession:
+    """Présence vocale d'un membre"""
+    user_id: str
+    guild_id: int
+    channel_id: int
+    started_at: float
+    # Dernière mise à jour du temps actif (secondes epoch)
+    updated_at: float
+    # Micro/casque coupé ou salon AFK : le temps n'est pas compté
+    active: bool = True
+    # Temps actif pas encore converti en points (moins d'une minute entre deux ticks)
+    pending_seconds: float = 0.0
+    points_awarded: int = 0
+
+    def settle(self, now: float):
+        """Comptabiliser le temps écoulé depuis la dernière mise à jour"""
+        if self.active:
+            self.pending_seconds += max(0.0, now - self.updated_at)
+        self.updated_at = now
+
+    def to_row(self) -> Dict:
+        return {
+            'user_id': self.user_id,
+            'guild_id': str(self.guild_id),
+            'channel_id': str(self.channel_id),
+            'start_time': self.started_at,
+            'pending_seconds': round(self.pending_seconds, 1),
+            'points_awarded': self.points_awarded,
+        }
+
+class VoiceTracker:
+    """Sessions vocales en mémoire, points crédités par minute et en lot"""
+
+    def __init__(self, database, points_per_minute: int = 2, min_session_minutes: int = 5, tick_interval: float = 60,
+                 checkpoint_interval: float = 300, max_points_per_session: int = 120,
+                 count_muted: bool = False, count_deafened: bool = False):
+        self.db = database
+        self.points_per_minute = points_per_minute
+        self.min_session_minutes = min_session_minutes
+        self.tick_interval = tick_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.max_points_per_session = max_points_per_session
+        self.count_muted = count_muted
+        self.count_deafened = count_deafened
+        self.sessions: Dict[str, VoiceSession] = {}
+        # Serveurs suivis par cette instance : le point de contrôle ne remplace que leurs lignes
+        self.guild_ids: Set[int] = set()
+        # Points dus (sessions terminées ou écriture précédente échouée), crédités au prochain tick
+        self._pending_awards: Dict[str, int] = {}
+        self._checkpoint_dirty = False
+        self.stats = {'ticks': 0, 'points_awarded': 0, 'failed_writes': 0}
+
+    # === ÉVÉNEMENTS (aucun accès DB) ===
+
+    def _is_active(self, member, state) -> bool:
+        guild = getattr(member, 'guild', None)
+        afk_channel = getattr(guild, 'afk_channel', None)
+        if state.channel is None or state.afk or (afk_channel is not None and state.channel.id == afk_channel.id):
+            return False
+        if (state.self_mute or state.mute) and not self.count_muted:
+            return False
+        if (state.self_deaf or state.deaf) and not self.count_deafened:
+            return False
+        return True
+
+    def on_voice_state_update(self, member, before, after, now: Optional[float] = None):
+        """Arrivée, départ, changement de salon, micro coupé ou AFK"""
+        if member.bot:
+            return
+        now = time.time() if now is None else now
+        user_id = str(member.id)
+        session = self.sessions.get(user_id)
+        self.guild_ids.add(member.guild.id)
+
+        if after.channel is None:
+            if session is not None:
+                self._end_session(session, now)
+            return
+
+        if session is None:
+            self.sessions[user_id] = VoiceSession(user_id=user_id, guild_id=member.guild.id, channel_id=after.channel.id,
+                                                  started_at=now, updated_at=now, active=self._is_active(member, after))
+        else:
+            # Le temps passé dans l'état précédent est compté avant d'appliquer le nouveau
+            session.settle(now)
+            session.guild_id = member.guild.id
+            session.channel_id = after.channel.id
+            session.active = self._is_active(member, after)
+        self._checkpoint_dirty = True
+
+    def _end_session(self, session: VoiceSession, now: float):
+        session.settle(now)
+        points = self._convert(session)
+        if points:
+            self._pending_awards[session.user_id] = self._pending_awards.get(session.user_id, 0) + points
+        del self.sessions[session.user_id]
+        self._checkpoint_dirty = True
+
+    def _convert(self, session: VoiceSession) -> int:
+        """
+        Convertir les minutes complètes en points, dans la limite par session
+
+        Rien n'est crédité avant `min_session_minutes` minutes actives : une session plus
+        courte ne rapporte rien, comme avant le suivi en mémoire.
+        """
+        minutes = int(session.pending_seconds // 60)
+        if not minutes or (not session.points_awarded and minutes < self.min_session_minutes):
+            return 0
+        session.pending_seconds -= minutes * 60
+        points = min(minutes * self.points_per_minute, self.max_points_per_session - session.points_awarded)
+        points = max(0, points)
+        session.points_awarded += points
+        return points
+
+    # === TÂCHES PLANIFIÉES ===
+
+    async def tick(self, now: Optional[float] = None) -> int:
+        """Créditer en une écriture les minutes actives de tous les membres en vocal"""
+        now = time.time() if now is None else now
+        awards = dict(self._pending_awards)
+        self._pending_awards.clear()
+        for session in self.sessions.values():
+            session.settle(now)
+            points = self._convert(session)
+            if points:
+                awards[session.user_id] = awards.get(session.user_id, 0) + points
+        self.stats['ticks'] += 1
+        if not awards:
+            return 0
+
+        rows = [{'user_id': user_id, 'amount': amount, 'reason': "Voice chat"} for user_id, amount in awards.items()]
+        if not await asyncio.to_thread(self.db.award_points_bulk, rows):
+            # Réessayé au prochain tick
+            for user_id, amount in awards.items():
+                self._pending_awards[user_id] = self._pending_awards.get(user_id, 0) + amount
+            self.stats['failed_writes'] += 1
+            return 0
+        self._checkpoint_dirty = True
+        total = sum(awards.values())
+        self.stats['points_awarded'] += total
+        logger.debug(f"[Voice] {total} points crédités à {len(awards)} membres")
+        return len(awards)
+
+    async def checkpoint(self) -> bool:
+        """Recopier les sessions en cours en base (remplace les lignes existantes)"""
+        if not self._checkpoint_dirty:
+            return True
+        self._checkpoint_dirty = False
+        rows = [session.to_row() for session in self.sessions.values()]
+        guild_ids = [str(guild_id) for guild_id in self.guild_ids]
+        if not await asyncio.to_thread(self.db.checkpoint_voice_sessions, rows, guild_ids):
+            self._checkpoint_dirty = True
+            return False
+        return True
+
+    async def reconcile(self, guilds, now: Optional[float] = None) -> int:
+        """
+        Reconstruire les sessions depuis l'état vocal réel des serveurs (démarrage, reconnexion)
+
+        Une session déjà en mémoire est conservée ; sinon la ligne sauvegardée fournit le début
+        de session et les points déjà attribués. Les membres qui ne sont plus en vocal voient
+        leur session close ; le temps écoulé pendant un arrêt n'est pas crédité.
+        """
+        now = time.time() if now is None else now
+        saved = {row['user_id']: row for row in await asyncio.to_thread(self.db.get_voice_sessions)}
+        present = set()
+        for guild in guilds:
+            self.guild_ids.add(guild.id)
+            for channel in list(getattr(guild, 'voice_channels', [])) + list(getattr(guild, 'stage_channels', [])):
+                for member_id, state in channel.voice_states.items():
+                    member = guild.get_member(member_id)
+                    if member is None or member.bot:
+                        continue
+                    user_id = str(member_id)
+                    present.add(user_id)
+                    session = self.sessions.get(user_id)
+                    if session is not None:
+                        session.settle(now)
+                        session.guild_id, session.channel_id = guild.id, channel.id
+                        session.active = self._is_active(member, state)
+                        continue
+                    row = saved.get(user_id) or {}
+                    self.sessions[user_id] = VoiceSession(
+                        user_id=user_id, guild_id=guild.id, channel_id=channel.id,
+                        started_at=row.get('start_time') or now, updated_at=now,
+                        active=self._is_active(member, state),
+                        pending_seconds=row.get('pending_seconds') or 0.0,
+                        points_awarded=row.get('points_awarded') or 0,
+                    )
+        for user_id in set(self.sessions) - present:
+            self._end_session(self.sessions[user_id], now)
+        self._checkpoint_dirty = True
+        await self.checkpoint()
+        logger.info(f"[Voice] {len(self.sessions)} sessions vocales reconstruites ({len(saved)} lignes sauvegardées)")
+        return len(self.sessions)
+
+    async def shutdown(self):
+        """Créditer le temps restant et sauvegarder les sessions avant l'arrêt"""
+        await self.tick()
+        self._checkpoint_dirty = True
+        await self.checkpoint()
+
+    def get_session(self, user_id: str) -> Optional[VoiceSession]:
+        return self.sessions.get(str(user_id))